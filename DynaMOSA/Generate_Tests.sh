@@ -4,5 +4,7 @@
 # Start the SolMOSA algorithm
 cd SolMOSA && python Main.py
 
-# Close the ganache screen
-screen -X -S ganache quit
+# Close the ganache screens
+for session in $(screen -ls | grep -o "[0-9]*\.ganache[_0-9]*"); do
+	screen -X -S $session quit
+done
@@ -9,6 +9,7 @@ Predicate:      A predicate that controls the Edges leading out of a node.
 CDG:            A Control-Dependency-Graph.
 """
 
+import bisect
 import logging
 import configparser
 import re
@@ -42,21 +43,16 @@ class CompactNode():
     dom:            The immediate dominator of this node.
     ancestor:       One of the ancestors of the vertex, used for the
                     Lengauer-Tarjan algorithm
+    label:          The index of the vertex with the smallest semidominator
+                    on the path to the ancestor, used for the Lengauer-Tarjan
+                    algorithm.
+    parent:         The parent of the vertex in the depth-first search tree,
+                    used for the Lengauer-Tarjan algorithm.
     """
 
-    node_id = ("", 0)
-    all_node_ids = None
-    start_pc = 0
-    end_pc = 0
-    basic_blocks = []
-    inc_node_ids = []
-    outg_node_ids = []
-    predicate = None
-    semi = 0
-    bucket = set()
-    dom = None
-    ancestor = None
-    label = None
+    __slots__ = ('node_id', 'all_node_ids', 'start_pc', 'end_pc',
+                 'basic_blocks', 'inc_node_ids', 'outg_node_ids', 'predicate',
+                 'semi', 'bucket', 'dom', 'ancestor', 'label', 'parent')
 
     def __init__(self, _node_id, _all_node_ids, _start_pc, _end_pc,
                  _basic_blocks, _inc_node_ids, _outg_node_ids, _predicate=None,
@@ -75,6 +71,7 @@ class CompactNode():
         self.dom = _dom
         self.ancestor = None
         self.label = 0
+        self.parent = None
 
     def show_CompactNode(self, log=False):
         """Print all the information of the CompactNode."""
@@ -102,9 +99,7 @@ class CompactEdge():
                     traversed or not.
     """
 
-    startNode_id = None
-    endNode_id = None
-    predicate = None
+    __slots__ = ('startNode_id', 'endNode_id', 'predicate')
 
     def __init__(self, _startNode_id, _endNode_id, _predicate):
         """Initialise a CompactEdge."""
@@ -147,9 +142,7 @@ class Predicate():
                 found.
     """
 
-    eval = ""
-    pc = 0
-    node_id = None
+    __slots__ = ('eval', 'pc', 'node_id')
 
     def __init__(self, _eval, _pc, _node_id):
         """Initialise Predicate."""
@@ -179,6 +172,26 @@ class CDG():
         - vertex:       An ordered list of vertices used for the
                         Lengauer-Tarjan algorithm.
         - n:            A global counter used for the Lengauer-Tarjan algorithm
+        - TracePcs:     The start and end pcs of all basic blocks, the trace
+                        steps at these pcs are enough to follow the execution
+                        through the CDG.
+        - PredicatePcs: The pcs of the predicates of the CompactEdges, the
+                        trace steps at these pcs need the top of the stack to
+                        calculate branch distances.
+        - NodeIndex:    The CompactNodes by their node_id.
+        - StartPcIndex: The CompactNodes by their start_pc.
+        - EdgeIndex:    The CompactEdges by their (startNode_id, endNode_id).
+        - FirstBlockStarts: The start pcs of the first basic_blocks of the
+                            CompactNodes in ascending order, used to find the
+                            node at a pc by bisection, see Node_At_Pc.
+        - FirstBlockEnds:   The end pcs of the same basic_blocks.
+        - FirstBlockNodes:  The CompactNodes of the same basic_blocks.
+        - TerminalNodeIds:  The node_ids of the CompactNodes of which the last
+                            basic_block ends the execution.
+        - OutgoingEdges:    The indices in CompactEdges of the edges leaving
+                            each CompactNode, by node_id.
+        - IncomingEdges:    The indices in CompactEdges of the edges entering
+                            each CompactNode, by node_id.
     """
 
     name = ""
@@ -187,6 +200,17 @@ class CDG():
     StartNodes = []
     vertex = []
     n = 0
+    TracePcs = []
+    PredicatePcs = []
+    NodeIndex = {}
+    StartPcIndex = {}
+    EdgeIndex = {}
+    FirstBlockStarts = []
+    FirstBlockEnds = []
+    FirstBlockNodes = []
+    TerminalNodeIds = set()
+    OutgoingEdges = {}
+    IncomingEdges = {}
 
     def __init__(self, _name, _bytecode, _predicates):
         """
@@ -233,6 +257,50 @@ class CDG():
         self.StartNodes = s
         self.vertex = [None] * len(self.CompactNodes)
         self.n = 0
+        self.TracePcs = sorted(set(bb.start.pc for bb in cfg.basic_blocks)
+                               .union(bb.end.pc for bb in cfg.basic_blocks))
+        self.Build_Indexes()
+
+    def Build_Indexes(self):
+        """Index the CompactNodes by their node_id and start_pc and the \
+        CompactEdges by the node_ids they connect and by the node they leave \
+        or enter, this has to be done whenever CompactNodes or CompactEdges \
+        are replaced."""
+        self.NodeIndex = {cNode.node_id: cNode for cNode in self.CompactNodes}
+        self.StartPcIndex = {cNode.start_pc: cNode for cNode in
+                             self.CompactNodes}
+        self.EdgeIndex = {(cEdge.startNode_id, cEdge.endNode_id): cEdge for
+                          cEdge in self.CompactEdges}
+        firstBlocks = sorted(
+            ((cNode.basic_blocks[0].start.pc, cNode.basic_blocks[0].end.pc,
+              cNode) for cNode in self.CompactNodes), key=lambda x: x[0])
+        self.FirstBlockStarts = [start for start, _, _ in firstBlocks]
+        self.FirstBlockEnds = [end for _, end, _ in firstBlocks]
+        self.FirstBlockNodes = [cNode for _, _, cNode in firstBlocks]
+        self.TerminalNodeIds = set(
+            cNode.node_id for cNode in self.CompactNodes if
+            cNode.basic_blocks[-1].end.name in
+            ["RETURN", "REVERT", "STOP", "INVALID"])
+        self.OutgoingEdges = {cNode.node_id: [] for cNode in self.CompactNodes}
+        self.IncomingEdges = {cNode.node_id: [] for cNode in self.CompactNodes}
+        for j, cEdge in enumerate(self.CompactEdges):
+            self.OutgoingEdges.setdefault(cEdge.startNode_id, []).append(j)
+            self.IncomingEdges.setdefault(cEdge.endNode_id, []).append(j)
+
+    def Node_At_Pc(self, pc):
+        """
+        Find the CompactNode of which the first basic_block contains a pc.
+
+        Arguments:
+            - pc:   A pc in the deployed bytecode.
+        Outputs:
+            - The CompactNode or None if the pc is not in the first
+              basic_block of any CompactNode.
+        """
+        i = bisect.bisect_right(self.FirstBlockStarts, pc) - 1
+        if (i >= 0) and (pc <= self.FirstBlockEnds[i]):
+            return self.FirstBlockNodes[i]
+        return None
 
     def Payable_Check(self, cNodes, cEdges, _payableMethodNames):
         """
@@ -417,7 +485,7 @@ class CDG():
             _double_nodes):
         """
         Extract the compactified nodes and a first version of the edges \
-        between them in a recursive manner for a given method.
+        between them for a given method, one CompactNode at a time.
 
         Arguments:
         method:       A function object of the control-flow-graph
@@ -444,27 +512,25 @@ class CDG():
                       the start_pcs of the corresponding basic_blocks.
         """
         double_nodes = _double_nodes
-        sb, bbs, rbbs, found = self.Find_Starting_Node(method, bbs, rbbs)
-        node_ctr += 1
-        if not found:
-            assert(len(rbbs) == len(method.basic_blocks)), \
-                "No starting blocks were found but there are stil basic "\
-                "blocks should be added to the control-dependency-graph!"
-            return compactNodes, simple_edges, double_nodes
-        else:
+        while True:
+            sb, bbs, rbbs, found = self.Find_Starting_Node(method, bbs, rbbs)
+            node_ctr += 1
+            if not found:
+                assert(len(rbbs) == len(method.basic_blocks)), \
+                    "No starting blocks were found but there are stil basic "\
+                    "blocks should be added to the control-dependency-graph!"
+                return compactNodes, simple_edges, double_nodes
             start_pc = sb.start.pc
             bbs, rbbs, end_pc, basic_blocks, outg_node_startpcs = \
                 self.Compactify_Basic_Blocks(method, sb, bbs, rbbs, [])
             if start_pc in double_nodes.keys():
-                cNode = next((compactNode for compactNode in compactNodes if
-                              compactNode.start_pc == start_pc), None)
-                assert cNode is not None, \
-                    f"There was a start_pc ({start_pc}) in start_pcs without "\
-                    "a corresponding compactNode in compactNodes."
+                # The first compactNode that was found with this start_pc.
+                cNode = double_nodes[start_pc][0]
                 assert cNode.end_pc == end_pc, "Two compactNodes were found "\
                     f"with the same start_pc's ({start_pc}), but different "\
                     f"end_pc's ({cNode.end_pc}) and ({end_pc}). "\
-                    f"Original node: {cNode.node_id}, New is in {method.name}."
+                    f"Original node: {cNode.node_id}, New is in "\
+                    f"{method.name}."
                 assert outg_node_startpcs == simple_edges[cNode.node_id], \
                     "When creating double nodes, the simple_edges should "\
                     "be the same!"
@@ -474,16 +540,10 @@ class CDG():
             new_cNode = CompactNode(
                 node_id, set(
                     [node_id]), start_pc, end_pc, basic_blocks, [], [])
-            if start_pc not in double_nodes.keys():
-                double_nodes[start_pc] = [new_cNode]
-            else:
-                double_nodes[start_pc] = double_nodes[start_pc] + [new_cNode]
+            double_nodes.setdefault(start_pc, []).append(new_cNode)
 
             simple_edges[node_id] = outg_node_startpcs
-            compactNodes = compactNodes + [new_cNode]
-            return self.Compactify_method(
-                method, node_ctr, bbs, rbbs, compactNodes, simple_edges,
-                double_nodes)
+            compactNodes.append(new_cNode)
 
     def Find_Starting_Node(self, method, bbs, rbbs):
         """
@@ -510,16 +570,18 @@ class CDG():
                     cannot be added to any other CompactNode anymore afte \
                     this function has run.
         """
+        removed_bbs = set(rbbs)
+        illegal_inc_bbs = set(x for x in method.basic_blocks if
+                              x not in removed_bbs)
         for i, bb in enumerate(method.basic_blocks):
-            illegal_inc_bbs = [x for x in method.basic_blocks if x not in rbbs]
-            bb_not_removed = bb not in rbbs
+            bb_not_removed = bb not in removed_bbs
             bb_is_reachable = not all([x in illegal_inc_bbs for x in
                                        bb.incoming_basic_blocks(method.key)])
             bb_has_no_incoming_blocks = \
                 len(bb.incoming_basic_blocks(method.key)) == 0
             if bb_not_removed & (bb_is_reachable | bb_has_no_incoming_blocks):
                 bbs.remove(bb)
-                rbbs = rbbs + [bb]
+                rbbs.append(bb)
                 return bb, bbs, rbbs, True
         return None, bbs, rbbs, False
 
@@ -548,17 +610,18 @@ class CDG():
         outg_bb_startpcs: The start_pc's of all the basic blocks that are \
                           connected by an edge to the end of the CompactNode.
         """
-        all_outgoing_bb = list(
-            set(item for sublist in cb.outgoing_basic_blocks_as_dict.values()
-                for item in sublist))
-        if (len(all_outgoing_bb) != 1) | \
-                (len(cb.outgoing_basic_blocks(method.key)) != 1):
-            end_pc = cb.end.pc
-            Cbbs = Cbbs + [cb]
-            outg_bb_startpcs = \
-                [bb.start.pc for bb in all_outgoing_bb]
-            return bbs, rbbs, end_pc, Cbbs, outg_bb_startpcs
-        else:
+        while True:
+            all_outgoing_bb = list(
+                set(item for sublist in
+                    cb.outgoing_basic_blocks_as_dict.values()
+                    for item in sublist))
+            if (len(all_outgoing_bb) != 1) | \
+                    (len(cb.outgoing_basic_blocks(method.key)) != 1):
+                end_pc = cb.end.pc
+                Cbbs.append(cb)
+                outg_bb_startpcs = \
+                    [bb.start.pc for bb in all_outgoing_bb]
+                return bbs, rbbs, end_pc, Cbbs, outg_bb_startpcs
             nbb = cb.outgoing_basic_blocks(method.key)[0]
             all_inc_bb = list(
                 set(item for sublist in
@@ -566,17 +629,15 @@ class CDG():
                     item in sublist))
             if len(all_inc_bb) > 1:
                 end_pc = cb.end.pc
-                Cbbs = Cbbs + [cb]
+                Cbbs.append(cb)
                 outg_bb_startpcs = [bb.start.pc for bb in
                                     all_outgoing_bb]
                 return bbs, rbbs, end_pc, Cbbs, outg_bb_startpcs
-            else:
-                new_bbs = bbs.copy()
-                new_bbs.remove(nbb)
-                rbbs = rbbs + [nbb]
-                Cbbs = Cbbs + [cb]
-                return self.Compactify_Basic_Blocks(
-                    method, nbb, new_bbs, rbbs, Cbbs)
+            # The next basic_block is part of the same CompactNode.
+            bbs.remove(nbb)
+            rbbs.append(nbb)
+            Cbbs.append(cb)
+            cb = nbb
 
     def Merge_Double_Nodes(self, _double_nodes):
         """Merge Compact Nodes that are shared by multiple methods by setting\
@@ -619,15 +680,20 @@ class CDG():
         compactNodes: The CompactNodes in this control-flow-graph with \
                       updated incoming- and outgoing_node_ids.
         """
+        # Shared nodes can be found by the node_id of each of the methods.
+        allIdIndex = {}
+        startPcIndex = {}
+        for cNode in compactNodes:
+            for node_id in cNode.all_node_ids:
+                allIdIndex.setdefault(node_id, cNode)
+            startPcIndex.setdefault(cNode.start_pc, cNode)
+
         for startNode_id in simple_edges.keys():
             for outg_node_startpc in simple_edges[startNode_id]:
-                startNode = next((cNode for cNode in compactNodes if
-                                  startNode_id in cNode.all_node_ids), None)
+                startNode = allIdIndex.get(startNode_id)
                 assert startNode is not None, "No startNode was found for a "\
                     f"simple edge from {startNode_id} to {outg_node_startpc}"
-                endNode = next((cNode for cNode in
-                                compactNodes if cNode.start_pc ==
-                                outg_node_startpc), None)
+                endNode = startPcIndex.get(outg_node_startpc)
 
                 if endNode.node_id not in startNode.outg_node_ids:
                     startNode.outg_node_ids.append(endNode.node_id)
@@ -761,8 +827,7 @@ class CDG():
             w.label = i
             # Finding semidominators
             for v_id in w.inc_node_ids:
-                v = next((compactNode for compactNode in self.CompactNodes if
-                          compactNode.node_id == v_id), None)
+                v = self.NodeIndex.get(v_id)
                 assert v is not None, \
                     "No Node was found from the list of incoming nodes!"
                 u = self.EVAL(v)
@@ -771,9 +836,7 @@ class CDG():
 
             # Add w to the bucket of its semidominator
             self.vertex[w.semi].bucket.add(w)
-            newEdge = next((cEdge for cEdge in self.CompactEdges if (
-                cEdge.startNode_id == w.parent.node_id) &
-                (cEdge.endNode_id == w.node_id)), None)
+            newEdge = self.EdgeIndex.get((w.parent.node_id, w.node_id))
             assert newEdge is not None, \
                 "No Edge was found between a node and its parent!"
             forestEdges.add(newEdge)
@@ -814,41 +877,53 @@ class CDG():
 
         # The incoming and outgoing node_ids can be set by using the dom_ids,
         # the edges go from each node to their dominator
+        dominated_ids = {}
+        for cNode in self.vertex:
+            if cNode.dom is not None:
+                dominated_ids.setdefault(cNode.dom.node_id, []).append(
+                    cNode.node_id)
         Edges = []
         for i in range(self.n, 0, -1):
             self.vertex[i].inc_node_ids = [self.vertex[i].dom.node_id]
-            self.vertex[i].outg_node_ids = [
-                cNode.node_id for cNode in
-                self.vertex if cNode.dom == self.vertex[i]]
+            self.vertex[i].outg_node_ids = dominated_ids.get(
+                self.vertex[i].node_id, [])
             assert self.vertex[i].dom is not None, \
                 "There is a non-root node without an immediate dominator!"
-            Edges = Edges + \
-                [CompactEdge(self.vertex[i].dom.node_id,
-                             self.vertex[i].node_id,
-                             self.vertex[i].dom.predicate)]
+            Edges.append(CompactEdge(self.vertex[i].dom.node_id,
+                                     self.vertex[i].node_id,
+                                     self.vertex[i].dom.predicate))
+
+        self.vertex[0].outg_node_ids = dominated_ids.get(
+            self.vertex[0].node_id, [])
 
-        self.vertex[0].outg_node_ids = [
-            cNode.node_id for cNode in
-            self.vertex if cNode.dom == self.vertex[0]]
+        # The position of each node in self.vertex and the nodes by their
+        # last basic block, in the order of self.vertex.
+        position = {cNode.node_id: i for i, cNode in enumerate(self.vertex)}
+        lastBlockNodes = {}
+        for cNode in self.vertex:
+            lastBlockNodes.setdefault(cNode.basic_blocks[-1], []).append(cNode)
 
         for Edge in Edges:
             if (Edge.predicate.eval == "NONE") | \
                     (Edge.predicate.eval == "ISZERO"):
                 # Check if the lack of a predicate is a result of a &&- or ||-
                 # statement in the code
-                pNode = next(cNode for cNode in self.vertex if
-                             Edge.startNode_id == cNode.node_id)
+                pNode = self.NodeIndex[Edge.startNode_id]
+                # The parent of pNode is the node it is dominated by, the root
+                # node has no parent.
+                ppNode = pNode.dom
+                if ppNode is None:
+                    continue
                 try:
-                    ppNode = next(cNode for cNode in self.vertex if
-                                  Edge.startNode_id in cNode.outg_node_ids)
                     all_inc_bb = pNode.basic_blocks[0].\
                         all_incoming_basic_blocks
                     if len(all_inc_bb) == 2:
                         # There is another basic block with the predicate
-                        predicateNode = next(cNode for cNode in self.vertex if
-                                             (cNode.node_id != ppNode.node_id)
-                                             & (cNode.basic_blocks[-1] in
-                                                all_inc_bb))
+                        predicateNode = min(
+                            (cNode for bb in all_inc_bb for cNode in
+                             lastBlockNodes.get(bb, []) if
+                             cNode.node_id != ppNode.node_id),
+                            key=lambda cNode: position[cNode.node_id])
 
                         if (len(predicateNode.outg_node_ids) == 0) & \
                                 (predicateNode.predicate.eval != "NONE"):
@@ -862,24 +937,38 @@ class CDG():
 
         # The CompactEdges are equal to the edges from the forest
         self.CompactEdges = Edges
+        self.PredicatePcs = sorted(set(cEdge.predicate.pc for cEdge in Edges))
+        self.Build_Indexes()
 
     def DFS(self, v):
-        """Create a spanning-tree using Depth-First Search."""
+        """Create a spanning-tree using Depth-First Search, the nodes that \
+        are being visited are kept on a stack with the children that are \
+        left to visit."""
         v.semi = self.n
         self.vertex[self.n] = v
         self.n += 1
-        for w_id in v.outg_node_ids:
-            w = next((compactNode for compactNode in
-                      self.CompactNodes if compactNode.node_id == w_id), None)
+        stack = [(v, iter(v.outg_node_ids))]
+        while stack:
+            v, children = stack[-1]
+            w_id = next(children, None)
+            if w_id is None:
+                # All children of v have been visited.
+                stack.pop()
+                if stack:
+                    assert stack[-1][0].node_id in v.inc_node_ids, \
+                        "Something went wrong with the Incoming Node ids!"
+                continue
+            w = self.NodeIndex.get(w_id)
             if w is None:
                 logging.error("This is the node I cannot find children for.")
                 v.show_CompactNode(True)
             assert w is not None, "No child node was found!"
             if w.semi == 0:
                 w.parent = v
-                self.DFS(w)
-                assert v.node_id in w.inc_node_ids, \
-                    "Something went wrong with the Incoming Node ids!"
+                w.semi = self.n
+                self.vertex[self.n] = w
+                self.n += 1
+                stack.append((w, iter(w.outg_node_ids)))
 
     def EVAL(self, _v,):
         """Implement the EVAl function from Lengauer-Tarjan algorithm."""
@@ -890,9 +979,13 @@ class CDG():
             return self.vertex[_v.label]
 
     def COMPRESS(self, _v):
-        """COMPRESS function from Lengauer-Tarjan algorithm."""
-        if _v.ancestor.ancestor is not None:
-            self.COMPRESS(_v.ancestor)
+        """COMPRESS function from Lengauer-Tarjan algorithm, the path of \
+        ancestors is compressed from the top down."""
+        path = []
+        while _v.ancestor.ancestor is not None:
+            path.append(_v)
+            _v = _v.ancestor
+        for _v in reversed(path):
             if self.vertex[_v.ancestor.label].semi < \
                     self.vertex[_v.label].semi:
                 _v.label = _v.ancestor.label
@@ -914,3 +1007,32 @@ class CDG():
             print("Edges:")
             for cEdge in self.CompactEdges:
                 cEdge.show_CompactEdge()
+
+
+if __name__ == '__main__':
+    # Time the construction of the CDG and the approach levels of contracts,
+    # run from this folder: python CDG.py <contract json> ...
+    import json
+    import sys
+    import time
+    from SmartContract import SmartContract
+    logging.basicConfig(level=logging.ERROR)
+    assert len(sys.argv) > 1, "Usage: python CDG.py <contract json> ..."
+    predicates = ["LT", "GT", "SLT", "SGT", "EQ"]
+    for contract_json_location in sys.argv[1:]:
+        with open(contract_json_location, 'r') as f:
+            contract_json = json.load(f)
+        start_time = time.time()
+        cdg = CDG(contract_json['contractName'],
+                  contract_json['deployedBytecode'], predicates)
+        cdg.LT(predicates)
+        cdg_time = time.time() - start_time
+        start_time = time.time()
+        SmartContract(contract_json, cdg, [],
+                      [method['name'] for method in contract_json['abi'] if
+                       method['type'] == 'function'])
+        sc_time = time.time() - start_time
+        print(f"{contract_json['contractName']}: "
+              f"{len(cdg.CompactNodes)} nodes, {len(cdg.CompactEdges)} "
+              f"edges, CDG in {cdg_time:.3f} s, approach levels in "
+              f"{sc_time:.3f} s")
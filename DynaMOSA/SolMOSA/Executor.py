@@ -0,0 +1,466 @@
+"""
+This module contains all code necessary to keep the blockchain executors \
+alive for the whole run of the SolMOSA algorithm.
+
+Classes:
+    - ExecutionBackend: The interface of everything that can run tests for
+                        SolMOSA, see PyEVM_Executor for a backend that does
+                        not need a blockchain client.
+    - Executor:     A long-lived SC_interaction.js process that deploys and
+                    calls the smart contract under investigation whenever it
+                    is asked to.
+    - ExecutorPool: A pool of Executors, each connected to its own blockchain,
+                    that run the tests of a test suite concurrently.
+    - PrefixCache:  A cache of the results of method call prefixes in front of
+                    another backend, so that tests of which the results are
+                    already known are not run again.
+"""
+
+import abc
+import datetime
+import json
+import logging
+import math
+import queue
+import subprocess
+import threading
+
+from Prefix_Trie import call_key, prefix_hashes
+from Trace_Decoder import decode_reply
+
+
+class ExecutionBackend(abc.ABC):
+    """
+    The interface of an execution backend, which deploys and calls the smart \
+    contract under investigation following the tests it is given.
+
+    Properties:
+        - blockchain_time:  The total time spent waiting for the backend.
+        - trace_digest:     The function that replaces each trace by its
+                            digest, None to keep the traces themselves.
+    """
+
+    blockchain_time = None
+    trace_digest = None
+
+    @abc.abstractmethod
+    def set_trace_filter(self, tracePcs, predicatePcs):
+        """
+        Only return the trace steps that are needed to follow the execution \
+        through the CDG and to calculate branch distances.
+
+        Arguments:
+            - tracePcs:     The start and end pcs of all basic blocks.
+            - predicatePcs: The pcs of the predicates, for which the top of
+                            the stack is returned as well.
+        """
+
+    def set_trace_digest(self, digest):
+        """
+        Replace the trace of each method call by its digest as soon as it \
+        is received, so that no more than the traces of a single test are \
+        held at a time. The trace of the constructor is not used and is \
+        replaced by None.
+
+        Arguments:
+            - digest:   A function of a compact trace, e.g. Test.digest_trace
+                        with the CDG bound to it.
+        """
+        self.trace_digest = digest
+
+    def digest(self, trace, constructor=False):
+        """
+        The digest of a trace, see set_trace_digest.
+
+        Arguments:
+            - trace:        A compact trace, or a string describing why there
+                            is no trace, which is kept as it is. The trace of
+                            the constructor may be None, it is not fetched.
+            - constructor:  Whether it is the trace of the constructor.
+        Outputs:
+            - The digest of the trace, or the trace itself if there is no
+              trace_digest.
+        """
+        if (self.trace_digest is None) | isinstance(trace, str):
+            return trace
+        if constructor:
+            return None
+        return self.trace_digest(trace)
+
+    @abc.abstractmethod
+    def run_tests(self, tests):
+        """
+        Deploy and call the smart contract following each of the tests.
+
+        Arguments:
+            - tests:    The test inputs, one list of method calls per test, as
+                        generated by TestSuite.generate_test_inputs().
+        Outputs:
+            - A generator of (test index, traces, returnvals) tuples, one for
+              each test in any order. The traces are digested if there is a
+              trace_digest.
+        """
+
+    def latencies(self):
+        """
+        The latency histograms of the requests the backend sent to its \
+        blockchain, if it keeps track of them.
+
+        Outputs:
+            - A dict mapping each JSON-RPC method to a dict with its count,
+              total_ms, the upper bounds (in ms, None for infinity) of the
+              histogram bins and the counts per bin.
+        """
+        return {}
+
+    def log_latencies(self):
+        """Log a summary of the latency histograms, see latencies()."""
+        for method, histogram in sorted(self.latencies().items()):
+            bins = ", ".join(
+                f"<={bound}: {count}" if bound is not None
+                else f">{histogram['bounds'][-2]}: {count}"
+                for bound, count in zip(histogram['bounds'],
+                                        histogram['counts']) if count > 0)
+            logging.info(f"{method}: {histogram['count']} requests, mean "
+                         f"{histogram['total_ms'] / histogram['count']:.1f} "
+                         f"ms ({bins} ms)")
+
+    @abc.abstractmethod
+    def close(self):
+        """Release everything the backend holds on to."""
+
+
+class Executor(ExecutionBackend):
+    """
+    A long-lived node process running SC_interaction.js, which is started \
+    once per run so that Node.js, web3 and the providers are only set up once.
+
+    Properties:
+        - process:  The SC_interaction.js process, requests are written to its
+                    stdin and replies are read from its stdout.
+        - log:      The file that the output of SC_interaction.js is logged to.
+        - blockchain_time:  The total time spent waiting for
+                            SC_interaction.js.
+    """
+
+    process = None
+    log = None
+    blockchain_time = None
+
+    def __init__(self, abi, bytecode, ETH_port,
+                 log_location="Ganache_Interaction.log"):
+        """
+        Start SC_interaction.js and wait until it is ready to receive \
+        requests.
+
+        Arguments:
+            - abi:          The abi of the smart contract under investigation.
+            - bytecode:     The bytecode of the smart contract under
+                            investigation.
+            - ETH_port:     The port at which the Ethereum blockchain
+                            simulator is listening.
+            - log_location: The file the blockchain interaction is logged to.
+        """
+        callstring = "node SC_interaction.js".split() + ["--abi"] + [abi]\
+            + ["--bytecode"] + [bytecode] + ["--ETH_port"] + [ETH_port]
+        self.blockchain_time = datetime.timedelta(0)
+        self.log = open(log_location, "a")
+        self.process = subprocess.Popen(
+            callstring, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=self.log, universal_newlines=True, bufsize=1)
+        reply = self.receive()
+        assert reply['status'] == 'ready', \
+            f"SC_interaction.js did not start properly: {reply}"
+
+    def send(self, request):
+        """Send a single request to SC_interaction.js."""
+        self.process.stdin.write(json.dumps(request) + "\n")
+        self.process.stdin.flush()
+
+    def receive(self):
+        """Wait for and return the next reply of SC_interaction.js."""
+        start_time = datetime.datetime.now()
+        line = self.process.stdout.readline()
+        self.blockchain_time += datetime.datetime.now() - start_time
+        assert len(line) > 0, \
+            "SC_interaction.js stopped unexpectedly, check the blockchain " \
+            f"log for more info: {self.log.name}"
+        return decode_reply(line)
+
+    def set_trace_filter(self, tracePcs, predicatePcs):
+        """
+        Only let the executor send back the trace steps that are needed to \
+        follow the execution through the CDG and to calculate branch \
+        distances.
+
+        Arguments:
+            - tracePcs:     The start and end pcs of all basic blocks.
+            - predicatePcs: The pcs of the predicates, for which the top of
+                            the stack is sent back as well.
+        """
+        self.send({"command": "trace_filter", "tracePcs": list(tracePcs),
+                   "predicatePcs": list(predicatePcs)})
+        reply = self.receive()
+        assert reply['status'] == 'done', \
+            f"SC_interaction.js failed to set the trace filter: {reply}"
+
+    def run_tests(self, tests):
+        """
+        Deploy and call the smart contract following each of the tests.
+
+        Arguments:
+            - tests:    The test inputs, one list of method calls per test, as
+                        generated by TestSuite.generate_test_inputs().
+        Outputs:
+            - A generator of (test index, traces, returnvals) tuples, one for
+              each test in the order in which they were run. Results are
+              yielded as soon as they are received, so they can be processed
+              while the next test is still running.
+        """
+        self.send({"command": "run", "tests": tests})
+        while True:
+            reply = self.receive()
+            if 'test' not in reply:
+                break
+            yield reply['test'], \
+                [self.digest(trace, k == 0)
+                 for k, trace in enumerate(reply['traces'])], \
+                reply['returnvals']
+        assert reply['status'] == 'done', \
+            f"SC_interaction.js failed to run the tests: {reply['error']}"
+
+    def latencies(self):
+        """Ask SC_interaction.js for the latency histograms of its JSON-RPC \
+        requests, see ExecutionBackend.latencies."""
+        self.send({"command": "latencies"})
+        reply = self.receive()
+        assert reply['status'] == 'done', \
+            f"SC_interaction.js failed to send its latencies: {reply}"
+        return reply['latencies']
+
+    def close(self):
+        """Stop SC_interaction.js."""
+        if self.process.poll() is None:
+            self.send({"command": "exit"})
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                logging.warning("SC_interaction.js did not stop in time, "
+                                "killing it instead.")
+                self.process.kill()
+        self.log.close()
+
+
+class ExecutorPool(ExecutionBackend):
+    """
+    A pool of Executors that are each connected to a different blockchain. \
+    The tests are divided over the Executors, which run them concurrently.
+
+    Properties:
+        - executors:        The Executors in the pool, one for each port.
+        - blockchain_time:  The total time spent waiting for the Executors.
+    """
+
+    executors = []
+    blockchain_time = None
+
+    def __init__(self, abi, bytecode, ETH_ports,
+                 log_location="Ganache_Interaction.log"):
+        """
+        Start an Executor for each of the blockchains in the pool.
+
+        Arguments:
+            - abi:          The abi of the smart contract under investigation.
+            - bytecode:     The bytecode of the smart contract under
+                            investigation.
+            - ETH_ports:    The ports at which the Ethereum blockchain
+                            simulators are listening.
+            - log_location: The file the blockchain interaction is logged to.
+        """
+        assert len(ETH_ports) > 0, "The pool needs at least one blockchain!"
+        self.blockchain_time = datetime.timedelta(0)
+        start_time = datetime.datetime.now()
+        self.executors = [Executor(abi, bytecode, ETH_port, log_location)
+                          for ETH_port in ETH_ports]
+        self.blockchain_time += datetime.datetime.now() - start_time
+
+    def set_trace_filter(self, tracePcs, predicatePcs):
+        """Set the trace filter of every Executor in the pool, see \
+        Executor.set_trace_filter."""
+        for executor in self.executors:
+            executor.set_trace_filter(tracePcs, predicatePcs)
+
+    def set_trace_digest(self, digest):
+        """Set the trace digest of every Executor in the pool, so that the \
+        traces are digested by the thread that receives them."""
+        for executor in self.executors:
+            executor.set_trace_digest(digest)
+
+    def run_tests(self, tests):
+        """
+        Divide the tests over the Executors and run them concurrently.
+
+        Arguments:
+            - tests:    The test inputs, one list of method calls per test, as
+                        generated by TestSuite.generate_test_inputs().
+        Outputs:
+            - A generator of (test index, traces, returnvals) tuples, one for
+              each test in the order in which they arrive. The tests are
+              sorted by their method calls and each Executor gets a
+              contiguous part of them, so that tests with a common prefix of
+              method calls are mostly run by the same Executor.
+        """
+        n = len(self.executors)
+        order = sorted(range(len(tests)),
+                       key=lambda k: [call_key(method) for method in tests[k]])
+        size = math.ceil(len(tests) / n)
+        results = queue.Queue()
+        threads = []
+        for j, executor in enumerate(self.executors):
+            shard = order[j * size:(j + 1) * size]
+            thread = threading.Thread(
+                target=self.collect, args=(executor, tests, shard, results),
+                daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        for _ in range(len(tests)):
+            start_time = datetime.datetime.now()
+            result = results.get()
+            self.blockchain_time += datetime.datetime.now() - start_time
+            if isinstance(result, Exception):
+                for thread in threads:
+                    thread.join()
+                raise result
+            yield result
+
+        for thread in threads:
+            thread.join()
+
+    def collect(self, executor, tests, shard, results):
+        """
+        Run a shard of the tests on a single Executor and put the results \
+        in the queue, using the index of each test in the whole test suite.
+
+        Arguments:
+            - executor: The Executor that runs the shard.
+            - tests:    All tests of the test suite.
+            - shard:    The indices of the tests that are run by the Executor.
+            - results:  The queue the results are put in.
+        """
+        try:
+            for i, traces, returnvals in executor.run_tests(
+                    [tests[k] for k in shard]):
+                results.put((shard[i], traces, returnvals))
+        except Exception as err:
+            results.put(err)
+
+    def latencies(self):
+        """Merge the latency histograms of all Executors in the pool, see \
+        ExecutionBackend.latencies."""
+        ans = {}
+        for executor in self.executors:
+            for method, histogram in executor.latencies().items():
+                if method not in ans:
+                    ans[method] = histogram
+                    continue
+                ans[method]['count'] += histogram['count']
+                ans[method]['total_ms'] += histogram['total_ms']
+                ans[method]['counts'] = [
+                    a + b for a, b in zip(ans[method]['counts'],
+                                          histogram['counts'])]
+        return ans
+
+    def close(self):
+        """Stop all Executors in the pool."""
+        for executor in self.executors:
+            executor.close()
+
+
+class PrefixCache(ExecutionBackend):
+    """
+    A cache in front of another backend, holding the trace and return value \
+    of the last method call of each prefix of method calls that was run, by \
+    the hash of the prefix. Only the tests of which not all results are \
+    cached are run by the backend, e.g. offspring that are equal to, or a \
+    prefix of, an earlier test are not run again.
+
+    Properties:
+        - backend:  The backend that runs the tests that are not cached.
+        - cache:    The (trace, returnval) of each prefix that was used by
+                    the current or the last tests, by its prefix_hashes. The
+                    digest of the trace is cached if the backend has a
+                    trace_digest.
+        - hits:     The number of tests of which all results were cached.
+        - misses:   The number of tests that were run by the backend.
+    """
+
+    backend = None
+    cache = {}
+    hits = 0
+    misses = 0
+
+    def __init__(self, backend):
+        """
+        Arguments:
+            - backend:  The backend that runs the tests that are not cached.
+        """
+        self.backend = backend
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def blockchain_time(self):
+        """The total time spent waiting for the backend."""
+        return self.backend.blockchain_time
+
+    def set_trace_filter(self, tracePcs, predicatePcs):
+        """See ExecutionBackend.set_trace_filter, cached traces were not \
+        filtered in the same way so they are forgotten."""
+        self.cache = {}
+        self.backend.set_trace_filter(tracePcs, predicatePcs)
+
+    def set_trace_digest(self, digest):
+        """See ExecutionBackend.set_trace_digest, the digests are cached \
+        instead of the traces so cached traces are forgotten."""
+        self.cache = {}
+        self.backend.set_trace_digest(digest)
+
+    def run_tests(self, tests):
+        """See ExecutionBackend.run_tests. The results of the cached tests \
+        are yielded first, only the prefixes used by these tests are kept for \
+        the next tests."""
+        cache = {}
+        uncached = []
+        hashes = [prefix_hashes(test) for test in tests]
+        for k in range(len(tests)):
+            if all(h in self.cache for h in hashes[k]):
+                self.hits += 1
+                results = [self.cache[h] for h in hashes[k]]
+                cache.update(zip(hashes[k], results))
+                yield k, [trace for trace, _ in results], \
+                    [returnval for _, returnval in results]
+            else:
+                self.misses += 1
+                uncached.append(k)
+
+        for i, traces, returnvals in self.backend.run_tests(
+                [tests[k] for k in uncached]):
+            k = uncached[i]
+            cache.update(zip(hashes[k], zip(traces, returnvals)))
+            yield k, traces, returnvals
+        self.cache = cache
+
+    def latencies(self):
+        """See ExecutionBackend.latencies."""
+        return self.backend.latencies()
+
+    def close(self):
+        """Log how many tests were cached and close the backend."""
+        if self.hits + self.misses > 0:
+            logging.info(f"{self.hits} of {self.hits + self.misses} tests "
+                         f"({100 * self.hits / (self.hits + self.misses):.1f}"
+                         f"%) were not run, as all their results were "
+                         f"cached.")
+        self.backend.close()
@@ -0,0 +1,107 @@
+"""
+This module contains all code necessary to remember the fitness of test \
+cases across generations, so that test cases that were evaluated before, \
+e.g. clones of their parents, are not run on the blockchain again.
+
+Classes:
+    - FitnessCache: A least recently used cache of the distance vector and
+                    return values of test cases, by the hash of their content.
+"""
+
+import logging
+
+from collections import OrderedDict
+from Prefix_Trie import prefix_hashes
+
+
+class FitnessCache():
+    """
+    A cache holding the distance vector and return values of the most \
+    recently used test cases, by the hash of the methodName, inputvars, \
+    fromAcc and value of each of their method calls.
+
+    Properties:
+        - capacity:     The maximum number of test cases in the cache, the
+                        least recently used test case is evicted first.
+        - entries:      The (distance_vector, returnVals) of each test case,
+                        from least to most recently used.
+        - hits:         The number of lookups of a test case in the cache.
+        - misses:       The number of lookups of a test case not in the cache.
+        - evictions:    The number of test cases that were evicted.
+    """
+
+    capacity = 0
+    entries = None
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    def __init__(self, capacity):
+        """
+        Arguments:
+            - capacity: The maximum number of test cases in the cache, 0
+                        disables the cache.
+        """
+        assert capacity >= 0, "The capacity of the cache can't be negative!"
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, test_input):
+        """
+        The content hash of a test case.
+
+        Arguments:
+            - test_input:   The method calls of the test case, see
+                            TestCase.input_dicts().
+        Outputs:
+            - The hash of the whole test case, see Prefix_Trie.prefix_hashes.
+        """
+        return prefix_hashes(test_input)[-1]
+
+    def get(self, key):
+        """
+        Look up a test case and mark it as the most recently used.
+
+        Arguments:
+            - key:  The content hash of the test case, see key().
+        Outputs:
+            - The (distance_vector, returnVals) of the test case or None if it
+              is not in the cache.
+        """
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, distance_vector, returnVals):
+        """
+        Add an evaluated test case to the cache, evicting the least recently \
+        used test case if the cache is full.
+
+        Arguments:
+            - key:              The content hash of the test case, see key().
+            - distance_vector:  The distance vector of the test case.
+            - returnVals:       The return values of the test case.
+        """
+        if self.capacity == 0:
+            return
+        self.entries[key] = (distance_vector, returnVals)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def log_statistics(self):
+        """Log the hit rate of the cache."""
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return
+        logging.info(f"Fitness cache: {self.hits} of {lookups} test cases "
+                     f"({100 * self.hits / lookups:.1f}%) were cached, "
+                     f"{self.evictions} were evicted and {len(self.entries)} "
+                     f"of at most {self.capacity} are kept.")
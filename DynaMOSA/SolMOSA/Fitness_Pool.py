@@ -0,0 +1,131 @@
+"""
+This module contains all code necessary to compute the distance vectors of \
+test cases in a pool of worker processes, so that the traces of a \
+generation are followed through the CDG on all cores.
+
+Classes:
+    - FitnessPool:      A pool of worker processes that each hold the CDG and
+                        the approach levels of the smart contract.
+
+Functions:
+    - auto_chunksize:   Choose the number of tests sent to a worker at once.
+    - init_worker:      Keep the CDG and ApproachLevels in a worker process.
+    - update_distance:  Compute the distance vector of a test in a worker.
+"""
+
+import multiprocessing
+
+from Test import TestCase, digest_trace
+
+# The CDG and ApproachLevels of the worker process, set once when the pool
+# starts.
+_cdg = None
+_approach_levels = None
+
+
+class FitnessPool():
+    """
+    A pool of worker processes that compute distance vectors. The CDG and \
+    the approach levels are sent to each worker once when the pool starts, \
+    after that only the method calls and traces of the tests are sent.
+
+    Properties:
+        - workers:      The number of worker processes.
+        - chunksize:    The number of tests that are sent to a worker at once,
+                        0 to choose it for each generation, see
+                        auto_chunksize.
+        - pool:         The multiprocessing pool.
+    """
+
+    workers = 0
+    chunksize = 0
+    pool = None
+
+    def __init__(self, workers, cdg, approach_levels, chunksize=0):
+        """
+        Arguments:
+            - workers:          The number of worker processes.
+            - cdg:              The CDG of the smart contract.
+            - approach_levels:  The ApproachLevels between all the branches in
+                                the smart contract.
+            - chunksize:        The number of tests that are sent to a worker
+                                at once, 0 to choose it for each generation.
+        """
+        assert workers > 0, "The pool needs at least one worker!"
+        assert chunksize >= 0, "The chunksize can't be negative!"
+        self.workers = workers
+        self.chunksize = chunksize
+        self.pool = multiprocessing.Pool(
+            workers, initializer=init_worker, initargs=(cdg, approach_levels))
+
+    def update_distances(self, tests, callResults):
+        """
+        Compute the distance vectors of tests in the worker processes.
+
+        Arguments:
+            - tests:        The test cases, by their index.
+            - callResults:  An iterable of (test index, methodResults,
+                            returnvals) tuples, as yielded by
+                            ExecutionBackend.run_tests. The traces are
+                            digested by the workers, so the backend should
+                            not have a trace_digest.
+        Outputs:
+            - A generator of (test index, distance_vector, returnvals)
+              tuples, one for each test in the order in which they are
+              computed.
+        """
+        chunksize = self.chunksize
+        if chunksize == 0:
+            chunksize = auto_chunksize(len(tests), self.workers)
+        return self.pool.imap_unordered(
+            update_distance,
+            ((k, tests[k].methodCalls, methodResults, returnvals)
+             for k, methodResults, returnvals in callResults),
+            chunksize)
+
+    def close(self):
+        """Stop the worker processes."""
+        self.pool.close()
+        self.pool.join()
+
+
+def auto_chunksize(n_tests, workers):
+    """
+    Choose the number of tests that are sent to a worker at once, the same \
+    way multiprocessing.Pool.map does: about four chunks per worker. Larger \
+    chunks send fewer messages, but a chunk is only sent once all of its \
+    tests have been run and the last chunks leave workers idle.
+
+    Arguments:
+        - n_tests:  The number of tests of the generation.
+        - workers:  The number of worker processes.
+    Outputs:
+        - The chunksize, at least 1.
+    """
+    return max(1, -(-n_tests // (4 * workers)))
+
+
+def init_worker(cdg, approach_levels):
+    """Keep the CDG and ApproachLevels in the worker process."""
+    global _cdg, _approach_levels
+    _cdg = cdg
+    _approach_levels = approach_levels
+
+
+def update_distance(task):
+    """
+    Compute the distance vector of a test in a worker process.
+
+    Arguments:
+        - task: A (test index, methodCalls, methodResults, returnvals) tuple.
+    Outputs:
+        - A (test index, distance_vector, returnvals) tuple.
+    """
+    k, methodCalls, methodResults, returnvals = task
+    # The constructor is not followed through the CDG.
+    methodResults = methodResults[:1] + [
+        digest_trace(methodResult, _cdg) if isinstance(methodResult, list)
+        else methodResult for methodResult in methodResults[1:]]
+    test = TestCase(methodCalls, None)
+    test.update_distance(methodResults, returnvals, _cdg, _approach_levels)
+    return k, test.distance_vector, test.returnVals
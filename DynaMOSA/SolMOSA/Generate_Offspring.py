@@ -2,8 +2,8 @@
 existing generation of test cases."""
 
 import random
-import copy
 import string
+import numpy as np
 # import logging
 
 from Test import TestCase, MethodCall
@@ -22,7 +22,7 @@ def generate_offspring(test_cases, SmartContract, accounts, _maxArrayLength,
     selection, crossover and mutation.
 
     Arguments:
-        - test_cases:               The set of parent test-cases.
+        - test_cases:               The Population of parent test-cases.
         - accounts:                 The list of accounts that can interact
                                     with deployed smart contracts.
         - poss_methods:             A dictionary of all the methods of the
@@ -49,19 +49,23 @@ def generate_offspring(test_cases, SmartContract, accounts, _maxArrayLength,
                                        max_method_calls, _maxArrayLength,
                                        _minArrayLength, _nonExistantAccount)
         else:
-            child1 = copy.deepcopy(parent1)
-            child2 = copy.deepcopy(parent2)
+            # The children are clones, mutate creates new test cases that
+            # share the unchanged method calls with their parents.
+            child1 = parent1
+            child2 = parent2
 
-        mutate(child1, accounts, _maxArrayLength, _addresspool, _ETHpool,
-               _intpool, _stringpool, poss_methods, max_method_calls,
-               remove_probability, change_probability, insert_probability,
-               _passTimeTime, _zeroAddress, _nonExistantAccount,
-               _maxWei, _minArrayLength)
-        mutate(child2, accounts, _maxArrayLength, _addresspool, _ETHpool,
-               _intpool, _stringpool, poss_methods, max_method_calls,
-               remove_probability, change_probability, insert_probability,
-               _passTimeTime, _zeroAddress, _nonExistantAccount,
-               _maxWei, _minArrayLength)
+        child1 = mutate(child1, accounts, _maxArrayLength, _addresspool,
+                        _ETHpool, _intpool, _stringpool, poss_methods,
+                        max_method_calls, remove_probability,
+                        change_probability, insert_probability,
+                        _passTimeTime, _zeroAddress, _nonExistantAccount,
+                        _maxWei, _minArrayLength)
+        child2 = mutate(child2, accounts, _maxArrayLength, _addresspool,
+                        _ETHpool, _intpool, _stringpool, poss_methods,
+                        max_method_calls, remove_probability,
+                        change_probability, insert_probability,
+                        _passTimeTime, _zeroAddress, _nonExistantAccount,
+                        _maxWei, _minArrayLength)
 
         if child1 == parent1:
             assert child2 == parent2, \
@@ -80,22 +84,20 @@ def tournament_selection(testCases, tournament_size):
     distance.
 
     Arguments:
-        - testCases:        The set of potential parent test-cases.
+        - testCases:        The Population of potential parent test-cases.
         - tournament_size:  The number of participating test-cases in the
                             tournament.
     Outputs:
         - winner:           The optimal test-case according to non-dominated
                             Pareto front and sub-vector distance.
     """
-    participants = random.sample(testCases, tournament_size)
-    winner = participants[0]
-    for participant in participants[1:]:
-        if participant.rank < winner.rank:
-            winner = participant
-        elif (participant.rank == winner.rank) & \
-                (participant.subvector_dist < winner.subvector_dist):
-            winner = participant
-    return winner
+    participants = np.array(
+        random.sample(range(len(testCases)), tournament_size))
+    # The lowest rank, of those the lowest subvector distance, the first of
+    # those if there are several.
+    order = np.lexsort((testCases.subvector_dists[participants],
+                        testCases.ranks[participants]))
+    return testCases.tests[participants[order[0]]]
 
 
 def crossover(testCase1, testCase2, SmartContract, accounts,
@@ -142,7 +144,9 @@ def mutate(testCase, accounts, _maxArrayLength, _addresspool, _ETHpool,
            _maxWei, val_dict={}, _minArrayLength=1):
     """
     Mutate a given test case by removing one or more method calls, \
-    changing the method calls input value or inserting new method calls.
+    changing the method calls input value or inserting new method calls. \
+    The test case itself is not changed, the mutated test case shares the \
+    method calls that are not changed with it.
 
     Arguments:
         - testCase:           The test-case to be mutated.
@@ -159,28 +163,29 @@ def mutate(testCase, accounts, _maxArrayLength, _addresspool, _ETHpool,
     Outputs:
         - The mutated test-case
     """
+    methodCalls = list(testCase.methodCalls)
     if random.uniform(0, 1) <= remove_probability:
         # Remove mutation
-        delprob = len(testCase.methodCalls)
-        for i, methodCall in enumerate(testCase.methodCalls):
+        delprob = len(methodCalls)
+        for i, methodCall in enumerate(methodCalls):
             # Each methodcall is deleted with probability \
             # 1/length(testCase.methodCalls)
             if random.uniform(0, delprob) <= 1:
                 if i == 0:
                     pass  # We can not delete the constructor
                 else:
-                    del testCase.methodCalls[i]
+                    del methodCalls[i]
     if random.uniform(0, 1) <= change_probability:
         # Change mutation
-        for i, methodCall in enumerate(testCase.methodCalls):
-            old_inputvars = methodCall.inputvars
-            new_inputvars = old_inputvars.copy()
-            new_fromAcc = methodCall.fromAcc
-            new_value = methodCall.value
-            old_value = new_value
+        for i, methodCall in enumerate(methodCalls):
             # Each methodcall is changed with probability \
             # 1/length(testCase.methodCalls)
-            if random.uniform(0, len(testCase.methodCalls)) <= 1:
+            if random.uniform(0, len(methodCalls)) <= 1:
+                old_inputvars = methodCall.inputvars
+                new_inputvars = old_inputvars.copy()
+                new_fromAcc = methodCall.fromAcc
+                new_value = methodCall.value
+                old_value = new_value
                 if random.uniform(0, 1) <= 0.95:  # mutate inputvars
                     if len(old_inputvars) == 0:
                         pass
@@ -194,7 +199,9 @@ def mutate(testCase, accounts, _maxArrayLength, _addresspool, _ETHpool,
                                     else:
                                         pos = random.randint(
                                             0, len(old_inputvar) - 1)
-                                        old_inputvarlist = old_inputvar
+                                        # The list can be shared with
+                                        # other method calls.
+                                        old_inputvarlist = old_inputvar.copy()
                                         old_inputvar = old_inputvar[pos]
                                 if isinstance(old_inputvar, bool):
                                     new_inputvar = not old_inputvar
@@ -247,20 +254,19 @@ def mutate(testCase, accounts, _maxArrayLength, _addresspool, _ETHpool,
                         else:
                             new_value = int(min(_maxWei, old_value + delta))
 
-            methodName = methodCall.methodName
-            new_methodCall = MethodCall(methodName, new_inputvars,
-                                        new_fromAcc, new_value,
-                                        methodCall.payable, _maxArrayLength,
-                                        _minArrayLength=_minArrayLength,
-                                        _zeroAddress=_zeroAddress,
-                                        _nonExistantAccount=_nonExistantAccount
-                                        )
-            testCase.methodCalls[i] = new_methodCall
+                methodName = methodCall.methodName
+                new_methodCall = MethodCall(
+                    methodName, new_inputvars, new_fromAcc, new_value,
+                    methodCall.payable, _maxArrayLength,
+                    _minArrayLength=_minArrayLength,
+                    _zeroAddress=_zeroAddress,
+                    _nonExistantAccount=_nonExistantAccount)
+                methodCalls[i] = new_methodCall
     if random.uniform(0, 1) <= insert_probability:
         # Insert mutation
         add_new = True
         prop = 0
-        while(add_new) & (len(testCase.methodCalls) < max_method_calls):
+        while(add_new) & (len(methodCalls) < max_method_calls):
             new_methodCall = MethodCall(
                 None, None, None, None, _payable=None,
                 _maxArrayLength=_maxArrayLength,
@@ -270,14 +276,14 @@ def mutate(testCase, accounts, _maxArrayLength, _addresspool, _ETHpool,
                 _passTimeTime=_passTimeTime, _zeroAddress=_zeroAddress,
                 _nonExistantAccount=_nonExistantAccount,
                 _maxWei=_maxWei)
-            if len(testCase.methodCalls) == 1:
+            if len(methodCalls) == 1:
                 loc = 1
             else:
-                loc = random.choice(range(1, len(testCase.methodCalls)))
-            testCase.methodCalls.insert(loc, new_methodCall)
+                loc = random.choice(range(1, len(methodCalls)))
+            methodCalls.insert(loc, new_methodCall)
             prop += 1
             add_new = random.uniform(0, 1) <= 0.5**prop
-    return
+    return TestCase(methodCalls, _maxArrayLength)
 
 
 def mutate_string(s):
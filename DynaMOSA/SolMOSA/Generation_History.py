@@ -0,0 +1,162 @@
+"""
+This module contains all code necessary to keep the archives and test cases \
+of the generations of a run, according to a retention policy that bounds the \
+memory a run needs.
+
+Classes:
+    - GenerationHistory:    The archive and packed test cases of the last
+                            generations, earlier generations are forgotten or
+                            spilled to disk.
+
+Functions:
+    - load_history:         Read the generations that were spilled to disk.
+"""
+
+import logging
+import pickle
+
+from collections import deque
+from Method_Call_Codec import MethodCallCodec
+
+RETENTION_POLICIES = ["final", "last", "disk"]
+
+
+class GenerationHistory():
+    """
+    The history of the generations of a run. Each generation consists of a \
+    snapshot of the archive and the packed test cases of the generation, \
+    with the "final" retention policy only the final archive is kept.
+
+    Properties:
+        - retention:        The retention policy:
+                            "final" keeps the final generation only,
+                            "last" keeps the last size generations,
+                            "disk" keeps the final generation and spills
+                            every generation to the spill_location.
+        - size:             The number of generations that are kept.
+        - codec:            The MethodCallCodec that packs the test cases.
+        - generations:      The (archive, packed test cases) of the kept
+                            generations, from oldest to newest.
+        - count:            The number of generations that were added.
+        - spill_location:   The file the generations are spilled to.
+        - spill_file:       The open spill file.
+    """
+
+    retention = "final"
+    size = 1
+    codec = None
+    generations = None
+    count = 0
+    spill_location = None
+    spill_file = None
+
+    def __init__(self, retention, size, accounts, spill_location=None):
+        """
+        Arguments:
+            - retention:        The retention policy, see RETENTION_POLICIES.
+            - size:             The number of generations to keep if the
+                                retention policy is "last".
+            - accounts:         The accounts used by the test cases, see
+                                MethodCallCodec.
+            - spill_location:   The file to spill the generations to if the
+                                retention policy is "disk".
+        """
+        assert retention in RETENTION_POLICIES, \
+            f"Unknown retention policy: {retention}, it should be one of " \
+            f"{RETENTION_POLICIES}."
+        self.retention = retention
+        if retention == "last":
+            assert size > 0, "At least one generation should be kept!"
+            self.size = size
+        else:
+            self.size = 1
+        self.codec = MethodCallCodec(accounts)
+        self.generations = deque(maxlen=self.size)
+        self.count = 0
+        self.spill_location = None
+        self.spill_file = None
+        if retention == "disk":
+            assert spill_location is not None, \
+                "The generations can't be spilled without a spill location!"
+            self.spill_location = spill_location
+            self.spill_file = open(spill_location, "wb")
+
+    def add(self, archive, tests):
+        """
+        Add a generation, forgetting the oldest generation if size \
+        generations are kept. The test cases are only packed if the \
+        retention policy keeps or spills the generation, with the "final" \
+        policy the final archive is all that is kept.
+
+        Arguments:
+            - archive:  The archive after the generation, a snapshot is kept
+                        as the archive itself is updated in place.
+            - tests:    The test cases of the generation.
+        """
+        self.count += 1
+        if self.retention == "final":
+            return
+        packed_tests = [self.codec.pack_test(test) for test in tests]
+        self.generations.append((list(archive), packed_tests))
+        if self.spill_file is not None:
+            packed_archive = [None if test is None
+                              else self.codec.pack_test(test)
+                              for test in archive]
+            pickle.dump((packed_archive, packed_tests), self.spill_file)
+
+    def close(self, archive):
+        """
+        Finish the history, the final archive replaces the snapshot of the \
+        last generation.
+
+        Arguments:
+            - archive:  The final archive.
+        Outputs:
+            - The kept archives, the last one is the final archive.
+        """
+        if len(self.generations) > 0:
+            self.generations[-1] = (list(archive), self.generations[-1][1])
+        else:
+            self.generations.append((list(archive), []))
+        if self.spill_file is not None:
+            # The tables of the codec are needed to unpack the generations.
+            pickle.dump(self.codec, self.spill_file)
+            self.spill_file.close()
+            self.spill_file = None
+            logging.info(f"{self.count} generations were spilled to "
+                         f"{self.spill_location}.")
+        if self.retention != "final":
+            logging.info("The test cases of the {} kept generations take {} "
+                         "bytes packed.".format(
+                             len(self.generations),
+                             sum(len(test) for archive, tests in
+                                 self.generations for test in tests)))
+        return [archive for archive, tests in self.generations]
+
+
+def load_history(spill_location, _maxArrayLength):
+    """
+    Read the generations that a GenerationHistory spilled to disk.
+
+    Arguments:
+        - spill_location:   The file the generations were spilled to.
+        - _maxArrayLength:  The maximum length of array inputs.
+    Outputs:
+        - A list with the (archive, test cases) of each generation, without
+          any distances or return values.
+    """
+    records = []
+    with open(spill_location, "rb") as f:
+        while True:
+            try:
+                records.append(pickle.load(f))
+            except EOFError:
+                break
+    assert len(records) > 0 and isinstance(records[-1], MethodCallCodec), \
+        f"{spill_location} was not closed by its GenerationHistory."
+    codec = records.pop()
+    return [([None if test is None
+              else codec.unpack_test(test, _maxArrayLength)
+              for test in archive],
+             [codec.unpack_test(test, _maxArrayLength) for test in tests])
+            for archive, tests in records]
@@ -10,7 +10,11 @@ show_settings    -- shows the settings, both from the config file and specified
  by the user. Called just before starting the experiments.
 create_rapport   -- creates human-readable rapports to show the results,
  also writes the results to a .csv-file for computer interpretation.
+ganache_sessions -- lists the GNU screen sessions and commands used to run a
+ Ganache client for each of the blockchains in the pool.
 log_du           -- logs the disk usage for debugging.
+reset_peak_rss   -- resets the peak resident memory of the process.
+peak_rss         -- returns the peak resident memory of the process.
 count_statements -- counts the number of statements in the smart contract under
  investigation.
 """
@@ -23,6 +27,12 @@ import csv
 import re
 import sys
 
+try:
+    import resource
+except ImportError:
+    # The resource module is not available on Windows.
+    resource = None
+
 from pyfiglet import figlet_format
 from SolMOSA import SolMOSA
 
@@ -50,7 +60,8 @@ def main():
     # Run SolMOSA and Create Rapports
     # Initialise the csv file for easy computer analysis
     columns = ["Name", "Tot. Statements", "Tot. Branches", "Branches Covered",
-               "Generations", "Blockchain Time", "Offchain Time", "Total time"]
+               "Generations", "Blockchain Time", "Offchain Time", "Total time",
+               "Peak RSS (MB)"]
     with open("results.csv", mode="w") as f:
         f_writer = csv.writer(f, delimiter=',', quotechar="'",
                               quoting=csv.QUOTE_MINIMAL)
@@ -109,12 +120,13 @@ def main():
 
                 # run SolMOSA on it with these settings.
                 for i in range(Execution_Times):
+                    reset_peak_rss()
                     archives, tSuite, run_time, blockchain_time, iterations,\
                         relevant_targets = SolMOSA(config)
                     rapport = create_rapport(archives, tSuite, run_time,
                                              blockchain_time, iterations,
                                              folder, statementCount,
-                                             relevant_targets)
+                                             relevant_targets, peak_rss())
                     rapports = rapports + [rapport]
                     logging.info("Writing Rapport to {}".format(
                         Rapports_folder + "/" +
@@ -126,42 +138,14 @@ def main():
                               'w') as f:
                         f.write(rapport)
                     if memory_efficient:
-                        """
                         # We log the current size of our system and /tmp/
-                        # folder in specific
-                        """
-                        logging.debug("Folder Sizes in / before resetting\
-                         Ganache")
+                        # folder in specific. The blockchains are reverted to
+                        # a snapshot before every test, so they should not
+                        # grow between runs.
+                        logging.debug("Folder Sizes in /")
                         log_du("/")
                         logging.debug("Sizes in /tmp/")
                         log_du("/tmp/")
-                        logging.debug("Folder Sizes in / before resetting\
-                         Ganache")
-                        log_du("/")
-                        logging.debug("Sizes in /tmp/")
-                        log_du("/tmp/")
-                    # We restart the Ganache blockchain for memory efficiency
-                    logging.info("\tResetting Blockchain...")
-                    callstring = 'screen -S ganache -X stuff "^C"'
-                    os.system(callstring)
-                    if memory_efficient:
-                        # Clear old blockchain from the /tmp directory
-                        callstring = "rm -r /tmp/tmp-*"
-                        subprocess.call(callstring, shell=True)
-                        logging.debug("Folder Sizes in / after resetting"
-                                      "Ganache")
-                        log_du("/")
-                        logging.debug("Sizes in /tmp/")
-                        log_du("/tmp/")
-                        logging.debug("Folder Sizes in / after resetting"
-                                      "Ganache")
-                        log_du("/")
-                        logging.debug("Sizes in /tmp/")
-                        log_du("/tmp/")
-                    #  Start new instance of Ganache
-                    callstring = 'screen -S ganache -X stuff "ganache-cli -d -e\
-                     100000000000000000000\r"'
-                    os.system(callstring)
 
     # After finishing all rapports ask to show rapports.
     proper_response = False
@@ -181,6 +165,20 @@ def main():
     return
 
 
+def ganache_sessions(_ETH_ports):
+    """
+    List the GNU screen sessions and ganache-cli commands that run the \
+    blockchain at ETH_port ("ganache") and each blockchain in the pool of \
+    ETH_ports ("ganache_<port>").
+    """
+    ganache_command = "ganache-cli -d -e 100000000000000000000"
+    sessions = [("ganache", ganache_command)]
+    for ETH_port in _ETH_ports:
+        port = ETH_port.rstrip("/").split(":")[-1]
+        sessions.append((f"ganache_{port}", f"{ganache_command} -p {port}"))
+    return sessions
+
+
 def set_settings(_config, _ETH_port, _SmartContract_folder):
     """Solicit final settings from user."""
     affirmative = ["y", "Y", "yes", "Yes", "YES"]
@@ -188,7 +186,8 @@ def set_settings(_config, _ETH_port, _SmartContract_folder):
     proper_response = False
 
     Ganache_string = """Would you like to start a Ganache client for easy """\
-        """testing on GNU screen "ganache"? (y/n)"""
+        """testing on GNU screen "ganache" (and "ganache_<port>" for """\
+        """each port in ETH_ports)? (y/n)"""
     ETH_port_string = """Please make sure you have a local blockchain """\
         """running, currently the settings expect the blockchain to be """\
         """listening on port {}\n\nIs this still correct? (y/n)""".format(
@@ -201,16 +200,21 @@ def set_settings(_config, _ETH_port, _SmartContract_folder):
         """display the parameter settings? (y/n)""".format(
             os.path.dirname(os.path.realpath(__file__)))
 
-    # Give the user a chance to launch a ganache blockchain
+    # Give the user a chance to launch a ganache blockchain, the py-evm
+    # backend does not need one.
+    if _config['Blockchain']['backend'] == "py-evm":
+        proper_response = True
+        blockchain_running = True
     while not proper_response:
         response = input("{}".format(Ganache_string))
         if response in affirmative:
-            # Launch a ganache-client in another screen
-            callstring = 'screen -dmS ganache'
-            os.system(callstring)
-            callstring = 'screen -S ganache -X stuff "ganache-cli -d -e\
-             100000000000000000000\r"'
-            os.system(callstring)
+            # Launch a ganache-client in another screen for each blockchain
+            for session, command in ganache_sessions(
+                    eval(_config['Blockchain']['ETH_ports'])):
+                callstring = f'screen -dmS {session}'
+                os.system(callstring)
+                callstring = f'screen -S {session} -X stuff "{command}\r"'
+                os.system(callstring)
             proper_response = True
             blockchain_running = True
         elif response in negative:
@@ -296,13 +300,13 @@ def show_settings(config):
 
 
 def create_rapport(archives, tSuite, run_time, blockchain_time, iterations,
-                   folder, _statementCount, _relevant_targets):
+                   folder, _statementCount, _relevant_targets, _peak_rss=None):
     """
     Take the result of a test run and write a rapport.
 
     Inputs:
-        - archives: The archive of each generation during the testing process
-         (the last archive is the final test suite.)
+        - archives: The archives of the generations kept by the
+         history_retention policy (the last archive is the final test suite.)
         - tSuite: The test suite object at the end of the testing process.
         - run_time: The total time that it took to test a single smart contract
          once.
@@ -314,6 +318,8 @@ def create_rapport(archives, tSuite, run_time, blockchain_time, iterations,
         - _statementCount:   The number of statements in the smart contract.
         - _relevant_targets: A list of ordered Booleans indicating which edges
                              are relevant.
+        - _peak_rss:         The peak resident memory of the run in MB, None
+                             if it could not be measured.
     Output:
         - A human-readable rapport file is created
         - The main results are added to a csv file for easy processing.
@@ -326,7 +332,8 @@ def create_rapport(archives, tSuite, run_time, blockchain_time, iterations,
                                   quoting=csv.QUOTE_MINIMAL)
             f_writer.writerow([contractName, _statementCount, 1, 1, iterations,
                                blockchain_time,
-                               run_time - blockchain_time, run_time])
+                               run_time - blockchain_time, run_time,
+                               _peak_rss])
         return "No branches found, any method call will work!"
     else:
         best_tests = [best_test for best_test, relevant in zip(
@@ -343,6 +350,7 @@ def create_rapport(archives, tSuite, run_time, blockchain_time, iterations,
             f"""Number of Branches Covered:\t\t{nrBranchesCovered}\n"""\
             f"""Runtime: \t\t\t\t\t\t\t\t\t\t\t{run_time}\n"""\
             f"""Blockchain Time: \t\t\t\t\t\t\t{blockchain_time}\n"""\
+            f"""Peak RSS (MB): \t\t\t\t\t\t\t{_peak_rss}\n"""\
             f"""Iterations\t\t\t\t\t\t\t\t\t\t\n{iterations}"""\
             """\n--------------------------------------------------\n"""\
             """METHODS:\n\n"""\
@@ -384,7 +392,7 @@ def create_rapport(archives, tSuite, run_time, blockchain_time, iterations,
                                len(
                 [best_test for best_test in best_tests
                  if best_test is not None]), iterations, blockchain_time,
-                run_time - blockchain_time, run_time])
+                run_time - blockchain_time, run_time, _peak_rss])
 
         return rapport
 
@@ -397,6 +405,36 @@ def log_du(path):
             .split()[0].decode('utf-8'))
 
 
+def reset_peak_rss():
+    """Reset the peak resident memory of the process, so that peak_rss \
+    returns the peak of the next run. This is only possible on Linux, \
+    elsewhere peak_rss returns the peak since the process started."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss():
+    """Return the peak resident memory of the process in MB, or None if it \
+    can not be measured. The memory of blockchain clients is not included."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak = peak / 1024
+    return round(peak / 1024, 1)
+
+
 def count_statements(_contractSol):
     """Count the number of statements in a .sol file."""
     regex = r""";(?=([^\"\']*[\"\'][^\"\']*\")*[^\"\']*$)"""
@@ -0,0 +1,226 @@
+"""
+This module contains all code necessary to pack the method calls of test \
+cases into a compact binary form, so that the test cases of earlier \
+generations can be kept without keeping their objects alive.
+
+Classes:
+    - MethodCallCodec:  Packs method calls into bytes and unpacks them again,
+                        using tables of the method names and accounts.
+"""
+
+from Test import TestCase, MethodCall
+
+# The tags of the packed input variables.
+NONE = 0
+FALSE = 1
+TRUE = 2
+UINT = 3
+NEG_INT = 4
+ACCOUNT = 5
+STRING = 6
+LIST = 7
+
+
+class MethodCallCodec():
+    """
+    Packs a method call into its method index, account index, payable flag, \
+    value and input variables. Integers are packed as varints, accounts as \
+    their index in the account table and other strings as utf-8.
+
+    Properties:
+        - methodNames:  The method name of each method index.
+        - methodIndex:  The method index of each method name.
+        - accounts:     The account of each account index.
+        - accountIndex: The account index of each account.
+    """
+
+    methodNames = None
+    methodIndex = None
+    accounts = None
+    accountIndex = None
+
+    def __init__(self, accounts=()):
+        """
+        Arguments:
+            - accounts: The accounts that are expected to be used, other
+                        accounts are added to the table the first time they
+                        are the fromAcc of a method call.
+        """
+        self.methodNames = []
+        self.methodIndex = {}
+        self.accounts = []
+        self.accountIndex = {}
+        for account in accounts:
+            self.account_index(account)
+
+    def method_index(self, methodName):
+        """The index of a method name, it is added to the table if needed."""
+        index = self.methodIndex.get(methodName)
+        if index is None:
+            index = len(self.methodNames)
+            self.methodIndex[methodName] = index
+            self.methodNames.append(methodName)
+        return index
+
+    def account_index(self, account):
+        """The index of an account, it is added to the table if needed."""
+        index = self.accountIndex.get(account)
+        if index is None:
+            index = len(self.accounts)
+            self.accountIndex[account] = index
+            self.accounts.append(account)
+        return index
+
+    def pack(self, methodCall, buffer=None):
+        """
+        Pack a method call.
+
+        Arguments:
+            - methodCall:   The MethodCall to pack.
+            - buffer:       A bytearray to append the packed method call to.
+        Outputs:
+            - The buffer, a new bytearray if none was given.
+        """
+        if buffer is None:
+            buffer = bytearray()
+        pack_uint(self.method_index(methodCall.methodName), buffer)
+        pack_uint(self.account_index(methodCall.fromAcc), buffer)
+        buffer.append(TRUE if methodCall.payable else FALSE)
+        self.pack_var(methodCall.value, buffer)
+        self.pack_var(methodCall.inputvars, buffer)
+        return buffer
+
+    def unpack(self, buffer, pos=0):
+        """
+        Unpack a method call.
+
+        Arguments:
+            - buffer:   The bytes holding the packed method call.
+            - pos:      The position of the method call in the buffer.
+        Outputs:
+            - methodCall:   The unpacked MethodCall.
+            - pos:          The position after the method call in the buffer.
+        """
+        method, pos = unpack_uint(buffer, pos)
+        account, pos = unpack_uint(buffer, pos)
+        payable = buffer[pos] == TRUE
+        value, pos = self.unpack_var(buffer, pos + 1)
+        inputvars, pos = self.unpack_var(buffer, pos)
+        methodCall = MethodCall(self.methodNames[method], inputvars,
+                                self.accounts[account], value, payable, None)
+        return methodCall, pos
+
+    def pack_test(self, testCase):
+        """
+        Pack the method calls of a test case.
+
+        Arguments:
+            - testCase: The TestCase to pack.
+        Outputs:
+            - The packed method calls as bytes.
+        """
+        buffer = bytearray()
+        pack_uint(len(testCase.methodCalls), buffer)
+        for methodCall in testCase.methodCalls:
+            self.pack(methodCall, buffer)
+        return bytes(buffer)
+
+    def unpack_test(self, buffer, _maxArrayLength):
+        """
+        Unpack a test case, without any distances or return values.
+
+        Arguments:
+            - buffer:           The bytes returned by pack_test.
+            - _maxArrayLength:  The maximum length of array inputs.
+        Outputs:
+            - The unpacked TestCase.
+        """
+        count, pos = unpack_uint(buffer, 0)
+        methodCalls = []
+        for i in range(count):
+            methodCall, pos = self.unpack(buffer, pos)
+            methodCalls.append(methodCall)
+        return TestCase(methodCalls, _maxArrayLength)
+
+    def pack_var(self, var, buffer):
+        """Append a tagged input variable to the buffer."""
+        if var is None:
+            buffer.append(NONE)
+        elif isinstance(var, bool):
+            buffer.append(TRUE if var else FALSE)
+        elif isinstance(var, int):
+            if var >= 0:
+                buffer.append(UINT)
+                pack_uint(var, buffer)
+            else:
+                buffer.append(NEG_INT)
+                pack_uint(-var, buffer)
+        elif isinstance(var, str):
+            index = self.accountIndex.get(var)
+            if index is not None:
+                buffer.append(ACCOUNT)
+                pack_uint(index, buffer)
+            else:
+                encoded = var.encode()
+                buffer.append(STRING)
+                pack_uint(len(encoded), buffer)
+                buffer.extend(encoded)
+        else:
+            assert isinstance(var, list), \
+                "Input variables of type {} can not be packed.".format(
+                    type(var))
+            buffer.append(LIST)
+            pack_uint(len(var), buffer)
+            for item in var:
+                self.pack_var(item, buffer)
+
+    def unpack_var(self, buffer, pos):
+        """Read a tagged input variable from the buffer, returns the input \
+        variable and the position after it."""
+        tag = buffer[pos]
+        pos += 1
+        if tag == NONE:
+            return None, pos
+        elif tag in (FALSE, TRUE):
+            return tag == TRUE, pos
+        elif tag == UINT:
+            return unpack_uint(buffer, pos)
+        elif tag == NEG_INT:
+            var, pos = unpack_uint(buffer, pos)
+            return -var, pos
+        elif tag == ACCOUNT:
+            index, pos = unpack_uint(buffer, pos)
+            return self.accounts[index], pos
+        elif tag == STRING:
+            length, pos = unpack_uint(buffer, pos)
+            return bytes(buffer[pos:pos + length]).decode(), pos + length
+        assert tag == LIST, "Unknown tag {} at {}.".format(tag, pos - 1)
+        length, pos = unpack_uint(buffer, pos)
+        var = []
+        for i in range(length):
+            item, pos = self.unpack_var(buffer, pos)
+            var.append(item)
+        return var, pos
+
+
+def pack_uint(n, buffer):
+    """Append a non-negative integer to the buffer as a varint, 7 bits per \
+    byte with the high bit set on all but the last byte."""
+    while n >= 0x80:
+        buffer.append((n & 0x7f) | 0x80)
+        n >>= 7
+    buffer.append(n)
+
+
+def unpack_uint(buffer, pos):
+    """Read a varint from the buffer, returns the integer and the position \
+    after it."""
+    n = 0
+    shift = 0
+    while True:
+        byte = buffer[pos]
+        pos += 1
+        n |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
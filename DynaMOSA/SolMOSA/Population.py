@@ -0,0 +1,84 @@
+"""
+This module contains all code necessary to keep the distances, lengths, \
+ranks and subvector distances of a generation of test cases in arrays, so \
+that selection can compare all test cases with whole-array operations.
+
+Classes:
+    - Population:   The test cases of a generation and their properties, one
+                    row per test case.
+"""
+
+import numpy as np
+
+
+class Population():
+    """
+    The test cases of a generation, each test case is a row of the arrays of \
+    the population and its distance_vector is a view of its row of the \
+    distance matrix.
+
+    Properties:
+        - tests:            The test cases, in the order of their rows.
+        - distances:        An N x E array, row k is the distance vector of
+                            tests[k] to each of the E targets.
+        - lengths:          The number of methodCalls of each test case.
+        - ranks:            The non-dominated Pareto front each test case
+                            belongs to, inf until the population is sorted.
+        - subvector_dists:  The subvector distance of each test case.
+    """
+
+    tests = None
+    distances = None
+    lengths = None
+    ranks = None
+    subvector_dists = None
+
+    def __init__(self, tests, n_targets):
+        """
+        Arguments:
+            - tests:        The evaluated test cases of the population.
+            - n_targets:    The number of targets, i.e. the length of the
+                            distance vectors.
+        """
+        self.tests = list(tests)
+        N = len(self.tests)
+        self.distances = np.empty((N, n_targets))
+        self.lengths = np.empty(N, dtype=int)
+        for row, test in enumerate(self.tests):
+            self.distances[row] = test.distance_vector
+            self.lengths[row] = len(test.methodCalls)
+            test.distance_vector = self.distances[row]
+        self.ranks = np.full(N, np.inf)
+        self.subvector_dists = np.zeros(N, dtype=int)
+
+    def __len__(self):
+        return len(self.tests)
+
+    def select(self, rows):
+        """
+        Create a population of some of the test cases, keeping their ranks \
+        and subvector distances.
+
+        Arguments:
+            - rows: The rows of the test cases to keep.
+        Outputs:
+            - A Population of the test cases in the given order.
+        """
+        rows = np.asarray(rows, dtype=int)
+        ans = Population([self.tests[k] for k in rows],
+                         self.distances.shape[1])
+        ans.ranks = self.ranks[rows]
+        ans.subvector_dists = self.subvector_dists[rows]
+        return ans
+
+    def union(self, other):
+        """
+        Create an unsorted population of the test cases of two populations.
+
+        Arguments:
+            - other:    The population to add to this one.
+        Outputs:
+            - A Population of the test cases of self followed by those of
+              other.
+        """
+        return Population(self.tests + other.tests, self.distances.shape[1])
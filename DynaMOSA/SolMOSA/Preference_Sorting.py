@@ -1,165 +1,146 @@
 """Implements the DynaMOSA preference sorting algorithm(s)."""
 
+import numpy as np
 
-def preference_sorting(test_cases, updated_targets, pop_size):
+# The maximum number of distances compared at once by dominance_matrix and
+# subvector_dist.
+COMPARISON_BLOCK_SIZE = 2 ** 22
+
+
+def preference_sorting(population, updated_targets, pop_size):
     """
     Identify non-dominated Pareto fronts from the current generation of \
     test-cases. The 0-th non-dominated Pareto front is found using the \
     preference criterion.
 
     Inputs:
-        - test_cases: The current generation of test cases.
+        - population: The Population of the current generation of test cases.
         - updated_targets: The currently relevant targets.
         - pop_size: The population size, the function can stop if enough \
           non-dominated Pareto fronts have been identified to form the next \
           generation.
     Outputs:
-        - Fs: An ordered list containing sets F, each F is a non-dominated \
-              Pareto front.
+        - Fs: An ordered list containing arrays F, each F holds the rows of \
+              the test cases of a non-dominated Pareto front.
     """
-    P = set(test_cases)
-    F = set()
-    Fs = []
-    for i, relevant in enumerate(updated_targets):
-        if relevant:
-            t_best = prefered(test_cases, i)
-            t_best.rank = 0
-            F.add(t_best)
-    P = P - F
-    Fs = Fs + [F]
+    targets = np.flatnonzero(updated_targets)
+    F = np.unique(prefered(population, targets))
+    population.ranks[F] = 0
+    P = np.setdiff1d(np.arange(len(population)), F)
+    Fs = [F]
     if len(F) > pop_size:
-        F = P
-        Fs = Fs + [F]
+        Fs = Fs + [P]
     else:
-        Fs = Fs + fast_non_dominated_sort(P, updated_targets)
+        Fs = Fs + fast_non_dominated_sort(population, P, updated_targets)
     return Fs
 
 
-def prefered(test_cases, i):
+def prefered(population, targets):
     """
-    Identify the "best test-case" for a given target in accordance with the \
-    preference criterion.
+    Identify the "best test-case" for each of the given targets in accordance \
+    with the preference criterion, i.e. the test case closest to the target \
+    with the fewest methodCalls.
 
     Inputs:
-        - test_cases: The current generation of test cases.
-        - i: The index of the target to cover.
+        - population: The Population of the current generation of test cases.
+        - targets: The indices of the targets to cover.
     Outputs:
-        - best_test: the best test-case for the given target in accordance \
-          with the preference criterion.
+        - best_rows: the row of the best test-case for each of the given \
+          targets in accordance with the preference criterion.
     """
-    test_cases = list(test_cases)
-    best_test = test_cases[0]
-    for tCase in test_cases[1:]:
-        if tCase.distance_vector[i] < best_test.distance_vector[i]:
-            best_test = tCase
-        elif (tCase.distance_vector[i] == best_test.distance_vector[i]) & \
-                (len(tCase.methodCalls) < len(best_test.methodCalls)):
-            best_test = tCase
-    return best_test
-
-
-def fast_non_dominated_sort(test_cases, updated_targets):
+    if len(targets) == 0:
+        return np.empty(0, dtype=int)
+    D = population.distances[:, targets]
+    # Of the closest test cases to a target take the shortest one, the first
+    # one of those if there are several.
+    closest = D == D.min(axis=0)
+    return np.argmin(np.where(closest, population.lengths[:, None], np.inf),
+                     axis=0)
+
+
+def fast_non_dominated_sort(population, rows, updated_targets):
     """
     Identify non-dominated Pareto fronts.
 
     Inputs:
-        - test_cases: the current generation of test-cases that are not in \
-                      the 0-th non-dominated Pareto front.
+        - population: The Population of the current generation of test cases.
+        - rows: the rows of the test-cases that are not in the 0-th \
+                non-dominated Pareto front.
         - updated_targets: The targets that are reached but not have not yet \
                            been covered.
     Outputs:
-        - Fs: An ordered list containing sets F, each F is a non-dominated \
-              Pareto front.
+        - Fs: An ordered list containing arrays F, each F holds the rows of \
+              the test cases of a non-dominated Pareto front.
     """
+    rows = np.asarray(rows, dtype=int)
+    dominates = dominance_matrix(
+        population.distances[np.ix_(rows, np.flatnonzero(updated_targets))])
+    n = dominates.sum(axis=0)
+
     Fs = []
-    F = set()
-    for p in test_cases:
-        S = []
-        n = 0
-        for q in test_cases:
-            if p != q:
-                dominates = dominance_comparator(p, q, updated_targets)
-                if dominates == 1:
-                    S = S + [q]
-                elif dominates == 0:
-                    n += 1
-
-        p.S = S
-        p.n = n
-        if n == 0:
-            p.rank = 1
-            F.add(p)
-
-    Fs = Fs + [F]
-    i = 1
-    while len(F) > 0:
-        Q = set()
-        for p in F:
-            for q in p.S:
-                q.n = q.n - 1
-                if q.n == 0:
-                    q.rank = i + 1
-                    Q.add(q)
-        i += 1
-        F = Q
+    remaining = np.ones(len(rows), dtype=bool)
+    front = n == 0
+    rank = 1
+    while front.any():
+        F = rows[front]
+        population.ranks[F] = rank
         Fs.append(F)
+        # Remove the front, the test cases it dominates lose one domination.
+        remaining &= ~front
+        n = n - dominates[front].sum(axis=0)
+        front = remaining & (n == 0)
+        rank += 1
+    Fs.append(np.empty(0, dtype=int))
     return Fs
 
 
-def dominance_comparator(p, q, updated_targets):
+def dominance_matrix(D):
     """
-    Determine whether one test-case dominates the other or no, given two test \
-    cases with their respected distance_vectors and the list of targets that \
-    are reached but have not yet been covered .
+    Determine for each pair of test cases whether the first dominates the \
+    second, given their distances to the targets that are reached but have \
+    not yet been covered.
 
     Inputs:
-        - p, q: Two test cases to compare
-        - updated_targets: The targets on which p and q should be compared \
-        for domination.
+        - D: An N x M array of the distances of N test cases to M targets.
     Outputs:
-        - 2 if p dominates q
-        - 1 if q dominates p
-        - 0 otherwise
+        - An N x N boolean array, entry [p, q] is True if test case p \
+          dominates test case q.
     """
-    dom1 = False
-    dom2 = False
-    for i, b in enumerate(updated_targets):
-        if b:
-            if p.distance_vector[i] < q.distance_vector[i]:
-                dom1 = True
-            elif q.distance_vector[i] < p.distance_vector[i]:
-                dom2 = True
-            if dom1 & dom2:
-                break
-
-    if dom1 == dom2:
-        return 2
-    elif dom1:
-        return 1
-    else:
-        return 0
-
-
-def subvector_dist(F, updated_targets):
+    N, M = D.shape
+    # better[p, q] is True if p is closer than q to any of the targets, the
+    # comparison is done for a block of rows at a time to bound its memory.
+    better = np.zeros((N, N), dtype=bool)
+    rows = max(1, COMPARISON_BLOCK_SIZE // max(1, N * M))
+    for start in range(0, N, rows):
+        better[start:start + rows] = \
+            (D[start:start + rows, None, :] < D[None, :, :]).any(axis=2)
+    return better & ~better.T
+
+
+def subvector_dist(population, F, updated_targets):
     """
-    Calculate and set the subvector distance for a given non-dominated front.
+    Calculate and set the subvector distance for a given non-dominated front, \
+    i.e. the largest number of targets that any other test case in the front \
+    is closer to.
 
     Inputs:
-        - F: A non-dominated set of test-cases.
+        - population: The Population of the current generation of test cases.
+        - F: The rows of a non-dominated set of test-cases.
         - updated_targets: The list of targets on which to compare the \
                            test-cases.
     """
-    for p in F:
-        dist = 0
-        for q in F:
-            if p == q:
-                pass
-            else:
-                cnt = 0
-                for i, b in enumerate(updated_targets):
-                    if b:
-                        if q.distance_vector[i] < p.distance_vector[i]:
-                            cnt += 1
-                if cnt > dist:
-                    dist = cnt
-        p.subvector_dist = dist
+    F = np.asarray(F, dtype=int)
+    N = len(F)
+    if N == 0:
+        return
+    D = population.distances[np.ix_(F, np.flatnonzero(updated_targets))]
+
+    # The number of targets each q is closer to than p, taking the maximum
+    # over q for a block of p at a time.
+    dist = np.empty(N, dtype=int)
+    rows = max(1, COMPARISON_BLOCK_SIZE // max(1, N * D.shape[1]))
+    for start in range(0, N, rows):
+        dist[start:start + rows] = \
+            (D[None, :, :] < D[start:start + rows, None, :]).sum(axis=2) \
+            .max(axis=1)
+    population.subvector_dists[F] = dist
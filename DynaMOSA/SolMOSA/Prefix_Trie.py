@@ -0,0 +1,106 @@
+"""
+This module contains all code necessary to organise the tests of a \
+generation in a trie of method call prefixes. Offspring share long prefixes \
+of method calls with their parents and with each other, each distinct prefix \
+only has to be executed once.
+
+Classes:
+    - TrieNode:     A node of the trie, i.e. a distinct prefix of method
+                    calls.
+
+Functions:
+    - call_key:         The key of a single method call.
+    - prefix_hashes:    The hash of each prefix of a test.
+    - build_trie:       Organise tests in a trie of method call prefixes.
+"""
+
+import hashlib
+import json
+
+
+class TrieNode():
+    """
+    A node of the trie of method call prefixes, the prefix of a node is the \
+    path of method calls from the root to the node.
+
+    Properties:
+        - method:       The last method call of the prefix, None for the root.
+        - tests:        The indices of the tests that end with this prefix.
+        - children:     The nodes of the method calls that follow this
+                        prefix, by their call_key.
+        - trace:        The trace of the last method call of the prefix, once
+                        it is executed.
+        - returnval:    The return value of the last method call of the
+                        prefix, once it is executed.
+    """
+
+    method = None
+    tests = []
+    children = {}
+    trace = None
+    returnval = None
+
+    def __init__(self, method):
+        self.method = method
+        self.tests = []
+        self.children = {}
+
+    def size(self):
+        """The number of method calls in the trie below this node."""
+        return sum(1 + child.size() for child in self.children.values())
+
+
+def call_key(method):
+    """
+    The key of a method call, method calls with the same key have the same \
+    result when they are executed on the same state.
+
+    Arguments:
+        - method:   A method call, see TestCase.input_dicts().
+    Outputs:
+        - A string holding the name, inputs, sender and value of the call.
+    """
+    return json.dumps([method['name'], method['inputVars'],
+                       method['fromAcc'], method['value']])
+
+
+def prefix_hashes(test):
+    """
+    The hash of each prefix of a test, the hash of a prefix is calculated \
+    from the hash of the prefix one call shorter and the key of its last call.
+
+    Arguments:
+        - test: The method calls of a test, see TestCase.input_dicts().
+    Outputs:
+        - A list holding the digest of test[:1], test[:2], ..., test[:n].
+    """
+    ans = []
+    digest = b""
+    for method in test:
+        digest = hashlib.blake2b(digest + call_key(method).encode(),
+                                 digest_size=16).digest()
+        ans.append(digest)
+    return ans
+
+
+def build_trie(tests):
+    """
+    Organise tests in a trie of method call prefixes.
+
+    Arguments:
+        - tests:    The method calls of each test, see
+                    TestSuite.generate_test_inputs().
+    Outputs:
+        - The root of the trie, the children of the root are the constructor
+          calls of the tests.
+    """
+    root = TrieNode(None)
+    for k, test in enumerate(tests):
+        node = root
+        for method in test:
+            key = call_key(method)
+            if key not in node.children:
+                node.children[key] = TrieNode(method)
+            node = node.children[key]
+        node.tests.append(k)
+    return root
@@ -0,0 +1,441 @@
+"""
+This module contains an execution backend that runs the tests inside the \
+python process itself, using the py-evm implementation of the EVM. It does \
+not need a blockchain client, node or any JSON-RPC calls.
+
+py-evm is an optional dependency, which is only needed when this backend is \
+selected in Config.ini: pip install py-evm==0.12.1b1. The backend reads the \
+stack of a computation, which py-evm has no public API for, so other \
+versions of py-evm may not work.
+
+Classes:
+    - PyEVMExecutor:    An execution backend that deploys and calls the smart
+                        contract on a local py-evm chain and records the
+                        traces by hooking into the execution of every opcode.
+"""
+
+import datetime
+import logging
+import time
+
+from Executor import ExecutionBackend
+from Prefix_Trie import build_trie, call_key
+
+try:
+    import eth
+    import eth_abi
+    from eth.chains.base import MiningChain
+    from eth.db.atomic import AtomicDB
+    from eth.db.backends.memory import MemoryDB
+    from eth.db.journal import JournalDB
+    from eth.tools.builder.chain import build, fork_at, disable_pow_check
+    from eth.vm.forks.petersburg import PetersburgVM
+    from eth.vm.forks.petersburg.computation import PetersburgComputation
+    from eth.vm.forks.petersburg.state import PetersburgState
+    from eth.vm.logic.invalid import InvalidOpcode
+    from eth.vm.spoof import SpoofTransaction
+    from eth_keys import keys
+    from eth_utils import (big_endian_to_int, function_abi_to_4byte_selector,
+                           to_bytes, to_canonical_address)
+    pyevm_available = True
+except ImportError:
+    pyevm_available = False
+
+# The version of py-evm the backend was tested with.
+PYEVM_VERSION = "0.12.1b1"
+
+# The private keys of the accounts of "ganache-cli -d", so the tests use the
+# same accounts with either backend.
+PRIVATE_KEYS = [
+    "4f3edf983ac636a65a842ce7c78d9aa706d3b113bce9c46f30d7d21715b23b1d",
+    "6cbed15c793ce57650b9877cf6fa156fbef513c4e6134f022a85b1ffdd59b2a1",
+    "6370fd033278c143179d81c5526140625662b8daa446c22ee2d73db3707e620c",
+    "646f1ce2fdad0e6deeeb5c7e8e5543bdde65e86029e2fd9fc169899c440a7913",
+    "add53f9a7e588d003326d1cbf9e4a43c061aadd9bc938c843a79e7b4fd2ad743",
+    "395df67f0c2d2d9fe1ad08d1bc8b6627011959b79c53d7dd6a3536a33ab8a4fd",
+    "e485d098507f54e7733a205420dfddbe58db035fa577fc294ebd14db90767a52",
+    "a453611d9419d0e56f499079478fd72c37b251a94bfde4d19872c44cf65386e3",
+    "829e924fdf021ba3dbbc4225edfece9aca04b929d6e75613329ca6f1d31c0bb4",
+    "b0057716d5917badaf911b193b12b910811c1497b5bada8d7711f758981c3773"]
+ACCOUNTS = [
+    "0x90F8bf6A479f320ead074411a4B0e7944Ea8c9C1",
+    "0xFFcf8FDEE72ac11b5c542428B35EEF5769C409f0",
+    "0x22d491Bde2303f2f43325b2108D26f1eAbA1e32b",
+    "0xE11BA2b4D45Eaed5996Cd0823791E0C93114882d",
+    "0xd03ea8624C8C5987235048901fB614fDcA89b117",
+    "0x95cED938F7991cd0dFcb48F0a06a40FA1aF46EBC",
+    "0x3E5e9111Ae8eB78Fe1CC3bb8915d5D461F3Ef9A9",
+    "0x28a8746e75304c0780E011BEd21C72cD78cd535E",
+    "0xACa94ef8bD5ffEE41947b4585a84BdA5a3d3DA6E",
+    "0x1dF62f291b2E969fB0849d99D9Ce41e2F137006e"]
+# The same balance ("-e 100000000000000000000" ether) and block gas limit as
+# the ganache-cli instances started by Main.py.
+BALANCE = 100000000000000000000 * 10**18
+GAS_LIMIT = 6721975
+
+
+class PyEVMExecutor(ExecutionBackend):
+    """
+    An execution backend that runs every test on a fresh py-evm chain, \
+    holding only the funded accounts, and records the trace of every \
+    transaction while it is executed. Tests share the execution of their \
+    common prefix of method calls, see Prefix_Trie, the state after a prefix \
+    is restored by discarding the changes of the tests that follow it.
+
+    Properties:
+        - abi:              The abi of the smart contract under investigation.
+        - bytecode:         The bytecode of the smart contract.
+        - functions:        The abi of each function by name and signature.
+        - chain_class:      The py-evm chain, using an EVM whose opcodes
+                            record the trace steps.
+        - trace:            The trace steps of the transaction that is
+                            currently executed, only the digest of the
+                            trace is kept once it is executed if there is a
+                            trace_digest.
+        - tracePcs:         The pcs of the trace steps that are recorded, all
+                            steps are recorded if this is None.
+        - predicatePcs:     The pcs of the trace steps of which the top of the
+                            stack is recorded.
+        - transactions:     A transaction signed by each of the ACCOUNTS,
+                            which is reused for all of its method calls.
+        - deployments:      The deployments used by the last tests, by the
+                            key of their constructor call, see deploy().
+        - blockchain_time:  The total time spent running tests.
+    """
+
+    abi = []
+    bytecode = b""
+    functions = None
+    chain_class = None
+    trace = None
+    tracePcs = None
+    predicatePcs = None
+    transactions = []
+    deployments = None
+    blockchain_time = None
+
+    def __init__(self, abi, bytecode):
+        """
+        Set up a py-evm chain that records the trace of every transaction.
+
+        Arguments:
+            - abi:      The abi of the smart contract under investigation, as
+                        found in the contract json.
+            - bytecode: The bytecode of the smart contract, as found in the
+                        contract json.
+        """
+        assert pyevm_available, "The py-evm backend requires py-evm to be "\
+            f"installed: pip install py-evm=={PYEVM_VERSION}"
+        if getattr(eth, "__version__", None) != PYEVM_VERSION:
+            logging.warning(f"The py-evm backend was tested with py-evm "
+                            f"{PYEVM_VERSION}, not with "
+                            f"{getattr(eth, '__version__', 'this version')}.")
+        self.abi = abi
+        self.bytecode = to_bytes(hexstr=bytecode)
+        self.functions = {}
+        for function in abi:
+            if function['type'] == 'function':
+                signature = "{}({})".format(function['name'], ",".join(
+                    inp['type'] for inp in function['inputs']))
+                self.functions.setdefault(function['name'], function)
+                self.functions[signature] = function
+        self.trace = []
+        self.predicatePcs = set()
+        self.deployments = {}
+        self.blockchain_time = datetime.timedelta(0)
+
+        class Opcodes(dict):
+            """Record unknown opcodes as INVALID before failing on them."""
+
+            def __missing__(opcodes, opcode):
+                return self.traced(InvalidOpcode(opcode), "INVALID")
+
+        opcodes = Opcodes({opcode: self.traced(opcode_fn, opcode_fn.mnemonic)
+                           for opcode, opcode_fn in
+                           PetersburgComputation.opcodes.items()})
+        computation_class = PetersburgComputation.configure(
+            __name__="TracedComputation", opcodes=opcodes)
+        state_class = PetersburgState.configure(
+            __name__="TracedState", computation_class=computation_class)
+        vm_class = PetersburgVM.configure(
+            __name__="TracedVM", _state_class=state_class)
+        self.chain_class = build(MiningChain, fork_at(vm_class, 0),
+                                 disable_pow_check())
+
+        # Signing every transaction takes far longer than executing it, so
+        # each account signs a single transaction of which the nonce, value,
+        # etc. are replaced for each method call.
+        self.transactions = []
+        for private_key in PRIVATE_KEYS:
+            tx = vm_class.create_unsigned_transaction(
+                nonce=0, gas_price=0, gas=0, to=b"", value=0, data=b"")\
+                .as_signed_transaction(
+                    keys.PrivateKey(bytes.fromhex(private_key)))
+            # Recover the sender once, it is cached by the transaction.
+            tx.sender
+            self.transactions.append(tx)
+
+    def traced(self, opcode_fn, mnemonic):
+        """Wrap an opcode so that its trace step is recorded before it is \
+        executed, the same way debug_traceTransaction would."""
+        def traced_opcode(computation):
+            pc = computation.code.program_counter - 1
+            if computation.msg.depth == 0:
+                if (self.tracePcs is None) | (pc in self.predicatePcs):
+                    # py-evm has no public API to read the stack.
+                    stack = getattr(getattr(computation, "_stack", None),
+                                    "values", None)
+                    assert stack is not None, \
+                        f"Can't read the stack of a computation of py-evm " \
+                        f"{getattr(eth, '__version__', '')}, the py-evm " \
+                        f"backend requires py-evm {PYEVM_VERSION}."
+                    self.trace.append([pc, mnemonic,
+                                       self.stack_word(stack, -1),
+                                       self.stack_word(stack, -2)])
+                elif pc in self.tracePcs:
+                    self.trace.append([pc, mnemonic])
+            opcode_fn(computation=computation)
+        return traced_opcode
+
+    def stack_word(self, stack, i):
+        """Write a stack item as hex, like debug_traceTransaction."""
+        if len(stack) < -i:
+            return None
+        val = stack[i]
+        if isinstance(val, tuple):
+            # Older versions of py-evm store the type of each item.
+            val = val[1]
+        if isinstance(val, bytes):
+            val = big_endian_to_int(val)
+        return "{:064x}".format(val)
+
+    def set_trace_filter(self, tracePcs, predicatePcs):
+        """See ExecutionBackend.set_trace_filter."""
+        self.tracePcs = set(tracePcs)
+        self.predicatePcs = set(predicatePcs)
+
+    def run_tests(self, tests):
+        """
+        See ExecutionBackend.run_tests. The tests are organised in a trie \
+        of method call prefixes, each distinct prefix is executed once and \
+        the results are yielded in the order of a depth-first walk through \
+        the trie. Only the deployments of these tests are kept for the next \
+        tests.
+        """
+        root = build_trie(tests)
+        logging.info(f"Running {len(tests)} tests with "
+                     f"{sum(len(test) for test in tests)} method calls, of "
+                     f"which {root.size()} distinct prefixes.")
+        deployments = {}
+        for node in root.children.values():
+            start_time = datetime.datetime.now()
+            state, address, node.trace, node.returnval = self.deploy(
+                node.method, deployments)
+            journal = chain = None
+            if address is not None:
+                # The tests write to a journal on top of the state of the
+                # deployment, which is kept as it is for the next tests.
+                journal = JournalDB(state)
+                chain = self.chain_class(AtomicDB(journal))
+            self.blockchain_time += datetime.datetime.now() - start_time
+            yield from self.run_node(node, [node], chain, journal, address)
+        self.deployments = deployments
+
+    def run_node(self, node, path, chain, journal, address):
+        """
+        Execute the method calls below a node of the trie, depth first.
+
+        Arguments:
+            - node:     The node of which the method call was executed last.
+            - path:     The nodes from the constructor call up to and
+                        including node.
+            - chain:    The chain holding the state after the method calls
+                        of path, None if the deployment failed.
+            - journal:  The JournalDB the chain writes to.
+            - address:  The address of the smart contract.
+        Outputs:
+            - A generator of (test index, traces, returnvals) tuples, one for
+              each test below the node.
+        """
+        for k in node.tests:
+            yield k, [n.trace for n in path], [n.returnval for n in path]
+        children = list(node.children.values())
+        for i, child in enumerate(children):
+            start_time = datetime.datetime.now()
+            # The last child continues on the chain itself. The others run on
+            # a new chain of which the changes are discarded afterwards, the
+            # chain itself still has the header of the state that is left.
+            checkpoint = None
+            if (chain is None) | (i == len(children) - 1):
+                child_chain = chain
+            else:
+                checkpoint = journal.record()
+                child_chain = self.chain_class(AtomicDB(journal))
+            child.trace, child.returnval = self.call(child.method,
+                                                     child_chain, address)
+            self.blockchain_time += datetime.datetime.now() - start_time
+            yield from self.run_node(child, path + [child], child_chain,
+                                     journal, address)
+            if checkpoint is not None:
+                journal.discard(checkpoint)
+
+    def new_chain(self, db):
+        """Create a chain in a database that only holds the funded \
+        accounts, so that every deployment starts from the same state."""
+        genesis_state = {to_canonical_address(account):
+                         {"balance": BALANCE, "nonce": 0, "code": b"",
+                          "storage": {}} for account in ACCOUNTS}
+        genesis_params = {"difficulty": 1, "gas_limit": GAS_LIMIT,
+                          "timestamp": int(time.time())}
+        return self.chain_class.from_genesis(AtomicDB(db), genesis_params,
+                                             genesis_state)
+
+    def call(self, method, chain, address):
+        """
+        Execute a single method call, other than the constructor.
+
+        Arguments:
+            - method:   The method call, see TestCase.input_dicts().
+            - chain:    The chain the method call is executed on, None if the
+                        deployment failed.
+            - address:  The address of the smart contract.
+        Outputs:
+            - The trace, or a string describing why there is no trace, and the
+              return value of the method call.
+        """
+        method_name = method['name']
+        if chain is None:
+            return "ConstructorFail", "ConstructorFail"
+        if method_name[:8] == 'passTime':
+            chain.set_header_timestamp(chain.header.timestamp
+                                       + int(method['inputVars'][0]))
+            chain.mine_block()
+            return method_name, method_name
+        if method_name[:10] == 'passBlocks':
+            chain.mine_block()
+            return method_name, method_name
+
+        computation = self.apply(chain, method, address)
+        if isinstance(computation, str):
+            return computation, computation
+        return self.digest(self.trace), computation.is_success
+
+    def deploy(self, method, deployments):
+        """
+        Deploy the smart contract with a constructor call, unless it was \
+        already deployed with the same arguments, sender and value by one of \
+        the current or the last tests.
+
+        Arguments:
+            - method:       The constructor call, see TestCase.input_dicts().
+            - deployments:  The deployments of the current tests, by the
+                            call_key of their constructor call.
+        Outputs:
+            - A (state, address, trace, returnval) tuple, where state is
+              the MemoryDB holding the chain right after the deployment, the
+              tests that start from it never write to it. The address and
+              state are None if the deployment failed.
+        """
+        key = call_key(method)
+        if key not in deployments:
+            if key in self.deployments:
+                deployments[key] = self.deployments[key]
+            else:
+                state = MemoryDB()
+                computation = self.apply(self.new_chain(state), method, b"")
+                if isinstance(computation, str) or \
+                        not computation.is_success:
+                    deployments[key] = (None, None, "ConstructorFail",
+                                        "ConstructorFail")
+                else:
+                    deployments[key] = (
+                        state, computation.msg.storage_address,
+                        self.digest(self.trace, constructor=True), "None")
+        return deployments[key]
+
+    def apply(self, chain, method, address):
+        """
+        Apply the transaction of a single method call to the chain and mine \
+        it, its trace is recorded in self.trace.
+
+        Arguments:
+            - chain:    The chain the transaction is applied to.
+            - method:   The method call, see TestCase.input_dicts().
+            - address:  The address of the smart contract, or b"" to deploy
+                        it.
+        Outputs:
+            - The computation of the transaction, or a string describing why
+              the transaction could not be sent.
+        """
+        method_name = method['name']
+        try:
+            data = self.encode_call(method_name, method['inputVars'])
+        except Exception as err:
+            logging.warning(f"Could not encode the inputs of "
+                            f"{method_name}: {err}")
+            return "Invalid Address"
+
+        if method['fromAcc'] in ACCOUNTS:
+            signed_tx = self.transactions[ACCOUNTS.index(method['fromAcc'])]
+        else:
+            logging.warning(f"{method['fromAcc']} is not one of the "
+                            f"accounts of the py-evm backend, using "
+                            f"{ACCOUNTS[0]} instead.")
+            signed_tx = self.transactions[0]
+        sender = signed_tx.sender
+        value = int(method['value'])
+        vm = chain.get_vm()
+        if vm.state.get_balance(sender) < value:
+            return "Out of Ether"
+
+        # The signature of the transaction was already checked, when its
+        # sender was recovered.
+        tx = SpoofTransaction(
+            signed_tx, nonce=vm.state.get_nonce(sender),
+            gas=chain.header.gas_limit, to=address, value=value, data=data,
+            validate=lambda: None)
+        self.trace = []
+        _, _, computation = chain.apply_transaction(tx)
+        chain.mine_block()
+        return computation
+
+    def encode_call(self, method_name, inputVars):
+        """Create the transaction data that calls a method, or deploys the \
+        smart contract, with the given inputs."""
+        if method_name == '_fallback':
+            return b""
+        if method_name == 'constructor':
+            function = next((function for function in self.abi if
+                             function['type'] == 'constructor'),
+                            {'inputs': []})
+        else:
+            function = self.functions[method_name]
+        types = [inp['type'] for inp in function['inputs']]
+        args = [self.abi_value(varType, inputVar) for varType, inputVar in
+                zip(types, inputVars)]
+        if hasattr(eth_abi, 'encode'):
+            encoded = eth_abi.encode(types, args)
+        else:
+            encoded = eth_abi.encode_abi(types, args)
+        if method_name == 'constructor':
+            return self.bytecode + encoded
+        return function_abi_to_4byte_selector(function) + encoded
+
+    def abi_value(self, varType, inputVar):
+        """Translate an input variable, as send to SC_interaction.js, to the \
+        python value eth_abi expects."""
+        if varType[-1] == "]":
+            return [self.abi_value(varType[:varType.rindex("[")], iv)
+                    for iv in inputVar]
+        if (varType[:3] == "int") | (varType[:4] == "uint"):
+            return int(inputVar)
+        if varType == "bytes":
+            return to_bytes(hexstr=inputVar)
+        if varType[:5] == "bytes":
+            bytesize = int(varType[5:])
+            return to_bytes(hexstr=inputVar)[:bytesize].ljust(bytesize, b"\0")
+        return inputVar
+
+    def close(self):
+        """Nothing is kept alive outside of this process."""
+        self.trace = []
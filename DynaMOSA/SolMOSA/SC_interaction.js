@@ -1,18 +1,20 @@
-// This script connects to the Ethereum simulator that is listening at the specified port and deploys the contract and calls it's methods following the --methods argument.
+// This script connects to the Ethereum simulator that is listening at the specified port and stays alive for the whole run of SolMOSA.
+// Every time a request is received on stdin it deploys the contract and calls it's methods for each of the tests in the request.
+// Before each request the blockchain is reverted to a snapshot taken before the first request, so all tests start from the same state.
+// Tests are organised in a trie of method call prefixes, each distinct prefix is executed once and the state at a branch point is kept in a snapshot.
+// The results of every test are written to stdout as a single line of JSON as soon as the test has finished.
 const Web3 = require('web3')
 const BigNumber = require('bignumber.js')
-const fs = require('fs');
-const Debug = require('web3-eth-debug').Debug;
+const readline = require('readline');
 const args = require('minimist')(process.argv.slice(2));
 const assert = require('assert');
 const options = {
     transactionConfirmationBlocks: 1,
 }
-var data = fs.readFileSync('tests.txt', 'utf8');
-const methods = eval(data);
+// stdout is reserved for the replies to SolMOSA, everything else is logged to stderr.
+const log = console.error;
 const port = args.ETH_port;
 const web3 = new Web3(new Web3.providers.HttpProvider(port), null, options);
-const debug = new Debug(new Web3.providers.HttpProvider(port), null, options);
 
 const contract_Abi = eval(args.abi);
 const bytecode = eval(args.bytecode);
@@ -32,200 +34,354 @@ var toBigNumber = function(val){
   }
 }
 
-async function runTest(){
-  var method;
-  var input_args;
-  var from;
-  var value;
-  var deployed;
-  var constHash;
-  var tx;
-  var txTrace;
-  var constTrace;
-  var constPos;
-  var gas;
-  var ans = [];
-  var returnvals = [];
-  var last_TxTrace = 0;
-  var deploySuccess = false;
+// The pcs of the steps that are sent back, see CDG.TracePcs and CDG.PredicatePcs in SolMOSA.
+var tracePcs = null;
+var predicatePcs = new Set();
 
-  for (var i = 0; i < methods.length; i++){
-    try{
-      last_block = await web3.eth.getBlock("latest");
-    }
-    catch (err){
-      console.log(`tried and failed to get last block: returned error: ${err}`);
+// Only keep the fields that are needed to calculate branch distances: [pc, op, s_1, s_2], where s_1 and s_2 are the top two stack words.
+// When a trace filter is set, only the steps at basic block boundaries ([pc, op]) and predicates ([pc, op, s_1, s_2]) of the contract itself are kept.
+function compactStep(step){
+  const depth = step.stack.length;
+  return [step.pc, step.op, depth > 0 ? step.stack[depth-1] : null, depth > 1 ? step.stack[depth-2] : null];
+}
+
+function compactTrace(structLogs){
+  if(tracePcs === null){
+    return structLogs.map(compactStep);
+  }
+  var ans = [];
+  const depth = structLogs.length > 0 ? structLogs[0].depth : null;
+  for (const step of structLogs){
+    if(step.depth != depth){
+      // Steps of nested calls run code of other contracts.
+      continue;
     }
-    method = methods[i];
-    from = method.fromAcc;
-    method_name = method.name;
-    if(method_name != 'passTime'){
-      input_args = method.inputVars.map(toBigNumber);
+    if(predicatePcs.has(step.pc)){
+      ans.push(compactStep(step));
     }
-    else{
-      // evm_increaseTime cannot handle BigNumbers.
-      input_args = method.inputVars;
+    else if(tracePcs.has(step.pc)){
+      ans.push([step.pc, step.op]);
     }
-    value = toBigNumber(method.value);
+  }
+  return ans;
+}
 
-    if(method.name == 'constructor'){
-      console.log('\n');
-    }
-    console.log(`calling ${method_name}(${input_args}) from ${from} with value ${value}`)
+// The latency of every JSON-RPC request, per method, as a histogram with these upper bounds (in ms).
+const latencyBounds = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, null];
+var latencies = {};
 
-    if(method_name == 'constructor'){
-      if(deploySuccess){
-        constTrace = await debug.getTransactionTrace(constHash, {});
-        ans.splice(constpos, 0, constTrace.structLogs);
-        returnvals.splice(constpos, 0, "None");
+function recordLatency(method, ms){
+  if(!(method in latencies)){
+    latencies[method] = {count: 0, total_ms: 0, bounds: latencyBounds, counts: latencyBounds.map(() => 0)};
+  }
+  const histogram = latencies[method];
+  histogram.count += 1;
+  histogram.total_ms += ms;
+  histogram.counts[latencyBounds.findIndex(bound => bound === null || ms <= bound)] += 1;
+}
+
+var rpcId = 0;
+
+// Send a JSON-RPC request, errors returned by the blockchain are thrown with their data.
+function rpc(method, params){
+  const start = Date.now();
+  return new Promise(function(resolve, reject){
+    web3.currentProvider.send({jsonrpc: "2.0", method: method, params: params, id: rpcId++}, function(err, result){
+      recordLatency(method, Date.now() - start);
+      if(err){
+        reject(err);
+      }
+      else if(result.error){
+        var error = new Error(result.error.message);
+        error.data = result.error.data;
+        reject(error);
       }
-      else if (i > 0){
-        ans.splice(constpos, 0, "ConstructorFail");
-        returnvals.splice(constpos, 0, "ConstructorFail");
+      else{
+        resolve(result.result);
       }
-      try{
-        gas = await contract.deploy({data: bytecode, arguments: input_args}).estimateGas({
-          from: from,
-          value: value,
-        });
-        deployed = await contract.deploy({data: bytecode, arguments: input_args}).send({
-          from: from,
-          value: value,
-          gas: gas+1
-        }).on('transactionHash', (transactionHash) => {constHash = transactionHash;});
-        constpos = i;
-        deploySuccess = true;
+    });
+  });
+}
+
+// Send a batch of JSON-RPC requests of the same method in a single round trip, the results are returned in the order of the params.
+function rpcBatch(method, paramsList){
+  if(paramsList.length == 0){
+    return Promise.resolve([]);
+  }
+  const start = Date.now();
+  const firstId = rpcId;
+  const batch = paramsList.map(params => ({jsonrpc: "2.0", method: method, params: params, id: rpcId++}));
+  return new Promise(function(resolve, reject){
+    web3.currentProvider.send(batch, function(err, results){
+      recordLatency(`${method} (batch)`, Date.now() - start);
+      if(err){
+        reject(err);
+        return;
       }
-      catch(err){
-        console.log(`Tried and failed to deploy the contract with arguments: ${input_args} and value ${value}. Error: ${err}`);
-        constpos = i;
-        deploySuccess = false;
+      var ans = new Array(paramsList.length);
+      for (const result of results){
+        if(result.error){
+          reject(new Error(result.error.message));
+          return;
+        }
+        ans[result.id - firstId] = result.result;
       }
+      resolve(ans);
+    });
+  });
+}
+
+// The snapshot of the blockchain before any test was run, every test starts from this state.
+var snapshotId = null;
+// Every transaction gets the gas limit of a block, so it never has to be retried with more gas.
+var gasLimit = null;
+
+// Revert the blockchain to a snapshot and take it again, as reverting to a snapshot also removes it. Returns the new snapshot.
+async function revertTo(id){
+  const reverted = await rpc("evm_revert", [id]);
+  assert(reverted, `Failed to revert to snapshot ${id}`);
+  return await rpc("evm_snapshot", []);
+}
+
+// Revert the blockchain to the state before any test was run.
+async function isolate(){
+  if(snapshotId !== null){
+    snapshotId = await revertTo(snapshotId);
+  }
+  else{
+    gasLimit = (await rpc("eth_getBlockByNumber", ["latest", false])).gasLimit;
+    snapshotId = await rpc("evm_snapshot", []);
+  }
+}
+
+// The key of a method call, see call_key in Prefix_Trie.py.
+function callKey(method){
+  return JSON.stringify([method.name, method.inputVars, method.fromAcc, method.value]);
+}
+
+// Organise the tests in a trie of method call prefixes, the children of the root are the constructor calls. Each node holds the
+// indices of the tests that end with its prefix and, once it is executed, the trace and return value of its method call.
+function buildTrie(tests){
+  var root = {method: null, tests: [], children: new Map()};
+  tests.forEach(function(test, k){
+    var node = root;
+    for (const method of test){
+      const key = callKey(method);
+      if(!node.children.has(key)){
+        node.children.set(key, {method: method, tests: [], children: new Map(), trace: null, returnval: null, hash: null});
+      }
+      node = node.children.get(key);
     }
-    else if (!deploySuccess){
-      console.log(`Actually not gonna call, because constructor failed.`)
-      ans.push("ConstructorFail");
-      returnvals.push("ConstructorFail");
-      continue;
+    node.tests.push(k);
+  });
+  return root;
+}
+
+// The number of method calls in the trie below a node.
+function trieSize(node){
+  var ans = 0;
+  for (const child of node.children.values()){
+    ans += 1 + trieSize(child);
+  }
+  return ans;
+}
+
+// Send a transaction and return its hash and whether it succeeded. Ganache mines reverted transactions as well,
+// their hash is part of the error or else it is the last transaction of the latest block.
+async function sendTransaction(tx){
+  try{
+    return {hash: await rpc("eth_sendTransaction", [tx]), success: true};
+  }
+  catch(err){
+    const message = `${err}`;
+    if(message.search("revert")==-1&&message.search("invalid opcode")==-1&&message.search("out of gas")==-1&&message.search('Invalid JSON RPC response: ""')==-1){
+      throw err;
+    }
+    var hash = err.data ? Object.keys(err.data).find(key => key.substring(0,2) == "0x") : undefined;
+    if(hash === undefined){
+      const block = await rpc("eth_getBlockByNumber", ["latest", false]);
+      hash = block.transactions[block.transactions.length-1];
+    }
+    return {hash: hash, success: false};
+  }
+}
+
+// Deploy the contract following a constructor call, returns the deployed contract or null if the deployment failed.
+async function deploy(node){
+  const method = node.method;
+  const input_args = method.inputVars.map(toBigNumber);
+  const value = web3.utils.toHex(toBigNumber(method.value));
+  log('\n');
+  log(`calling constructor(${input_args}) from ${method.fromAcc} with value ${value}`)
+  try{
+    const data = contract.deploy({data: bytecode, arguments: input_args}).encodeABI();
+    const tx = await sendTransaction({from: method.fromAcc, data: data, value: value, gas: gasLimit});
+    assert(tx.success, "The constructor reverted.");
+    var deployed = contract.clone();
+    deployed.options.address = (await rpc("eth_getTransactionReceipt", [tx.hash])).contractAddress;
+    node.hash = tx.hash;
+    node.returnval = "None";
+    return deployed;
+  }
+  catch(err){
+    log(`Tried and failed to deploy the contract with arguments: ${input_args} and value ${value}. Error: ${err}`);
+    node.trace = "ConstructorFail";
+    node.returnval = "ConstructorFail";
+    return null;
+  }
+}
+
+// Call a method of the deployed contract, the trace of the call is fetched later on.
+async function call(node, deployed){
+  const method = node.method;
+  const method_name = method.name;
+  const from = method.fromAcc;
+  const input_args = method.inputVars.map(toBigNumber);
+  const value = web3.utils.toHex(toBigNumber(method.value));
+  var data;
+  var tx;
+
+  log(`calling ${method_name}(${input_args}) from ${from} with value ${value}`)
+
+  if (deployed === null){
+    log(`Actually not gonna call, because constructor failed.`)
+    node.trace = node.returnval = "ConstructorFail";
+    return;
+  }
+  if (method_name.substring(0,8) == 'passTime') {
+    await rpc("evm_increaseTime", [Number(input_args[0])]);
+    node.trace = node.returnval = method_name;
+    return;
+  }
+  if (method_name.substring(0,10) == 'passBlocks') {
+    await rpc("evm_mine", []);
+    node.trace = node.returnval = method_name;
+    return;
+  }
+  try{
+    if (method_name == "_fallback"){
+      data = "0x";
     }
     else{
-      if (method_name.substring(0,8) == 'passTime') {
-        web3.currentProvider.send({method: "evm_increaseTime", params: input_args},function(err, result){});
-        var tempBlock = await web3.eth.getBlock("latest");
-        console.log(tempBlock);
-        ans.push(method_name);
-        returnvals.push(method_name);
-        continue;
-      }
-      else if (method_name.substring(0,10) == 'passBlocks') {
-        web3.currentProvider.send({jsonrpc: "2.0", method: "evm_mine", params: [], id: 0}, function(err, result){});
-        ans.push(method_name);
-        returnvals.push(method_name);
-        continue;
-      }
-      else{
-        // See if the transaction executes without returning an error
-        try {
-          if (method_name == "_fallback"){
-            tx = await eval(`web3.eth.sendTransaction({from: from, to: deployed.options.address, value: value})`);
-          }
-          else{
-            tx = await eval(`deployed.methods.${method_name}.apply(this, input_args).send({from: from, value: value})`);
-          }
-        }
-        catch(err){
-          if(err.toString().search("out of gas")==66){
-            // The standard amount of gas was not enough.
-            gas = last_block.gasLimit;
-            console.log(`Function returned out of gas error, we try again with the gasLimit: ${gas}`)
-            // See if the transaction executes without returning an error
-            try {
-              if (method_name == "_fallback"){
-                tx = await eval(`web3.eth.sendTransaction({from: from, to: deployed.options.address, value: value, gas: gas})`);
-              }
-              else{
-                tx = await eval(`deployed.methods.${method_name}.apply(this, input_args).send({from: from, value: value, gas: gas})`);
-              }
-            }
-            catch(error){
-              if(error.toString().search("revert")==-1&&error.toString().search('Invalid JSON RPC response: ""')==-1&&error.toString().search('invalid opcode')==-1){
-                // For some reason ganache randomly throws invalid opcode sometimes.
-                throw `encountered an error which is not revert or invalid JSON RPC response: ${error}`
-              }
-              else{
-                console.log("Failed after trying with more gas!")
-                new_last_block = await web3.eth.getBlock("latest");
-                max_iterations = 10;
-                iteration=0;
-                while(new_last_block.number==last_block.number&&iteration<max_iterations){
-                  console.log(`Waiting for block to be processed, trying ${max_iterations-iteration-1} more times.`)
-                  new_last_block = await web3.eth.getBlock("latest");
-                  iteration+=1;
-                }
-                last_block = new_last_block;
-                tx = new_last_block.transactions[new_last_block.transactions.length-1];
-              }
-            }
-          }
-          else if(err.toString().search("sender doesn't have enough funds to send tx")!=-1){
-            console.log(`Balance of account ${from} is smaller than the value required for the methodcall: < ${value}.`);
-            ans.push("Out of Ether");
-            returnvals.push("Out of Ether");
-            continue;
-          }
-          // Revert errors are good and should still be processed!
-          else if(err.toString().search("Error: invalid address")!=-1){
-            console.log(`Tried to interact with an invalid address which returned error: ${err}`);
-            ans.push("Invalid Address");
-            returnvals.push("Invalid Address");
-            continue;
-          }
-          else if(err.toString().search("revert")==-1&&err.toString().search('Invalid JSON RPC response: ""')==-1&&err.toString().search('invalid opcode')==-1){
-            // For some reason ganache randomly throws invalid opcode sometimes.
-            throw `encountered an error which is not revert or invalid JSON RPC response: ${err}`
-          }
-          else{
-            new_last_block = await web3.eth.getBlock("latest");
-            max_iterations = 10;
-            iteration=0;
-            while(new_last_block.number==last_block.number&&iteration<max_iterations){
-              console.log(`Waiting for block to be processed, trying ${max_iterations-iteration-1} more times.`)
-              new_last_block = await web3.eth.getBlock("latest");
-              iteration+=1;
-            }
-            last_block = new_last_block;
-            tx = new_last_block.transactions[new_last_block.transactions.length-1];
-          }
-        }
-        if(typeof(tx)=='string'){
-          txTrace = await debug.getTransactionTrace(tx, {});
-        }
-        else{
-          txTrace = await debug.getTransactionTrace(tx.transactionHash, {});
-        }
+      data = deployed.methods[method_name](...input_args).encodeABI();
+    }
+  }
+  catch(err){
+    if(`${err}`.search("invalid address")==-1){
+      throw `encountered an error while encoding the inputs: ${err}`
+    }
+    log(`Tried to interact with an invalid address which returned error: ${err}`);
+    node.trace = node.returnval = "Invalid Address";
+    return;
+  }
+  try{
+    // Revert errors are good and should still be processed!
+    tx = await sendTransaction({from: from, to: deployed.options.address, data: data, value: value, gas: gasLimit});
+  }
+  catch(err){
+    if(`${err}`.search("sender doesn't have enough funds to send tx")==-1){
+      throw `encountered an error which is not revert or invalid JSON RPC response: ${err}`
+    }
+    log(`Balance of account ${from} is smaller than the value required for the methodcall: < ${value}.`);
+    node.trace = node.returnval = "Out of Ether";
+    return;
+  }
+  node.hash = tx.hash;
+  node.returnval = tx.success;
+}
 
-        assert(last_TxTrace!=txTrace);
-        last_TxTrace=txTrace;
-        ans.push(txTrace.structLogs);
-        returnvals.push(tx.status);
-      }
+// Send the results of the tests that end at the last node of the path. The traces of the transactions on the path that were not
+// fetched yet are fetched in a single batch, this has to happen before the blockchain is reverted to a state before them.
+// The trace of the constructor is not used, so it is not fetched and sent as null.
+async function replyTests(tests, path){
+  const untraced = path.slice(1).filter(node => node.hash !== null && node.trace === null);
+  const traces = await rpcBatch("debug_traceTransaction", untraced.map(node => [node.hash, traceOptions]));
+  for (var j = 0; j < traces.length; j++){
+    untraced[j].trace = compactTrace(traces[j].structLogs);
+  }
+  for (const k of tests){
+    reply({test: k, traces: path.map(node => node.trace), returnvals: path.map(node => node.returnval)});
+  }
+}
+
+// Execute the method calls below a node of the trie depth first, so that each distinct prefix of method calls is only executed once.
+// Before each child but the last a snapshot is taken, which is reverted to once all tests below the child have finished. The snapshots
+// are nested in the same way as the nodes, which fits the stack in which ganache keeps its snapshots.
+async function runNode(node, path, deployed){
+  if(node.tests.length > 0){
+    await replyTests(node.tests, path);
+  }
+  const children = Array.from(node.children.values());
+  for (var i = 0; i < children.length; i++){
+    const child = children[i];
+    const last = i == children.length - 1;
+    const snapshot = last ? null : await rpc("evm_snapshot", []);
+    if(path.length == 0){
+      assert(child.method.name == 'constructor', "Each test should start by deploying the smart contract!");
+      await runNode(child, [child], await deploy(child));
+    }
+    else{
+      await call(child, deployed);
+      await runNode(child, path.concat([child]), deployed);
+    }
+    if(!last){
+      const reverted = await rpc("evm_revert", [snapshot]);
+      assert(reverted, `Failed to revert to snapshot ${snapshot}`);
     }
   }
-  constTrace = await debug.getTransactionTrace(constHash, {});
-  ans.splice(constpos, 0, constTrace.structLogs);
-  returnvals.splice(constpos, 0, tx.status);
-  return [ans, returnvals];
 }
 
-console.log("Starting a new round of tests.");
-runTest().then(function(arr){
-  fs.writeFileSync("debugs.txt", '['
-      + arr[0].map(JSON.stringify).join(',')
-    + ']');
+// Memory and storage are never used to calculate branch distances.
+const traceOptions = {disableMemory: true, disableStorage: true};
+
+function reply(message){
+  process.stdout.write(JSON.stringify(message) + '\n');
+}
+
+async function handle(request){
+  if(request.command == 'run'){
+    log("Starting a new round of tests.");
+    try{
+      const root = buildTrie(request.tests);
+      log(`Running ${request.tests.length} tests with ${request.tests.reduce((n, test) => n + test.length, 0)} method calls, of which ${trieSize(root)} distinct prefixes.`);
+      await isolate();
+      await runNode(root, [], null);
+      log("Finished");
+      reply({status: 'done'});
+    }
+    catch(err){
+      log(`Failed to run the tests: ${err}`);
+      reply({status: 'error', error: `${err}`});
+    }
+  }
+  else if(request.command == 'trace_filter'){
+    tracePcs = new Set(request.tracePcs);
+    predicatePcs = new Set(request.predicatePcs);
+    reply({status: 'done'});
+  }
+  else if(request.command == 'latencies'){
+    reply({status: 'done', latencies: latencies});
+  }
+  else if(request.command == 'exit'){
+    // Leave the blockchain as it was found, for the next run.
+    if(snapshotId !== null){
+      await rpc("evm_revert", [snapshotId]);
+    }
+    process.exit(0);
+  }
+  else{
+    reply({status: 'error', error: `Unknown command: ${request.command}`});
+  }
+}
 
-    fs.writeFileSync("returnvals.txt", '['
-        + arr[1].map(JSON.stringify).join(',')
-      + ']');
-  console.log("Finished")
-  return arr;
+// Requests are handled one at a time, in the order in which they arrive.
+var pending = Promise.resolve();
+const requests = readline.createInterface({input: process.stdin, terminal: false});
+requests.on('line', function(line){
+  const request = JSON.parse(line);
+  pending = pending.then(() => handle(request));
+});
+requests.on('close', function(){
+  pending.then(() => process.exit(0));
 });
+reply({status: 'ready'});
@@ -3,6 +3,7 @@ smart contract."""
 
 import numpy as np
 import logging
+import collections
 from web3 import Web3
 # import sys
 
@@ -16,9 +17,8 @@ class SmartContract():
         - contractName:     The name of the smart contract.
         - methods:          A list of all methods in the smart contract.
         - CDG:              The control-dependency-graph of the smart contract.
-        - approach_levels:  A matrix containg the approach levels between any
-                            two nodes. The index of the matrix contains the
-                            maximum approach level for that edge.
+        - approach_levels:  The ApproachLevels between any two edges of the
+                            CDG.
     """
 
     contractName = ""
@@ -98,132 +98,171 @@ class SmartContract():
         self.CDG = _cdg
         cEdges = _cdg.CompactEdges
 
-        # The approach levels: the approach level for the j-th edge
-        # to the i-th edge is stored in app_lvls[i][j].
-        # The trace contains the maximal approach level
-        # (i.e. the approach level from the start of the corresponding method.)
-        app_lvls = np.zeros(shape=(len(cEdges), len(cEdges)))
+        # The maximal approach level of an edge is the approach level from the
+        # start of the corresponding method, it only depends on the start node
+        # of the edge.
+        max_levels = np.empty(len(cEdges))
+        node_max_levels = {}
         rootNode_id = next(sNode.node_id for sNode in _cdg.StartNodes)
-        for i, cEdge1 in enumerate(cEdges):
-            startNode = next(cNode for cNode in _cdg.CompactNodes if
-                             cNode.node_id == cEdge1.startNode_id)
-            queue = [(startNode, 1)]
-            # if cEdge1.startNode_id[0] != "_dispatcher":
-            #     queue = [(startNode, 0) for startNode in
-            #              _cdg.CompactNodes if (cEdge1.startNode_id[0], 1) in
-            #              startNode.outg_node_ids]
-            # else:
-            #     queue = [(startNode, 1) for startNode in
-            #              _cdg.CompactNodes if startNode.node_id ==
-            #              (cEdge1.startNode_id[0], 1)]
-            assert len(queue) == 1, \
-                "There should be precisely one starting node, instead "\
-                f"we found {len(queue)}."
-            traversed = [cNode[0].node_id for cNode in queue]
-
-            max_al = self.max_approach_level(
-                queue, _cdg.CompactNodes, traversed, rootNode_id)
-
-            app_lvls[i][i] = max_al
-            for j, cEdge2 in enumerate(cEdges):
-                if i == j:
-                    pass
-                else:
-                    startNode = next(
-                        (cNode for cNode in _cdg.CompactNodes if
-                         cNode.node_id == cEdge2.endNode_id), None)
-                    queue = [(startNode, 0)]
-                    traversed = [cNode[0].node_id for cNode in queue]
-                    al = self.approach_level(queue, _cdg.CompactNodes,
-                                             cEdge1, traversed, max_al)
-                    if al == 0:
-                        logging.warning("We're giving an approach level of 0 to this\
-                         edge")
-                        cEdge1.show_CompactEdge(log=True)
-                    app_lvls[j][i] = al
-        self.approach_levels = app_lvls
-
-    def max_approach_level(self, queue, cNodes, traversed, _rootNode_id):
+        for i, cEdge in enumerate(cEdges):
+            if cEdge.startNode_id not in node_max_levels:
+                startNode = _cdg.NodeIndex[cEdge.startNode_id]
+                queue = [(startNode, 1)]
+                traversed = [startNode.node_id]
+                node_max_levels[cEdge.startNode_id] = \
+                    self.max_approach_level(queue, _cdg.NodeIndex, traversed,
+                                            rootNode_id)
+            max_levels[i] = node_max_levels[cEdge.startNode_id]
+        self.approach_levels = ApproachLevels(_cdg, max_levels)
+
+    def max_approach_level(self, queue, nodeIndex, traversed, _rootNode_id):
         """
         Find the maximum approach level of a single node (i.e, the number \
-        of nodes between it and the root node).
+        of nodes between it and the root node) using a breadth-first search \
+        algorithm.
 
         Arguments:
             - queue:            A queue consisting of all the next nodes to
                                 visit.
-            - cNodes:           A list of all the CompactNodes in the
-                                control-dependency-graph.
+            - nodeIndex:        The CompactNodes of the
+                                control-dependency-graph by their node_id.
             - traversed:        A list of nodes that have already been
                                 traversed by the depth-first algorithm.
         Outputs:
             - max_al:           The maximum approach level of the first
                                 traversed node.
         """
-        assert len(queue) != 0, "When finding the maximum approach level "\
-            "the queue can never be 0."
-        curNode, depth = queue.pop(0)
-        assert curNode.node_id in traversed, \
-            "A node is has been popped from the queue but it is not "
-        "registered as traversed: node with id: {}".format(curNode.node_id)
-
-        if 1 in [node_id[1] for node_id in curNode.all_node_ids]:
-            # Max approach level is depth.
-            return depth
-        else:
-            parentNodes = [cNode for cNode in cNodes if
-                           (cNode.node_id not in traversed) &
-                           (cNode.node_id in curNode.inc_node_ids)]
-            traversed = traversed + [cNode.node_id for cNode in parentNodes]
-            queue = queue + [(parentNode, depth + 1) for
-                             parentNode in parentNodes]
-            return self.max_approach_level(
-                queue, cNodes, traversed, _rootNode_id)
-
-    def approach_level(self, queue, cNodes, goal, traversed, max_al=None):
+        queue = collections.deque(queue)
+        traversed = set(traversed)
+        while True:
+            assert len(queue) != 0, "When finding the maximum approach "\
+                "level the queue can never be 0."
+            curNode, depth = queue.popleft()
+            assert curNode.node_id in traversed, \
+                "A node is has been popped from the queue but it is not "\
+                "registered as traversed: node with id: {}".format(
+                    curNode.node_id)
+
+            if 1 in [node_id[1] for node_id in curNode.all_node_ids]:
+                # Max approach level is depth.
+                return depth
+            parentNodes = [nodeIndex[node_id] for node_id in
+                           curNode.inc_node_ids if node_id not in traversed]
+            traversed.update(cNode.node_id for cNode in parentNodes)
+            queue.extend((parentNode, depth + 1) for
+                         parentNode in parentNodes)
+
+
+class ApproachLevels():
+    """
+    The approach levels between the edges of a control-dependency-graph. The \
+    approach level from a traversed edge j to an edge i is the number of \
+    nodes between the end of j and the start of i, or the maximum approach \
+    level of i if that is smaller or if i can't be reached from j. They are \
+    computed lazily, with one breadth-first search per traversed edge.
+
+    Properties:
+        - max_levels:   The maximum approach level of each edge (i.e. the
+                        approach level from the start of its method).
+        - endNode_ids:  The node_id of the end node of each edge.
+        - children:     The node_ids of the children of each node, by node_id.
+        - edges_from:   The indices of the edges leaving each node, by
+                        node_id.
+        - below_max:    For each traversed edge j that was searched so far,
+                        the indices of the edges i with an approach level
+                        from j below their maximum, and those levels.
+    """
+
+    max_levels = None
+    endNode_ids = []
+    children = {}
+    edges_from = {}
+    below_max = {}
+
+    def __init__(self, _cdg, _max_levels):
+        """
+        Arguments:
+            - _cdg:         The control-dependency-graph of the smart
+                            contract.
+            - _max_levels:  The maximum approach level of each of the
+                            CompactEdges.
+        """
+        self.max_levels = _max_levels
+        self.endNode_ids = [cEdge.endNode_id for cEdge in _cdg.CompactEdges]
+        self.children = {cNode.node_id: list(cNode.outg_node_ids) for
+                         cNode in _cdg.CompactNodes}
+        self.edges_from = {node_id: list(js) for node_id, js in
+                           _cdg.OutgoingEdges.items()}
+        self.below_max = {}
+
+    def __len__(self):
+        return len(self.max_levels)
+
+    def search(self, j):
+        """
+        Find the edges with an approach level from edge j below their \
+        maximum, using a breadth-first search from the end node of j.
+
+        Arguments:
+            - j:    The index of the traversed edge.
+        Outputs:
+            - The indices of the edges and their approach levels from j.
+        """
+        if j in self.below_max:
+            return self.below_max[j]
+        goals = []
+        levels = []
+        depths = {self.endNode_ids[j]: 0}
+        queue = collections.deque([self.endNode_ids[j]])
+        while queue:
+            node_id = queue.popleft()
+            depth = depths[node_id]
+            for i in self.edges_from.get(node_id, []):
+                if (i != j) & (depth < self.max_levels[i]):
+                    if depth == 0:
+                        logging.warning(f"We're giving an approach level of 0 "
+                                        f"to the edge from {node_id} to "
+                                        f"{self.endNode_ids[i]}")
+                    goals.append(i)
+                    levels.append(depth)
+            for child_id in self.children.get(node_id, []):
+                if child_id not in depths:
+                    depths[child_id] = depth + 1
+                    queue.append(child_id)
+        self.below_max[j] = (np.array(goals, dtype=int),
+                             np.array(levels, dtype=float))
+        return self.below_max[j]
+
+    def level(self, j, i):
         """
-        Find either the maximum approach level of a single node (i.e. the \
-        approach level from the start of a function or the approach level \
-        from one edge to another) using a breadth-first search algorithm.
+        The approach level from the traversed edge j to the edge i.
 
         Arguments:
-            - queue:            A queue consisting of all the next nodes to
-                                visit.
-            - cNodes:           A list of all the CompactNodes in the
-                                control-dependency-graph.
-            - goal:             The edge that we're calculating the approach
-                                level for.
-            - traversed:        A list of nodes that have already been
-                                traversed by the depth-first algorithm.
-            - max_al:           The maximum approach level of the goal,
-                                (i.e. the approach level from the start of a
-                                function or the approach level from one edge to
-                                another).
+            - j:    The index of the traversed edge.
+            - i:    The index of the edge to reach.
+        """
+        if i != j:
+            goals, levels = self.search(j)
+            found = np.flatnonzero(goals == i)
+            if len(found) > 0:
+                return levels[found[0]]
+        return self.max_levels[i]
+
+    def closest(self, edgeset):
+        """
+        The approach level of each edge from the closest of a set of \
+        traversed edges.
+
+        Arguments:
+            - edgeset:  The indices of the traversed edges.
         Outputs:
-            - max_al/depth+1:   The approach level of the goal.
+            - An array holding the approach level of each edge, inf if the
+              edgeset is empty.
         """
-        if len(queue) == 0:
-            assert max_al is not None, \
-                "End of the queue was reached but no maximum approach level " \
-                "was passed!"
-            return max_al
-
-        curNode, depth = queue.pop(0)
-        assert curNode.node_id in traversed, \
-            "A node is being investigated but it is not registered " \
-            "as traversed: node with id: {}".format(curNode.node_id)
-        if max_al is not None:
-            if depth >= max_al:
-                # We don't need to go deeper than the maximum approach_level
-                return max_al
-
-        if curNode.node_id == goal.startNode_id:
-            # The goal can be reached at this depth
-            return depth
-        else:
-            childNodes = [cNode for cNode in cNodes if
-                          (cNode.node_id not in traversed) &
-                          (cNode.node_id in curNode.outg_node_ids)]
-            traversed = traversed + [cNode.node_id for cNode in childNodes]
-            queue = queue + [(childNode, depth + 1) for
-                             childNode in childNodes]
-            return self.approach_level(queue, cNodes, goal, traversed, max_al)
+        if len(edgeset) == 0:
+            return np.full(len(self.max_levels), np.inf)
+        ans = self.max_levels.copy()
+        for j in edgeset:
+            goals, levels = self.search(j)
+            ans[goals] = np.minimum(ans[goals], levels)
+        return ans
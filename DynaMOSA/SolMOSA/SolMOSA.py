@@ -8,17 +8,25 @@ Prerequisites:
 """
 import os
 import json
-import ast
 import subprocess
 import datetime
+import functools
 import logging
 import numpy as np
 # import pickles
 import sys
 
 from CDG import CDG
+from Executor import ExecutorPool, PrefixCache
+from Fitness_Cache import FitnessCache
+from Fitness_Pool import FitnessPool
+from Generation_History import GenerationHistory
+from PyEVM_Executor import PyEVMExecutor
+from PyEVM_Executor import ACCOUNTS as PyEVM_ACCOUNTS
 from SmartContract import SmartContract
+from Test import digest_trace
 from Test_Suite import TestSuite
+from Population import Population
 from Preference_Sorting import preference_sorting, subvector_dist
 from Generate_Offspring import generate_offspring
 
@@ -34,7 +42,7 @@ def SolMOSA(config):
         all the parameters necessary for the SolMOSA algorithm.
     Outputs:
         - archives: A list containing the best test cases for each branch at \
-        each generation of the algorithm,
+        the generations kept by the history_retention policy,
         the final archive in the list contains the best test cases found by \
         the algorithm.
         - tSuite: The TestSuite object that was used by the SolMOSA algorithm.
@@ -47,6 +55,8 @@ def SolMOSA(config):
 
     # Read Configuration. Parameters for initiating the Blockchain.
     ETH_port = config['Blockchain']['ETH_port']
+    ETH_ports = eval(config['Blockchain']['ETH_ports'])
+    backend = config['Blockchain']['backend']
     max_accounts = int(config['Parameters']['max_accounts'])
     accounts_file_location = dir_path + "/"\
         + config['Files']['accounts_file_location']
@@ -87,11 +97,16 @@ def SolMOSA(config):
 
     # Parameters that specify the scope of the experiment
     search_budget = int(config['Parameters']['search_budget'])
-    memory_efficient = config['Parameters']['memory_efficient'] == "True"
+    fitness_cache_size = int(config['Parameters']['fitness_cache_size'])
+    fitness_workers = int(config['Parameters']['fitness_workers'])
+    fitness_chunksize = int(config['Parameters']['fitness_chunksize'])
+    history_retention = config['Parameters']['history_retention']
+    history_size = int(config['Parameters']['history_size'])
+    history_folder = dir_path + "/" + config['Files']['history_folder']
 
     accounts, contract_json, contract_name, deployed_bytecode, bytecode, abi\
         = get_ETH_properties(ETH_port, max_accounts, accounts_file_location,
-                             contract_json_location)
+                             contract_json_location, backend)
 
     if eval(config['Parameters']['deploying_accounts']) == []:
         deploying_accounts = accounts
@@ -138,7 +153,7 @@ def SolMOSA(config):
     logging.info("Smart Contract Under investigation: {}"
                  .format(contract_json_location))
     relevant_targets = determine_relevant_targets(
-        cdg.CompactEdges, cdg.CompactNodes, ignoreFunctionNames,
+        cdg.CompactEdges, cdg.NodeIndex, ignoreFunctionNames,
         functionNames, log=True, _ignoreFallback=ignoreFallback)
 
     if sum(relevant_targets) == 0:
@@ -146,182 +161,164 @@ def SolMOSA(config):
         return [], tSuite, (datetime.datetime.now()
                             - start_time).total_seconds(), 0, 0, []
 
-    test_inputs = tSuite.generate_test_inputs()
-    with open("tests.txt", "w") as f:
-        f.write(test_inputs)
-
-    callstring = "node SC_interaction.js".split(
-    ) + ["--abi"] + [abi] + ["--bytecode"] + [bytecode] + ["--ETH_port"]\
-        + [ETH_port]
-
-    blockchain_start_time = datetime.datetime.now()
-    logging.info("Deploying and calling smart contracts for the first time...")
-
-    with open("Ganache_Interaction.log", "a") as f:
-        subprocess.call(callstring, stdout=f)
-    blockchain_end_time = datetime.datetime.now()
-    blockchain_time = blockchain_end_time - blockchain_start_time
-
-    logging.info("Reading results...")
-    with open('debugs.txt', 'r') as f:
-        callResults = f.read()
-
-    with open('returnvals.txt', 'r') as f:
-        returnvals = f.read().split(",")
-
-    results = ast.literal_eval(callResults)
-
-    logging.info("Updating test distances...")
-    tSuite.update_test_distances(results, returnvals)
-
-    init_archive = [None] * len(tSuite.smartContract.CDG.CompactEdges)
-    parents = set(tSuite.tests)
-
-    archive = update_archive(parents, init_archive, relevant_targets,
-                             tSuite.smartContract.CDG.CompactEdges)
-    archives = [archive]
-    testSuites = [tSuite]
-    updated_targets = update_targets(parents, archive, relevant_targets)
-
-    Fs = preference_sorting(parents, updated_targets, population_size)
-
-    for F in Fs:
-        subvector_dist(F, updated_targets)
-
-    poss_methods = tSuite.smartContract.methods[1:]
-
-    # Keep track of number of iterations necessary to achieve branch coverage
-    iterations = 0
-
-    for i in range(search_budget):
-        logging.info("\nEntering main loop iteration {}/{} at {}:{}"
-                     .format(i + 1,
-                             search_budget, datetime.datetime.now().date(),
-                             datetime.datetime.now().time()))
-
-        logging.info("{} out of {} branches have been covered"
-                     .format(len([test for test, relevant in
-                                  zip(archive, relevant_targets) if
-                                  (test is not None) & (relevant)]),
-                             len([test for test, relevant in
-                                  zip(archive, relevant_targets) if
-                                  relevant])))
-
-        # Cancel if branch coverage has already been achieved.
-        # Otherwise, log the branches that still need to be covered.
-        finished = True
-        logging.info("Still need to cover:")
-        for k, relTest in enumerate(archive):
-            if (relTest is None) & (relevant_targets[k]):
-                cdg.CompactEdges[k].show_CompactEdge(log=True)
-                finished = False
-        if finished:
-            if i == 0:
-                logging.info("Branch coverage was achieved after random"
-                             "initialisation")
-            else:
-                logging.info("Branch coverage was achieved at iteration {}"
-                             .format(i))
-            break
-
-        # Update the iteration counter
-        iterations += 1
-
-        logging.info("\tGenerating Offspring...")
-        offspring = generate_offspring(
-            parents, sc, accounts, maxArrayLength, addresspool, ETHpool,
-            intpool, stringpool, deploying_accounts, poss_methods,
-            population_size, min(tournament_size, population_size),
-            max_method_calls, crossover_probability, remove_probability,
-            change_probability, insert_probability, passTimeTime, zeroAddress,
-            nonExistantAccount, maxWei, minArrayLength)
-
-        tSuite = TestSuite(sc, accounts, _maxArrayLength=maxArrayLength,
-                           _deploying_accounts=deploying_accounts,
-                           _addresspool=addresspool, _ETHpool=ETHpool,
-                           _intpool=intpool, _stringpool=stringpool,
-                           _pop_size=population_size, _random=False,
-                           _tests=list(offspring),
-                           _max_method_calls=max_method_calls,
-                           _min_method_calls=min_method_calls,
-                           _passBlocks=passBlocks, _passTime=passTime,
-                           _passTimeTime=passTimeTime,
-                           _zeroAddress=zeroAddress,
-                           _nonExistantAccount=nonExistantAccount,
-                           _minArrayLength=minArrayLength)
-
-        test_inputs = tSuite.generate_test_inputs()
-        with open("tests.txt", "w") as f:
-            f.write(test_inputs)
-
-        logging.info("\tDeploying and testing...")
-
-        blockchain_start_time = datetime.datetime.now()
-        if memory_efficient:
-            if i % 10 == 1:
-                # We restart the Ganache blockchain for memory efficiency
-                logging.info("\tResetting Blockchain...")
-                callstring = 'screen -S ganache -X stuff "^C"'
-                os.system(callstring)
-                # Clear old blockchain from the /tmp directory
-                callstring = "rm -r /tmp/tmp-*"
-                subprocess.call(callstring, shell=True)
-                #  Start new instance of Ganache with a ridiculus amount of
-                # ether for each account
-                callstring = 'screen -S ganache -X stuff \
-                "ganache-cli -d -e 100000000000000000000\r"'
-                os.system(callstring)
-                callstring = "node get_accounts --ETH_port".split()\
-                    + [ETH_port] + ["--max_accounts"]\
-                    + ["{}".format(max_accounts)]\
-                    + ["--accounts_file_location"] + [accounts_file_location]
-                with open("Ganache_Interaction.log", "a") as f:
-                    subprocess.call(callstring, stdout=f)
-
-        callstring = "node SC_interaction.js".split() + ["--abi"] + [abi]\
-            + ["--bytecode"] + [bytecode] + ["--ETH_port"] + [ETH_port]
-
-        with open("Ganache_Interaction.log", "a") as f:
-            subprocess.call(callstring, stdout=f)
-        blockchain_time += datetime.datetime.now() - blockchain_start_time
-
-        logging.info("\tReading Results...")
-        with open('debugs.txt', 'r') as f:
-            callResults = f.read()
-
-        with open('returnvals.txt', 'r') as f:
-            returnvals = f.read().split(",")
-
-        results = ast.literal_eval(callResults)
-
-        logging.info("\tUpdating test distances...")
-        tSuite.update_test_distances(results, returnvals)
-
-        archive = update_archive(offspring, archive, relevant_targets,
+    assert backend in ["ganache", "py-evm"], f"Unknown backend: {backend}"
+    fitnessPool = None
+    executor = None
+    try:
+        if fitness_workers > 1:
+            # The workers are started before the executors, so that they do not
+            # inherit their processes and connections.
+            logging.info(f"Starting {fitness_workers} fitness workers...")
+            fitnessPool = FitnessPool(fitness_workers, cdg, sc.approach_levels,
+                                      fitness_chunksize)
+
+        if backend == "py-evm":
+            logging.info("Starting the py-evm executor...")
+            executor = PyEVMExecutor(contract_json['abi'],
+                                     contract_json['bytecode'])
+        else:
+            logging.info("Starting the blockchain executors...")
+            executor = ExecutorPool(abi, bytecode, [ETH_port] + ETH_ports)
+        executor = PrefixCache(executor)
+        executor.set_trace_filter(cdg.TracePcs, cdg.PredicatePcs)
+        if fitnessPool is None:
+            # Each trace is followed through the CDG once, as soon as it is
+            # received, only its digest is kept. Otherwise the fitness workers
+            # follow the traces.
+            executor.set_trace_digest(functools.partial(digest_trace, cdg=cdg))
+        blockchain_time = datetime.timedelta(0)
+
+        logging.info("Deploying and calling smart contracts for the first "
+                     "time and updating test distances...")
+        fitnessCache = FitnessCache(fitness_cache_size)
+        tSuite.evaluate(executor, fitnessCache, fitnessPool)
+
+        init_archive = [None] * len(tSuite.smartContract.CDG.CompactEdges)
+        parents = Population(tSuite.tests, len(cdg.CompactEdges))
+
+        archive = update_archive(parents, init_archive, relevant_targets,
                                  tSuite.smartContract.CDG.CompactEdges)
-        updated_targets = update_targets(offspring, archive, relevant_targets)
-        R = parents.union(offspring)
-
-        Fs = preference_sorting(R, updated_targets, population_size)
-        parents = set()
-        dom_front = 0
-        while len(parents) + len(Fs[dom_front]) < population_size:
-            subvector_dist(Fs[dom_front], updated_targets)
-            parents = parents.union(Fs[dom_front])
-            dom_front += 1
-        F = Fs[dom_front]
-        subvector_dist(F, updated_targets)
-        G = list(F)
-        G.sort(key=lambda tCase: tCase.subvector_dist)
-        parents = parents.union(set(G[:population_size - len(parents)]))
-        assert len(parents) == population_size,\
-            "The set of new parents should be of a size equal to the \
-            population size."
-        archives = archives + [archive]
-        testSuites = testSuites + [tSuite]
+        spill_location = None
+        if history_retention == "disk":
+            os.makedirs(history_folder, exist_ok=True)
+            spill_location = history_folder + "/{}_{}.pkl".format(
+                contract_name, start_time.strftime("%Y%m%d_%H%M%S"))
+        history = GenerationHistory(history_retention, history_size,
+                                    list(accounts) + list(deploying_accounts),
+                                    spill_location)
+        history.add(archive, tSuite.tests)
+        updated_targets = update_targets(parents, archive, relevant_targets)
+
+        Fs = preference_sorting(parents, updated_targets, population_size)
+
+        for F in Fs:
+            subvector_dist(parents, F, updated_targets)
+
+        poss_methods = tSuite.smartContract.methods[1:]
+
+        # Keep track of number of iterations necessary to achieve branch
+        # coverage
+        iterations = 0
+
+        for i in range(search_budget):
+            logging.info("\nEntering main loop iteration {}/{} at {}:{}"
+                         .format(i + 1,
+                                 search_budget, datetime.datetime.now().date(),
+                                 datetime.datetime.now().time()))
+
+            logging.info("{} out of {} branches have been covered"
+                         .format(len([test for test, relevant in
+                                      zip(archive, relevant_targets) if
+                                      (test is not None) & (relevant)]),
+                                 len([test for test, relevant in
+                                      zip(archive, relevant_targets) if
+                                      relevant])))
+
+            # Cancel if branch coverage has already been achieved.
+            # Otherwise, log the branches that still need to be covered.
+            finished = True
+            logging.info("Still need to cover:")
+            for k, relTest in enumerate(archive):
+                if (relTest is None) & (relevant_targets[k]):
+                    cdg.CompactEdges[k].show_CompactEdge(log=True)
+                    finished = False
+            if finished:
+                if i == 0:
+                    logging.info("Branch coverage was achieved after random"
+                                 "initialisation")
+                else:
+                    logging.info("Branch coverage was achieved at iteration {}"
+                                 .format(i))
+                break
+
+            # Update the iteration counter
+            iterations += 1
+
+            logging.info("\tGenerating Offspring...")
+            offspring = generate_offspring(
+                parents, sc, accounts, maxArrayLength, addresspool, ETHpool,
+                intpool, stringpool, deploying_accounts, poss_methods,
+                population_size, min(tournament_size, population_size),
+                max_method_calls, crossover_probability, remove_probability,
+                change_probability, insert_probability, passTimeTime,
+                zeroAddress, nonExistantAccount, maxWei, minArrayLength)
+
+            tSuite = TestSuite(sc, accounts, _maxArrayLength=maxArrayLength,
+                               _deploying_accounts=deploying_accounts,
+                               _addresspool=addresspool, _ETHpool=ETHpool,
+                               _intpool=intpool, _stringpool=stringpool,
+                               _pop_size=population_size, _random=False,
+                               _tests=list(offspring),
+                               _max_method_calls=max_method_calls,
+                               _min_method_calls=min_method_calls,
+                               _passBlocks=passBlocks, _passTime=passTime,
+                               _passTimeTime=passTimeTime,
+                               _zeroAddress=zeroAddress,
+                               _nonExistantAccount=nonExistantAccount,
+                               _minArrayLength=minArrayLength)
+
+            logging.info("\tDeploying, testing and updating test distances...")
+            tSuite.evaluate(executor, fitnessCache, fitnessPool)
+            offspring = Population(tSuite.tests, len(cdg.CompactEdges))
+
+            archive = update_archive(offspring, archive, relevant_targets,
+                                     tSuite.smartContract.CDG.CompactEdges)
+            updated_targets = update_targets(offspring, archive,
+                                             relevant_targets)
+            R = parents.union(offspring)
+
+            Fs = preference_sorting(R, updated_targets, population_size)
+            selected = []
+            dom_front = 0
+            while len(selected) + len(Fs[dom_front]) < population_size:
+                subvector_dist(R, Fs[dom_front], updated_targets)
+                selected.extend(Fs[dom_front])
+                dom_front += 1
+            F = Fs[dom_front]
+            subvector_dist(R, F, updated_targets)
+            G = F[np.argsort(R.subvector_dists[F], kind='stable')]
+            selected.extend(G[:population_size - len(selected)])
+            parents = R.select(selected)
+            assert len(parents) == population_size, \
+                "The set of new parents should be of a size equal to the \
+                population size."
+            history.add(archive, tSuite.tests)
+
+        fitnessCache.log_statistics()
+        executor.log_latencies()
+    finally:
+        # Also when the run fails, so that no workers or blockchain
+        # clients are left behind.
+        if executor is not None:
+            executor.close()
+        if fitnessPool is not None:
+            fitnessPool.close()
+    # Time spent waiting for the executor to start and run the tests.
+    blockchain_time += executor.blockchain_time
 
     archive = update_archive(parents, archive, relevant_targets,
                              tSuite.smartContract.CDG.CompactEdges)
+    archives = history.close(archive)
     runtime = datetime.datetime.now() - start_time
     return archives, tSuite, runtime.total_seconds(), \
         blockchain_time.total_seconds(), iterations, relevant_targets
@@ -373,7 +370,7 @@ def update_ignoreFunctionNames(_ignoreFunctionNames, _contract_json,
 
 
 def get_ETH_properties(ETH_port, max_accounts, accounts_file_location,
-                       contract_json_location):
+                       contract_json_location, backend="ganache"):
     """
     Fetch relevant information for the deployment of and interaction with the\
     smart contract.
@@ -385,18 +382,23 @@ def get_ETH_properties(ETH_port, max_accounts, accounts_file_location,
                     the blockchain.
     accounts_file_location: The location of the file the accounts will be
                             written to by the get_accounts.js procedure.
+    backend:        The execution backend, the py-evm backend has its own
+                    accounts and does not need a blockchain client.
     Outputs:
     accounts:   The accounts on the blockchain that will be used for the
                 deployment of and interaction with the smart contract.
     """
-    callstring = "node get_accounts --ETH_port".split() + [ETH_port]\
-        + ["--max_accounts"] + ["{}".format(max_accounts)]\
-        + ["--accounts_file_location"] + [accounts_file_location]
-    with open("Ganache_Interaction.log", "w") as f:
-        subprocess.call(callstring, stdout=f)
-    with open(accounts_file_location) as f:
-        res = f.read()
-        accounts = res.split(',')
+    if backend == "py-evm":
+        accounts = PyEVM_ACCOUNTS[:max_accounts]
+    else:
+        callstring = "node get_accounts --ETH_port".split() + [ETH_port]\
+            + ["--max_accounts"] + ["{}".format(max_accounts)]\
+            + ["--accounts_file_location"] + [accounts_file_location]
+        with open("Ganache_Interaction.log", "w") as f:
+            subprocess.call(callstring, stdout=f)
+        with open(accounts_file_location) as f:
+            res = f.read()
+            accounts = res.split(',')
 
     with open(contract_json_location) as f:
         contract_json = json.load(f)
@@ -412,54 +414,71 @@ def get_ETH_properties(ETH_port, max_accounts, accounts_file_location,
         deployed_bytecode, bytecode, abi
 
 
-def update_archive(tests, archive, relevant_targets, _edges):
+def update_archive(population, archive, relevant_targets, _edges):
     """
     Replace the archived tests by better tests, given an archive and a set of \
-    potentially better tests.
+    potentially better tests. For each relevant target the shortest test \
+    that covers it enters the archive if it is shorter than the archived \
+    test, the changes are logged as a summary. Tests enter the archive as a \
+    copy with their own distance vector, a view of a row would keep the \
+    whole distance matrix of the population alive.
 
     Arguments:
-    tests:              The current generation of tests.
+    population:         The Population of the current generation of tests.
     archive:            The current list of best tests.
     relevant_targets:   Indicators of which tests are important for branch
                         coverage.
+    _edges:             The CompactEdges of the targets.
     Outputs:
     archive:    The new and updated archive
     """
-    j = 0
-    for i, (best_test, relevant) in enumerate(zip(archive, relevant_targets)):
-        if relevant:
-            for test in tests:
-                if test.distance_vector[i] == 0:
-                    if best_test is None:
-                        logging.info(
-                            f"There was no best test yet for relevant_target "
-                            f"{j} with edge:\n")
-                        _edges[i].show_CompactEdge(log=True)
-                        logging.info(f"now entering the archive is test: \n")
-                        test.show_test(log=True)
-                        best_test = test
-                    elif len(test.methodCalls) < len(best_test.methodCalls):
-                        logging.info(
-                            f"A better test was found for relevant_target {i} "
-                            "with edge:\n")
-                        _edges[i].show_CompactEdge(log=True)
-                        logging.info(f"the old test was:\n")
-                        best_test.show_test(log=True)
-                        logging.info("\nThe new test is:\n")
-                        test.show_test(log=True)
-                        best_test = test
-            j += 1
-        archive[i] = best_test
+    targets = np.flatnonzero(relevant_targets)
+    if (len(targets) == 0) | (len(population) == 0):
+        return archive
+    # The length of each test that covers a target, of those the shortest
+    # test is the candidate, the first one if there are several.
+    lengths = np.where(population.distances[:, targets] == 0,
+                       population.lengths[:, None], np.inf)
+    candidates = np.argmin(lengths, axis=0)
+    candidate_lengths = lengths[candidates, np.arange(len(targets))]
+
+    new_targets = []
+    shorter_targets = []
+    # The archived copy of each test that enters the archive, a test that
+    # covers several targets is archived once.
+    archived = {}
+    for j, (i, k, length) in enumerate(
+            zip(targets, candidates, candidate_lengths)):
+        if length == np.inf:
+            continue
+        if archive[i] is None:
+            new_targets.append(j)
+        elif length < len(archive[i].methodCalls):
+            shorter_targets.append(j)
+        else:
+            continue
+        if k not in archived:
+            archived[k] = population.tests[k].archived_copy()
+        archive[i] = archived[k]
+        logging.debug(f"Relevant target {j} with edge "
+                      f"{_edges[i].startNode_id} -> {_edges[i].endNode_id} "
+                      f"is now covered by a test of {int(length)} method "
+                      f"calls.")
+    if len(new_targets) + len(shorter_targets) > 0:
+        logging.info(f"The archive has tests for {len(new_targets)} new "
+                     f"relevant targets {new_targets} and shorter tests for "
+                     f"{len(shorter_targets)} relevant targets "
+                     f"{shorter_targets}.")
     return archive
 
 
-def update_targets(tests, archive, relevant_targets):
+def update_targets(population, archive, relevant_targets):
     """
     Identify the targets that are reached but not satisfied by the current \
     generation of tests.
 
     Inputs:
-    tests:              The current generation of tests.
+    population:         The Population of the current generation of tests.
     archive:            The list of best test cases that satisfy specific
                         targets.
     relevant_targets:   The list of targets that should be taken into account
@@ -468,21 +487,15 @@ def update_targets(tests, archive, relevant_targets):
     updated_targets:    The list of targets that are reached but not satisfied
                         by the current generation of tests.
     """
-    updated_targets = [False] * len(archive)
-    for i, (best_test, relevant) in enumerate(zip(archive, relevant_targets)):
-        if relevant:
-            if best_test is not None:
-                pass
-            else:
-                for test in tests:
-                    if (test.distance_vector[i] > 0) & \
-                            (test.distance_vector[i] <= 1):
-                        updated_targets[i] = True
-                        break
-    return updated_targets
+    uncovered = np.array([relevant & (best_test is None) for
+                          best_test, relevant in
+                          zip(archive, relevant_targets)], dtype=bool)
+    reached = ((population.distances > 0) &
+               (population.distances <= 1)).any(axis=0)
+    return (uncovered & reached).tolist()
 
 
-def determine_relevant_targets(_compactEdges, _compactNodes,
+def determine_relevant_targets(_compactEdges, _nodeIndex,
                                _ignoreFunctionNames, _functionNames,
                                log=False, _ignoreFallback=True):
     """
@@ -492,6 +505,7 @@ def determine_relevant_targets(_compactEdges, _compactNodes,
 
     Inputs:
     _compactEdges: The edges of the CDG of the smart contract.
+    _nodeIndex:    The nodes of the CDG of the smart contract by their node_id.
     _ignoreFunctionNames: The names of the functions that can be ignored.
     _FunctionNames: The list of names of the functions that all the relevant
                     Functions are in.
@@ -503,10 +517,8 @@ def determine_relevant_targets(_compactEdges, _compactNodes,
     relevant_targets = [True] * len(_compactEdges)
 
     for i, cEdge in enumerate(_compactEdges):
-        startNode = next((cNode for cNode in _compactNodes if
-                          cNode.node_id == cEdge.startNode_id), None)
-        endNode = next((cNode for cNode in _compactNodes if
-                        cNode.node_id == cEdge.endNode_id), None)
+        startNode = _nodeIndex.get(cEdge.startNode_id)
+        endNode = _nodeIndex.get(cEdge.endNode_id)
         assert (startNode is not None) & (endNode is not None), \
             "Failed to find a startNode or endNode in "\
             "determine_relevant_targets!"
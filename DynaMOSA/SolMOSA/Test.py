@@ -4,6 +4,11 @@ This module contains all code necessary to create and interact with test cases.
 Classes:
     - TestCase:     The class describing a test case.
     - MethodCall:   The class describing a method call.
+
+Functions:
+    - digest_trace: Follow the trace of a method call through the CDG.
+    - branch_dist:  Calculate the branch distance of a branch not taken.
+    - normalise:    Normalise a branch distance.
 """
 
 import random
@@ -14,6 +19,8 @@ import re
 # import sys
 import numpy as np
 
+from Trace_Decoder import PC, OP, S_1, S_2
+
 
 class TestCase():
     """
@@ -21,29 +28,19 @@ class TestCase():
     it's performance.
 
     Properties:
-        - methodCalls:      A list of all the MethodCalls in the TestCase,
+        - methodCalls:      A tuple of all the MethodCalls in the TestCase,
                             the first MethodCall is always a constructor.
+                            MethodCalls are shared between test cases and
+                            are never changed.
         - returnVals:       The return values of each of the methodCalls.
         - distance_vector:  The distance vector, giving the distance from the
-                            test case to each of the branches.
-        - S:                The set of test cases that are dominated by this
-                            test case, used during the fast-non-dominated-sort
-                            procedure.
-        - n:                The domination-count used during the
-                            fast-non-dominated-sort procedure.
-        - rank:             Indicator that shows to which non-dominated-front
-                            this test case belongs.
-        - subvector_dist:   The subvector distance, used to compare different
-                            test cases in the same non-dominated Pareto-front.
+                            test case to each of the branches, a view of its
+                            row of the distance matrix once it is in a
+                            Population, archived test cases have their own
+                            copy.
     """
 
-    methodCalls = []
-    returnVals = []
-    distance_vector = None
-    S = []
-    n = 0
-    rank = math.inf
-    subvector_dist = 0
+    __slots__ = ('methodCalls', 'returnVals', 'distance_vector')
 
     def __init__(
             self, _methodCalls, _maxArrayLength, _random=False,
@@ -62,13 +59,9 @@ class TestCase():
         assigned to it or any information about domination.
         """
         if not _random:
-            self.methodCalls = _methodCalls
+            self.methodCalls = tuple(_methodCalls)
             self.returnVals = []
             self.distance_vector = None
-            self.S = []
-            self.n = 0
-            self.rank = math.inf
-            self.subvector_dist = 0
         else:
             poss_methods = SmartContract.methods.copy()
             assert poss_methods[0]['type'] == 'constructor',\
@@ -123,13 +116,9 @@ class TestCase():
                     _zeroAddress=_zeroAddress,
                     _nonExistantAccount=_nonExistantAccount, _maxWei=_maxWei)]
 
-            self.methodCalls = methodCalls
+            self.methodCalls = tuple(methodCalls)
             self.returnVals = []
             self.distance_vector = None
-            self.S = []
-            self.n = 0
-            self.rank = math.inf
-            self.subvector_dist = 0
 
     def show_test(self, log=False):
         """Show all the method calls in the test case."""
@@ -143,66 +132,60 @@ class TestCase():
         else:
             print(info)
 
-    def input_dict_strings(self):
-        """Generate the string-input for calling \
-        the SC_interaction.js script."""
-        ans = """"""
-        for methodCall in self.methodCalls:
-            input_dict_string = """{{name: '{}', inputVars: {}, """\
-                """fromAcc: '{}', value: BigNumber({}).toFixed()}}""".format(
-                    methodCall.methodName, self.InputVars_to_String(
-                        methodCall.inputvars), methodCall.fromAcc,
-                    methodCall.value)
-            if len(ans) > 0:
-                ans = ans + """, """ + input_dict_string
-            else:
-                ans = input_dict_string
+    def archived_copy(self):
+        """A copy of the test case for the archive, sharing its methodCalls \
+        and returnVals but with a distance vector of its own, so that the \
+        archive does not keep the distance matrix of a Population alive."""
+        ans = TestCase(self.methodCalls, None)
+        ans.returnVals = self.returnVals
+        ans.distance_vector = np.array(self.distance_vector)
         return ans
 
-    def InputVars_to_String(self, _inputvars):
-        """Translate Booleans from python to javascript. \
-        Also write integers to BigInts."""
-        ans = """["""
-        for i, iv in enumerate(_inputvars):
-            if i > 0 & i < len(_inputvars) - 1:
-                ans = ans + ""","""
-            if (isinstance(iv, bool)):
-                if (iv):
-                    ans = ans + """true"""
-                else:
-                    ans = ans + """false"""
-            elif type(iv) == str:
-                ans = ans + """'{}'""".format(iv)
+    def input_dicts(self):
+        """Generate the input for the SC_interaction.js script, a list \
+        of dicts that can be encoded as JSON."""
+        return [{'name': methodCall.methodName,
+                 'inputVars': self.InputVars_to_JSON(methodCall.inputvars),
+                 'fromAcc': methodCall.fromAcc,
+                 'value': str(methodCall.value)}
+                for methodCall in self.methodCalls]
+
+    def InputVars_to_JSON(self, _inputvars):
+        """Write integers as decimal strings, so that they can be read as \
+        BigNumbers by javascript without losing precision."""
+        ans = []
+        for iv in _inputvars:
+            if isinstance(iv, bool):
+                ans.append(iv)
             elif type(iv) == int:
-                ans = ans + """BigNumber(`{}`).toFixed()""".format(iv)
+                ans.append(str(iv))
             elif type(iv) == list:
-                ans = ans + """[{}]""".format(self.InputVars_to_String(iv))
+                ans.append(self.InputVars_to_JSON(iv))
             else:
-                ans = ans + """{}""".format(iv)
-        ans = ans + """]"""
+                ans.append(iv)
         return ans
 
-    def update_distance(self, methodResults, returnvals, compactNodes,
-                        compactEdges, approach_levels):
+    def update_distance(self, methodResults, returnvals, cdg,
+                        approach_levels):
         """
         Take the results of all MethodCalls in the test case and uses them to \
         set the distance_vector.
 
         Arguments:
             - methodResults:    The result of the MethodCalls in the test case,
-                                containing the state of the stack during
-                                execution.
-            - compactNodes:     The Nodes of the CDG of the smart contract.
-            - compactEdges:     The Edges of the CDG of the smart contract.
-            - approach_levels:  The approach levels between all the branches in
+                                the digest of the trace of each method call,
+                                see digest_trace.
+            - cdg:              The CDG of the smart contract.
+            - approach_levels:  The ApproachLevels between all the branches in
                                 the smart contract.
         """
         assert len(self.methodCalls) == len(methodResults), \
             "There should be equally many methodCalls and methodResults!"
+        compactEdges = cdg.CompactEdges
         edgeset = set()
         test_scores = np.empty(len(compactEdges))
         test_scores.fill(math.inf)
-        visited = set()
+        visited_ids = set()
 
         for methodCall, methodResult in \
                 zip(self.methodCalls[1:], methodResults[1:]):
@@ -221,154 +204,53 @@ class TestCase():
                                 f"resulted in an invalid address error.")
                 pass
             else:
-                curNode = next((cNode for cNode in
-                                compactNodes if
-                                cNode.node_id == ("_dispatcher", 1)), None)
-                cur_pc = methodResult[0]['pc']
-                assert cur_pc == 0, \
-                    "This methodcall doesn't start by going \
-                    to the dispatcher: {}".format(methodResult)
-
-                i = 0
-                node_stack_items = []
-                # Keep going until the last basic_block is reached.
-                while (curNode.basic_blocks[-1].end.name != "RETURN") & \
-                    (curNode.basic_blocks[-1].end.name != "REVERT") & \
-                        (curNode.basic_blocks[-1].end.name != "STOP") & \
-                        (curNode.basic_blocks[-1].end.name != "INVALID"):
-                    start_pc = curNode.basic_blocks[-1].start.pc
-                    end_pc = curNode.basic_blocks[-1].end.pc
-                    while not ((cur_pc >= start_pc) & (cur_pc <= end_pc)):
-                        # Skip ahead to the last basic_block of the
-                        # current Node
-                        node_stack_items = node_stack_items + [methodResult[i]]
-                        i += 1
-                        cur_pc = methodResult[i]['pc']
-
-                    while (cur_pc >= start_pc) & (cur_pc <= end_pc):
-                        # Go to the first basic_block outside of the
-                        # current Node
-                        node_stack_items = node_stack_items + [methodResult[i]]
-                        i += 1
-                        cur_pc = methodResult[i]['pc']
-
-                    nextNode = curNode
-                    for potential_nextNode in compactNodes:
-                        # Find the next Node.
-                        if (cur_pc >= potential_nextNode.
-                                basic_blocks[0].start.pc) & \
-                                (cur_pc <=
-                                 potential_nextNode.basic_blocks[0].end.pc):
-                            nextNode = potential_nextNode
-                            break
-                    visited = visited.union({curNode})
-                    if curNode == nextNode:
-                        logging.warning(f"The nextNode that was found: "
-                                        f"{nextNode.node_id} was the same "
-                                        f"as the curNode: {curNode.node_id} "
-                                        f"when calling {methodCall} last "
-                                        f"statement was "
-                                        f"{methodResult[i]['op']}."
-                                        f"this usually occurs in older "
-                                        f"versions of Solidity where "
-                                        f"INVALID nodes can be reached.")
+                for curNode_id, nextNode_id, dists in methodResult:
+                    visited_ids.add(curNode_id)
+                    if nextNode_id is None:
+                        # The execution could not be followed any further.
                         break
-
-                    for j, cEdge in enumerate(compactEdges):
-                        if (cEdge.startNode_id == curNode.node_id):
-                            # Look at all the edges that were not neccessarily
-                            # traversed.
-                            test_scores[j] = min(test_scores[j],
-                                                 self.branch_dist(
-                                                 nextNode.node_id,
-                                                 node_stack_items, cEdge))
-                            if (cEdge.endNode_id == nextNode.node_id):
-                                edgeset.add(j)
-                        if cEdge.endNode_id == nextNode.node_id:
-                            if cEdge.startNode_id in [visitedNode.node_id for
-                                                      visitedNode in visited]:
-                                test_scores[j] = 0
-                            if test_scores[j] == 0:
-                                # The edge has been traversed
-                                edgeset.add(j)
-                    curNode = nextNode
-
-        for i, test_score in enumerate(test_scores):
-            if test_score == math.inf:
-                test_scores[i] = self.approach_level(
-                    approach_levels, edgeset, i)
+                    for j, dist in zip(cdg.OutgoingEdges.get(curNode_id, []),
+                                       dists):
+                        # Look at all the edges that were not neccessarily
+                        # traversed.
+                        test_scores[j] = min(test_scores[j], dist)
+                        if (compactEdges[j].endNode_id == nextNode_id):
+                            edgeset.add(j)
+                    for j in cdg.IncomingEdges.get(nextNode_id, []):
+                        if compactEdges[j].startNode_id in visited_ids:
+                            test_scores[j] = 0
+                        if test_scores[j] == 0:
+                            # The edge has been traversed
+                            edgeset.add(j)
+
+        unreached = test_scores == math.inf
+        if unreached.any():
+            test_scores[unreached] = self.approach_level(
+                approach_levels, edgeset, unreached)
 
         self.distance_vector = test_scores
         self.returnVals = returnvals
 
-    def branch_dist(self, nextNode_id, stack_items, compactEdge):
-        """
-        Identify the predicate in the node that controlls the branch and \
-        calculate the corrsponding normalised branch distance.
-
-        Arguments:
-            - nextNode_id: The node_id of the next Node that is reached during
-                        the execution of the MethodCall.
-            - stack_items: The state of the stack during the execution of the
-                           node preceding the branch.
-            - compactEdge: The edge that corresponds to the branch.
-        """
-        if nextNode_id == compactEdge.endNode_id:
-            return 0
-        else:
-            pred_eval = compactEdge.predicate.eval
-            if pred_eval == "NONE":
-                # There is no predicate to evalueate
-                return 1
-            stack = next((stackItem['stack'] for stackItem in stack_items if
-                          stackItem['pc'] == compactEdge.predicate.pc), None)
-            if stack is None:
-                # The required predicate was not reached
-                return 1
-
-            s_1 = int(stack[-1], 16)
-            if pred_eval == 'ISZERO':
-                return self.normalise(np.abs(s_1))
-            s_2 = int(stack[-2], 16)
-            if pred_eval == 'EQ':
-                if s_1 == s_2:  # The other branch is found by s_1 != s_2
-                    return 1
-                else:
-                    return self.normalise(np.abs(s_1 - s_2))
-            else:
-                assert pred_eval in ['LT', 'GT', 'SLT', 'SGT'], \
-                    "Unknown predicate eval: {}".format(pred_eval)
-                if s_1 >= s_2:
-                    # The other branch is controlled either by LT or SLT
-                    return self.normalise(s_1 - s_2)
-                else:
-                    # The other branche is controlled either by GT or SGT
-                    return self.normalise(s_2 - s_1)
-
-    def normalise(self, val):
-        """Normalise a value, by dividing it by itself+1."""
-        assert val != -1, "Normalising -1 means dividing by 0!"
-        return val / (val + 1)
-
-    def approach_level(self, app_lvls, edgeset, cEdge):
+    def approach_level(self, app_lvls, edgeset, unreached):
         """
         Find the approach level of the test case for those branches that are \
         not reached.
 
         Arguments:
-            - app_lvls: The approach level matrix with the appraoch levels
-                        between each branch.
-            - edgeset:  A list of indices corresponding to all the edges
-                        traversed by the test case.
+            - app_lvls:     The ApproachLevels between each branch.
+            - edgeset:      A list of indices corresponding to all the edges
+                            traversed by the test case.
+            - unreached:    A boolean array indicating the branches that are
+                            not reached.
+        Outputs:
+            - An array holding the approach level of each unreached branch.
         """
-        app_lvl = math.inf
-        for j in edgeset:
-            app_lvl = min(app_lvl, app_lvls[j][cEdge])
-        if app_lvl == 0:
+        app_lvl = app_lvls.closest(edgeset)[unreached]
+        if (app_lvl == 0).any():
             logging.warning("An approach level of 0 should only be used if \
             an INVALID node was reached.")
-            logging.warning(f"app_lvl: {app_lvl}\nj:{j}\ncEdge: {cEdge}\n\n\
-            app_lvls: {app_lvls}")
+            logging.warning(f"edgeset: {edgeset}\ncEdges: "
+                            f"{np.flatnonzero(unreached)[app_lvl == 0]}")
             # TODO: create an assert statement here to check if the above
             # statement is correct
         return app_lvl
@@ -376,7 +258,9 @@ class TestCase():
 
 class MethodCall():
     """
-    A class describing the methods of a test case that can be called.
+    A class describing the methods of a test case that can be called, \
+    method calls can be shared by test cases so their properties are never \
+    changed after they are created.
 
     Properties:
         - methodName:   The name of the method in the CDG of the smart
@@ -386,13 +270,10 @@ class MethodCall():
                         should be made.
         - value:        The amount of wei that should be send with the
                         transaction of the method call.
+        - payable:      Whether wei can be send with the method call.
     """
 
-    methodName = ""
-    inputvars = []
-    fromAcc = ""
-    value = 0
-    payable = False
+    __slots__ = ('methodName', 'inputvars', 'fromAcc', 'value', 'payable')
 
     def __init__(self, _methodName, _inputvars, _fromAcc, _value, _payable,
                  _maxArrayLength,
@@ -569,3 +450,122 @@ class MethodCall():
             assert False, \
                 "This method has an unsupported type: {}".format(varType)
             return 0
+
+
+def digest_trace(methodResult, cdg):
+    """
+    Follow the execution of a method call through the CDG, streaming through \
+    its trace once. Only the first step at each predicate pc is kept while \
+    walking, so the trace can be freed as soon as it is digested.
+
+    Arguments:
+        - methodResult: The compact trace of a method call, made of [pc, op]
+                        steps and [pc, op, s_1, s_2] steps at predicates,
+                        containing the top of the stack.
+        - cdg:          The CDG of the smart contract.
+    Outputs:
+        - The digest of the trace, a list with a (curNode_id, nextNode_id,
+          dists) tuple for each node that was left, where dists holds the
+          branch distance of each of the cdg.OutgoingEdges of the node. The
+          nextNode_id is None if the execution could not be followed to
+          another node.
+    """
+    compactEdges = cdg.CompactEdges
+    curNode = cdg.NodeIndex.get(("_dispatcher", 1))
+    cur_pc = methodResult[0][PC]
+    assert cur_pc == 0, \
+        "This methodcall doesn't start by going \
+        to the dispatcher: {}".format(methodResult)
+
+    i = 0
+    predicate_steps = {}
+    digest = []
+    # Keep going until the last basic_block is reached.
+    while curNode.node_id not in cdg.TerminalNodeIds:
+        start_pc = curNode.basic_blocks[-1].start.pc
+        end_pc = curNode.basic_blocks[-1].end.pc
+        while not ((cur_pc >= start_pc) & (cur_pc <= end_pc)):
+            # Skip ahead to the last basic_block of the current Node
+            if len(methodResult[i]) > S_1:
+                predicate_steps.setdefault(cur_pc, methodResult[i])
+            i += 1
+            cur_pc = methodResult[i][PC]
+
+        while (cur_pc >= start_pc) & (cur_pc <= end_pc):
+            # Go to the first basic_block outside of the current Node
+            if len(methodResult[i]) > S_1:
+                predicate_steps.setdefault(cur_pc, methodResult[i])
+            i += 1
+            cur_pc = methodResult[i][PC]
+
+        # Find the next Node.
+        nextNode = cdg.Node_At_Pc(cur_pc)
+        if nextNode is None:
+            nextNode = curNode
+        if curNode == nextNode:
+            logging.warning(f"The nextNode that was found: "
+                            f"{nextNode.node_id} was the same "
+                            f"as the curNode: {curNode.node_id} "
+                            f"last statement was "
+                            f"{methodResult[i][OP]}."
+                            f"this usually occurs in older "
+                            f"versions of Solidity where "
+                            f"INVALID nodes can be reached.")
+            digest.append((curNode.node_id, None, ()))
+            break
+
+        dists = []
+        for j in cdg.OutgoingEdges.get(curNode.node_id, []):
+            cEdge = compactEdges[j]
+            if cEdge.endNode_id == nextNode.node_id:
+                dists.append(0)
+            else:
+                dists.append(branch_dist(
+                    predicate_steps.get(cEdge.predicate.pc), cEdge))
+        digest.append((curNode.node_id, nextNode.node_id, tuple(dists)))
+        curNode = nextNode
+    return digest
+
+
+def branch_dist(stackItem, compactEdge):
+    """
+    Calculate the normalised branch distance of a branch that was not \
+    taken, from the predicate that controlls it.
+
+    Arguments:
+        - stackItem:   The compact trace step of the predicate of the branch,
+                       None if the predicate was not reached.
+        - compactEdge: The edge that corresponds to the branch.
+    """
+    pred_eval = compactEdge.predicate.eval
+    if pred_eval == "NONE":
+        # There is no predicate to evalueate
+        return 1
+    if stackItem is None:
+        # The required predicate was not reached
+        return 1
+
+    s_1 = int(stackItem[S_1], 16)
+    if pred_eval == 'ISZERO':
+        return normalise(np.abs(s_1))
+    s_2 = int(stackItem[S_2], 16)
+    if pred_eval == 'EQ':
+        if s_1 == s_2:  # The other branch is found by s_1 != s_2
+            return 1
+        else:
+            return normalise(np.abs(s_1 - s_2))
+    else:
+        assert pred_eval in ['LT', 'GT', 'SLT', 'SGT'], \
+            "Unknown predicate eval: {}".format(pred_eval)
+        if s_1 >= s_2:
+            # The other branch is controlled either by LT or SLT
+            return normalise(s_1 - s_2)
+        else:
+            # The other branche is controlled either by GT or SGT
+            return normalise(s_2 - s_1)
+
+
+def normalise(val):
+    """Normalise a value, by dividing it by itself+1."""
+    assert val != -1, "Normalising -1 means dividing by 0!"
+    return val / (val + 1)
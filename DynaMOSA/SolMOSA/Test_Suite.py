@@ -23,8 +23,8 @@ class TestSuite():
     """
 
     smartContract = None
-    tests = []
-    accounts = []
+    tests = None
+    accounts = None
     addresspool = None
     ETHpool = None
     intpool = None
@@ -109,39 +109,71 @@ class TestSuite():
                     test.show_test()
 
     def generate_test_inputs(self):
-        """Create a string that can be used by SC_interaction.js script to \
-        deploy and interact with smart contracts."""
-        ans = """"""
-        for test in self.tests:
-            test_inputs = test.input_dict_strings()
-            if len(ans) > 0:
-                ans = ans + """, """ + test_inputs
-            else:
-                ans = test_inputs
-        return "[" + ans + "]"
+        """Create the input that is used by the SC_interaction.js script to \
+        deploy and interact with smart contracts, one list of method calls \
+        per test."""
+        return [test.input_dicts() for test in self.tests]
 
-    def update_test_distances(self, callResults, returnvals):
+    def update_test_distances(self, callResults, fitnessPool=None):
         """Calculate the branch distance vector for each test in self.tests.
 
         Inputs:
-            - callResults: A description of the evaluation of a methodcall or \
-            smart contract deployment.
+            - callResults: An iterable of (test index, methodResults,
+                           returnvals) tuples, where the methodResults hold
+                           the digest of the trace of each methodcall of the
+                           test, see Test.digest_trace. Tests are updated as
+                           soon as their results arrive.
+            - fitnessPool: The FitnessPool that computes the distance vectors
+                           from the traces themselves, None to compute them
+                           in this process from the digests.
         Result:
             - Each test in the TestSuite has an updated branch distance vector.
         """
-        start = 0
-        end = 0
-        cNodes = self.smartContract.CDG.CompactNodes
-        cEdges = self.smartContract.CDG.CompactEdges
+        if fitnessPool is not None:
+            for k, distance_vector, rVals in \
+                    fitnessPool.update_distances(self.tests, callResults):
+                self.tests[k].distance_vector = distance_vector
+                self.tests[k].returnVals = rVals
+            return
+
+        cdg = self.smartContract.CDG
         app_lvls = self.smartContract.approach_levels
 
-        for testCase in self.tests:
-            end = end + len(testCase.methodCalls)
-            methodResults = callResults[start:end]
-            rVals = returnvals[start:end]
-            testCase.update_distance(
-                methodResults, rVals, cNodes, cEdges, app_lvls)
-            start = end
+        for k, methodResults, rVals in callResults:
+            self.tests[k].update_distance(methodResults, rVals, cdg, app_lvls)
+
+    def evaluate(self, executor, fitnessCache, fitnessPool=None):
+        """Update the branch distance vector of each test in self.tests, only \
+        the tests that are not in the fitness cache are run by the executor.
+
+        Inputs:
+            - executor:     The ExecutionBackend that runs the tests.
+            - fitnessCache: The FitnessCache holding the distance vector and
+                            return values of earlier tests, the tests that are
+                            run are added to it.
+            - fitnessPool:  The FitnessPool that computes the distance vectors,
+                            see update_test_distances.
+        Result:
+            - Each test in the TestSuite has an updated branch distance vector.
+        """
+        test_inputs = self.generate_test_inputs()
+        keys = [fitnessCache.key(test_input) for test_input in test_inputs]
+        uncached = []
+        for k, key in enumerate(keys):
+            cached = fitnessCache.get(key)
+            if cached is None:
+                uncached.append(k)
+            else:
+                self.tests[k].distance_vector = cached[0].copy()
+                self.tests[k].returnVals = cached[1]
+
+        callResults = executor.run_tests([test_inputs[k] for k in uncached])
+        self.update_test_distances(
+            ((uncached[i], methodResults, rVals)
+             for i, methodResults, rVals in callResults), fitnessPool)
+        for k in uncached:
+            fitnessCache.put(keys[k], self.tests[k].distance_vector,
+                             self.tests[k].returnVals)
 
     def save_TestSuite(self, save_location):
         """
@@ -0,0 +1,121 @@
+"""
+This module contains all code necessary to decode the traces that are sent \
+back by the blockchain executor.
+
+Every step of a trace is compact, it only holds the fields that are used to \
+calculate branch distances: [pc, op, s_1, s_2], where s_1 and s_2 are the top \
+two words of the stack (hex strings) or None if the stack is not that deep. \
+When the executor is given a trace filter, it only sends the steps at basic \
+block boundaries as [pc, op] and the steps at predicates as [pc, op, s_1, s_2].
+
+Functions:
+    - compact_trace:    Compact a full structLog trace.
+    - decode_reply:     Decode a single reply of the executor.
+    - benchmark:        Compare decoding compact traces to the literal_eval of
+                        full structLog traces.
+"""
+
+import ast
+import json
+import logging
+import timeit
+
+# Indices of the fields of a compact trace step.
+PC = 0
+OP = 1
+S_1 = 2
+S_2 = 3
+
+
+def compact_trace(structLogs, tracePcs=None, predicatePcs=None):
+    """
+    Compact a full structLog trace, as returned by debug_traceTransaction.
+
+    Arguments:
+        - structLogs:   A list of dicts holding at least the pc, op and stack
+                        of each executed instruction.
+        - tracePcs:     If given, only the steps at these pcs and the
+                        predicatePcs are kept, see CDG.TracePcs.
+        - predicatePcs: The pcs of the steps for which the top of the stack is
+                        kept when filtering, see CDG.PredicatePcs.
+    Outputs:
+        - The compact trace, this is the same trace SC_interaction.js sends
+          back.
+    """
+    if tracePcs is None:
+        ans = []
+        for step in structLogs:
+            stack = step['stack']
+            ans.append([step['pc'], step['op'],
+                        stack[-1] if len(stack) > 0 else None,
+                        stack[-2] if len(stack) > 1 else None])
+        return ans
+
+    tracePcs = set(tracePcs)
+    predicatePcs = set(predicatePcs)
+    ans = []
+    depth = structLogs[0].get('depth') if len(structLogs) > 0 else None
+    for step in structLogs:
+        if step.get('depth') != depth:
+            # Steps of nested calls run code of other contracts.
+            continue
+        if step['pc'] in predicatePcs:
+            stack = step['stack']
+            ans.append([step['pc'], step['op'],
+                        stack[-1] if len(stack) > 0 else None,
+                        stack[-2] if len(stack) > 1 else None])
+        elif step['pc'] in tracePcs:
+            ans.append([step['pc'], step['op']])
+    return ans
+
+
+def decode_reply(line):
+    """
+    Decode a single line sent back by the executor.
+
+    Arguments:
+        - line: A line of JSON, e.g. the traces and return values of a test.
+    Outputs:
+        - The decoded reply. json.loads uses the C-accelerated scanner of the
+          standard library, which is far faster than ast.literal_eval.
+    """
+    return json.loads(line)
+
+
+def benchmark(structLogs_traces, number=3):
+    """
+    Time the old way of reading traces (the literal_eval of the full \
+    structLogs) against decoding the compact traces the executor now sends.
+
+    Arguments:
+        - structLogs_traces:    A list of full structLog traces, e.g. the
+                                content of an old debugs.txt.
+        - number:               The number of times each decoder is run.
+    Outputs:
+        - The average time in seconds of the old and the new decoder.
+    """
+    full = repr(structLogs_traces)
+    compact = json.dumps({'test': 0, 'traces': [
+        compact_trace(trace) if isinstance(trace, list) else trace
+        for trace in structLogs_traces], 'returnvals': []})
+
+    old_time = timeit.timeit(lambda: ast.literal_eval(full),
+                             number=number) / number
+    new_time = timeit.timeit(lambda: decode_reply(compact),
+                             number=number) / number
+    logging.info(f"Full structLogs: {len(full) / 1e6:.2f} MB, decoded in "
+                 f"{old_time:.3f} s by ast.literal_eval.")
+    logging.info(f"Compact traces: {len(compact) / 1e6:.2f} MB, decoded in "
+                 f"{new_time:.3f} s by json.loads.")
+    logging.info(f"Speedup: {old_time / new_time:.1f}x")
+    return old_time, new_time
+
+
+if __name__ == '__main__':
+    import sys
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    assert len(sys.argv) == 2, \
+        "Usage: python Trace_Decoder.py <debugs.txt with full structLogs>"
+    with open(sys.argv[1], 'r') as f:
+        traces = json.load(f)
+    benchmark(traces)
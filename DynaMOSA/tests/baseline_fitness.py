@@ -0,0 +1,214 @@
+"""
+The fitness function as TestCase computed it before traces were compacted \
+and digested: every method call is replayed from its full structLog trace by \
+scanning all CompactNodes and CompactEdges, with the approach levels taken \
+from the dense matrix. It is kept as the reference the distance vectors of \
+TestCase.update_distance and the FitnessPool workers are checked against.
+
+Classes:
+    - BaselineTestCase: A TestCase that computes its distance vector the way
+                        the baseline did.
+"""
+
+import logging
+import math
+
+import numpy as np
+
+from Test import TestCase
+
+
+class BaselineTestCase(TestCase):
+    """A TestCase that computes its distance vector from full structLog \
+    traces with the baseline algorithm."""
+
+    def update_distance(self, methodResults, returnvals, compactNodes,
+                        compactEdges, approach_levels):
+        """
+        Take the results of all MethodCalls in the test case and uses them to \
+        set the distance_vector.
+
+        Arguments:
+            - methodResults:    The result of the MethodCalls in the test case,
+                                containing the state of the stack during
+                                execution.
+            - compactNodes:     The Nodes of the CDG of the smart contract.
+            - compactEdges:     The Edges of the CDG of the smart contract.
+            - approach_levels:  The approach levels between all the branches in
+                                the smart contract.
+        """
+        assert len(self.methodCalls) == len(methodResults), \
+            "There should be equally many methodCalls and methodResults!"
+        edgeset = set()
+        test_scores = np.empty(len(compactEdges))
+        test_scores.fill(math.inf)
+        visited = set()
+
+        for methodCall, methodResult in \
+                zip(self.methodCalls[1:], methodResults[1:]):
+            if methodResult in ["passTime", "passBlocks", "ConstructorFail"]:
+                # These are not real method calls.
+                pass
+            elif methodResult == "Out of Ether":
+                # This did not yield a result
+                logging.warning("An account ran out of Ether! Check out the "
+                                "blockchain log for more info.")
+                pass
+            elif methodResult == "Invalid Address":
+                # This did not yield a result
+                logging.warning(f"Passing an invalid address to "
+                                f"{methodCall.methodName} "
+                                f"resulted in an invalid address error.")
+                pass
+            else:
+                curNode = next((cNode for cNode in
+                                compactNodes if
+                                cNode.node_id == ("_dispatcher", 1)), None)
+                cur_pc = methodResult[0]['pc']
+                assert cur_pc == 0, \
+                    "This methodcall doesn't start by going \
+                    to the dispatcher: {}".format(methodResult)
+
+                i = 0
+                node_stack_items = []
+                # Keep going until the last basic_block is reached.
+                while (curNode.basic_blocks[-1].end.name != "RETURN") & \
+                    (curNode.basic_blocks[-1].end.name != "REVERT") & \
+                        (curNode.basic_blocks[-1].end.name != "STOP") & \
+                        (curNode.basic_blocks[-1].end.name != "INVALID"):
+                    start_pc = curNode.basic_blocks[-1].start.pc
+                    end_pc = curNode.basic_blocks[-1].end.pc
+                    while not ((cur_pc >= start_pc) & (cur_pc <= end_pc)):
+                        # Skip ahead to the last basic_block of the
+                        # current Node
+                        node_stack_items = node_stack_items + [methodResult[i]]
+                        i += 1
+                        cur_pc = methodResult[i]['pc']
+
+                    while (cur_pc >= start_pc) & (cur_pc <= end_pc):
+                        # Go to the first basic_block outside of the
+                        # current Node
+                        node_stack_items = node_stack_items + [methodResult[i]]
+                        i += 1
+                        cur_pc = methodResult[i]['pc']
+
+                    nextNode = curNode
+                    for potential_nextNode in compactNodes:
+                        # Find the next Node.
+                        if (cur_pc >= potential_nextNode.
+                                basic_blocks[0].start.pc) & \
+                                (cur_pc <=
+                                 potential_nextNode.basic_blocks[0].end.pc):
+                            nextNode = potential_nextNode
+                            break
+                    visited = visited.union({curNode})
+                    if curNode == nextNode:
+                        logging.warning(f"The nextNode that was found: "
+                                        f"{nextNode.node_id} was the same "
+                                        f"as the curNode: {curNode.node_id} "
+                                        f"when calling {methodCall} last "
+                                        f"statement was "
+                                        f"{methodResult[i]['op']}."
+                                        f"this usually occurs in older "
+                                        f"versions of Solidity where "
+                                        f"INVALID nodes can be reached.")
+                        break
+
+                    for j, cEdge in enumerate(compactEdges):
+                        if (cEdge.startNode_id == curNode.node_id):
+                            # Look at all the edges that were not neccessarily
+                            # traversed.
+                            test_scores[j] = min(test_scores[j],
+                                                 self.branch_dist(
+                                                 nextNode.node_id,
+                                                 node_stack_items, cEdge))
+                            if (cEdge.endNode_id == nextNode.node_id):
+                                edgeset.add(j)
+                        if cEdge.endNode_id == nextNode.node_id:
+                            if cEdge.startNode_id in [visitedNode.node_id for
+                                                      visitedNode in visited]:
+                                test_scores[j] = 0
+                            if test_scores[j] == 0:
+                                # The edge has been traversed
+                                edgeset.add(j)
+                    curNode = nextNode
+
+        for i, test_score in enumerate(test_scores):
+            if test_score == math.inf:
+                test_scores[i] = self.approach_level(
+                    approach_levels, edgeset, i)
+
+        self.distance_vector = test_scores
+        self.returnVals = returnvals
+
+    def branch_dist(self, nextNode_id, stack_items, compactEdge):
+        """
+        Identify the predicate in the node that controlls the branch and \
+        calculate the corrsponding normalised branch distance.
+
+        Arguments:
+            - nextNode_id: The node_id of the next Node that is reached during
+                        the execution of the MethodCall.
+            - stack_items: The state of the stack during the execution of the
+                           node preceding the branch.
+            - compactEdge: The edge that corresponds to the branch.
+        """
+        if nextNode_id == compactEdge.endNode_id:
+            return 0
+        else:
+            pred_eval = compactEdge.predicate.eval
+            if pred_eval == "NONE":
+                # There is no predicate to evalueate
+                return 1
+            stack = next((stackItem['stack'] for stackItem in stack_items if
+                          stackItem['pc'] == compactEdge.predicate.pc), None)
+            if stack is None:
+                # The required predicate was not reached
+                return 1
+
+            s_1 = int(stack[-1], 16)
+            if pred_eval == 'ISZERO':
+                return self.normalise(np.abs(s_1))
+            s_2 = int(stack[-2], 16)
+            if pred_eval == 'EQ':
+                if s_1 == s_2:  # The other branch is found by s_1 != s_2
+                    return 1
+                else:
+                    return self.normalise(np.abs(s_1 - s_2))
+            else:
+                assert pred_eval in ['LT', 'GT', 'SLT', 'SGT'], \
+                    "Unknown predicate eval: {}".format(pred_eval)
+                if s_1 >= s_2:
+                    # The other branch is controlled either by LT or SLT
+                    return self.normalise(s_1 - s_2)
+                else:
+                    # The other branche is controlled either by GT or SGT
+                    return self.normalise(s_2 - s_1)
+
+    def normalise(self, val):
+        """Normalise a value, by dividing it by itself+1."""
+        assert val != -1, "Normalising -1 means dividing by 0!"
+        return val / (val + 1)
+
+    def approach_level(self, app_lvls, edgeset, cEdge):
+        """
+        Find the approach level of the test case for those branches that are \
+        not reached.
+
+        Arguments:
+            - app_lvls: The approach level matrix with the appraoch levels
+                        between each branch.
+            - edgeset:  A list of indices corresponding to all the edges
+                        traversed by the test case.
+        """
+        app_lvl = math.inf
+        for j in edgeset:
+            app_lvl = min(app_lvl, app_lvls[j][cEdge])
+        if app_lvl == 0:
+            logging.warning("An approach level of 0 should only be used if \
+            an INVALID node was reached.")
+            logging.warning(f"app_lvl: {app_lvl}\nj:{j}\ncEdge: {cEdge}\n\n\
+            app_lvls: {app_lvls}")
+            # TODO: create an assert statement here to check if the above
+            # statement is correct
+        return app_lvl
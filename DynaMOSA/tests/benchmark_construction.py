@@ -0,0 +1,156 @@
+"""
+Time the construction of the CDG and the approach levels of contracts with \
+the SolMOSA code of two git revisions, e.g. before and after a change.
+
+Usage: python benchmark_construction.py [--before REV] [--after REV]
+                                        [contract json ...]
+
+The code of each revision is exported to a temporary folder and timed in a \
+separate python process. Without --after the code in the working tree is \
+timed, without contract jsons all contracts in RWContracts are timed.
+"""
+
+import argparse
+import glob
+import io
+import json
+import os
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+SOLMOSA = os.path.abspath(os.path.join(TESTS, os.pardir, "SolMOSA"))
+RWCONTRACTS = os.path.abspath(os.path.join(
+    TESTS, os.pardir, "Smart Contracts", "RWContracts"))
+PREDICATES = ["LT", "GT", "SLT", "SGT", "EQ"]
+
+
+def export(revision, folder):
+    """
+    Export the SolMOSA folder of a git revision.
+
+    Arguments:
+        - revision: A git revision, e.g. a commit hash or HEAD~1.
+        - folder:   The folder to export it to.
+    Outputs:
+        - The path of the exported SolMOSA folder.
+    """
+    repo = subprocess.check_output(
+        ["git", "rev-parse", "--show-toplevel"], cwd=TESTS, text=True).strip()
+    archive = subprocess.check_output(
+        ["git", "archive", "--format=tar", revision,
+         os.path.relpath(SOLMOSA, repo)], cwd=repo)
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(folder)
+    return os.path.join(folder, os.path.relpath(SOLMOSA, repo))
+
+
+def time_revision(solmosa, contract_json_locations):
+    """Time the construction in a separate process, with the given SolMOSA \
+    folder as working directory and on the path."""
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), "--time", solmosa] +
+        contract_json_locations, cwd=solmosa, text=True)
+    return json.loads(output)
+
+
+def time_construction(contract_json_locations):
+    """
+    Time the construction of the CDG and the approach levels of contracts, \
+    with the SolMOSA modules of the working directory.
+
+    Outputs:
+        - The number of nodes and edges, the time to build the CDG, the time
+          to build the SmartContract, with its approach levels, and, if the
+          approach levels are computed lazily, the time to search them from
+          every edge, of each contract.
+    """
+    import logging
+    from CDG import CDG
+    from SmartContract import SmartContract
+    logging.disable(logging.CRITICAL)
+    ans = {}
+    for contract_json_location in contract_json_locations:
+        with open(contract_json_location, 'r') as f:
+            contract_json = json.load(f)
+        start_time = time.perf_counter()
+        cdg = CDG(contract_json['contractName'],
+                  contract_json['deployedBytecode'], PREDICATES)
+        cdg.LT(PREDICATES)
+        cdg_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        sc = SmartContract(contract_json, cdg, [],
+                           [method['name'] for method in contract_json['abi']
+                            if method['type'] == 'function'])
+        sc_time = time.perf_counter() - start_time
+        search_time = None
+        if hasattr(sc.approach_levels, "search"):
+            # The searches that are otherwise done during the evaluations.
+            start_time = time.perf_counter()
+            for j in range(len(cdg.CompactEdges)):
+                sc.approach_levels.search(j)
+            search_time = time.perf_counter() - start_time
+        ans[contract_json_location] = (
+            len(cdg.CompactNodes), len(cdg.CompactEdges), cdg_time, sc_time,
+            search_time)
+    return ans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--before", default="HEAD",
+                        help="The revision to compare against.")
+    parser.add_argument("--after", default=None,
+                        help="The revision to time, the working tree if it "
+                             "is not given.")
+    parser.add_argument("--time", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("contracts", nargs="*",
+                        help="The contract jsons to build.")
+    args = parser.parse_args()
+    contracts = [os.path.abspath(path) for path in args.contracts] or \
+        sorted(glob.glob(os.path.join(
+            RWCONTRACTS, "*", "build", "contracts", "*.json")))
+
+    if args.time is not None:
+        sys.path.insert(0, args.time)
+        print(json.dumps(time_construction(contracts)))
+        return
+
+    with tempfile.TemporaryDirectory() as folder:
+        before = time_revision(export(args.before, os.path.join(
+            folder, "before")), contracts)
+        if args.after is None:
+            after = time_revision(SOLMOSA, contracts)
+        else:
+            after = time_revision(export(args.after, os.path.join(
+                folder, "after")), contracts)
+
+    print(f"{'contract':24} {'nodes':>5} {'edges':>5} "
+          f"{'CDG before':>11} {'after':>8} {'AL before':>10} {'after':>8} "
+          f"{'searches before':>16} {'after':>8}")
+    totals = [0] * 6
+    for path in contracts:
+        # The times before and after of each column next to each other.
+        times = [t for pair in zip(before[path][2:], after[path][2:]) for
+                 t in pair]
+        totals = [None if (total is None) | (t is None) else total + t for
+                  total, t in zip(totals, times)]
+        name = os.path.splitext(os.path.basename(path))[0]
+        print(f"{name[:24]:24} {before[path][0]:>5} {before[path][1]:>5} "
+              + show_times(times))
+    print(f"{'total':24} {'':>5} {'':>5} " + show_times(totals))
+
+
+def show_times(times):
+    """Show the times of the CDG, the approach levels and the searches \
+    before and after in the columns of the table."""
+    return " ".join("{:>{}}".format(
+        "-" if t is None else f"{t:.3f}s", width) for t, width in
+        zip(times, [11, 8, 10, 8, 16, 8]))
+
+
+if __name__ == "__main__":
+    main()
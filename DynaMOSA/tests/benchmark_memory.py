@@ -0,0 +1,119 @@
+"""
+Measure the peak resident memory of a SolMOSA run with the code of two git \
+revisions, e.g. before and after a change.
+
+Usage: python benchmark_memory.py [--before REV] [--after REV]
+                                  [--generations N] [--retention POLICY]
+                                  [--seed SEED] contract json
+
+The code of each revision is exported to a temporary folder and run in a \
+separate python process on the py-evm backend, so that no blockchain client \
+is needed and the memory of the blockchain is included. Without --after the \
+code in the working tree is run. The peak is measured as Main.peak_rss does.
+"""
+
+import argparse
+import configparser
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from benchmark_construction import SOLMOSA, export
+
+
+def peak_rss():
+    """Return the peak resident memory of the process in MB, from VmHWM the \
+    same way as Main.peak_rss, which can't be imported without running \
+    Main."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    assert False, "The peak resident memory can only be measured on Linux."
+
+
+def measure_revision(solmosa, args):
+    """Run SolMOSA in a separate process, with the given SolMOSA folder as \
+    working directory and on the path."""
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), "--run", solmosa,
+         "--generations", str(args.generations), "--retention",
+         args.retention, "--seed", str(args.seed),
+         os.path.abspath(args.contract)], cwd=solmosa, text=True)
+    return json.loads(output.splitlines()[-1])
+
+
+def run(args):
+    """
+    Run SolMOSA on a contract, with the SolMOSA modules of the working \
+    directory.
+
+    Outputs:
+        - The peak resident memory in MB and the number of iterations.
+    """
+    import logging
+    sys.path.insert(0, args.run)
+    from SolMOSA import SolMOSA
+    logging.disable(logging.CRITICAL)
+    config = configparser.ConfigParser()
+    config.read(os.path.join(args.run, "Config.ini"))
+    config['Blockchain']['backend'] = "py-evm"
+    config['Files']['contract_json_location'] = args.contract
+    config['Parameters']['search_budget'] = str(args.generations)
+    config['Parameters']['history_retention'] = args.retention
+    # Main.set_settings fills the pools from the contract, they are left
+    # empty here.
+    config['Parameters']['addresspool'] = "set()"
+    config['Parameters']['ETHpool'] = "{0}"
+    config['Parameters']['intpool'] = "{0}"
+    config['Parameters']['stringpool'] = "set()"
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    archives, tSuite, runtime, blockchain_time, iterations, relevant = \
+        SolMOSA(config)
+    return peak_rss(), iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--before", default="HEAD",
+                        help="The revision to compare against.")
+    parser.add_argument("--after", default=None,
+                        help="The revision to measure, the working tree if "
+                             "it is not given.")
+    parser.add_argument("--generations", type=int, default=10,
+                        help="The search budget in generations.")
+    parser.add_argument("--retention", default="final",
+                        help="The history_retention policy.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--run", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("contract", help="The contract json to test.")
+    args = parser.parse_args()
+
+    if args.run is not None:
+        print(json.dumps(run(args)))
+        return
+
+    with tempfile.TemporaryDirectory() as folder:
+        before = measure_revision(export(args.before, os.path.join(
+            folder, "before")), args)
+        if args.after is None:
+            after = measure_revision(SOLMOSA, args)
+        else:
+            after = measure_revision(export(args.after, os.path.join(
+                folder, "after")), args)
+
+    name = os.path.splitext(os.path.basename(args.contract))[0]
+    print(f"{'contract':24} {'generations':>11} {'retention':>9} "
+          f"{'peak RSS before':>16} {'after':>9}")
+    print(f"{name[:24]:24} {after[1]:>11} {args.retention:>9} "
+          f"{before[0]:>13} MB {after[0]:>6} MB")
+
+
+if __name__ == "__main__":
+    main()
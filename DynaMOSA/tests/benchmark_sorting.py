@@ -0,0 +1,61 @@
+"""
+Time the fast non-dominated sort of the pairwise implementation against the \
+vectorised one, for populations of 50 up to 1000 test cases.
+
+Usage: python benchmark_sorting.py [--targets M] [--relevant R] [--seed S]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, "SolMOSA"))
+
+import pairwise_sorting  # noqa: E402
+import Preference_Sorting  # noqa: E402
+from Population import Population  # noqa: E402
+from test_preference_sorting import Case  # noqa: E402
+
+POPULATION_SIZES = [50, 100, 200, 500, 1000]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--targets", type=int, default=60,
+                        help="The number of targets.")
+    parser.add_argument("--relevant", type=int, default=40,
+                        help="The number of updated targets.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    updated_targets = [j < args.relevant for j in range(args.targets)]
+    print(f"{'N':>6} {'pairwise':>10} {'vectorised':>11} {'speedup':>8}")
+    for N in POPULATION_SIZES:
+        D = rng.random((N, args.targets)) + \
+            rng.integers(0, 3, size=(N, args.targets))
+        cases = [Case(D[k].copy(), 1) for k in range(N)]
+
+        start = time.perf_counter()
+        reference = pairwise_sorting.fast_non_dominated_sort(
+            set(cases), updated_targets)
+        pairwise_time = time.perf_counter() - start
+
+        population = Population(cases, args.targets)
+        start = time.perf_counter()
+        Fs = Preference_Sorting.fast_non_dominated_sort(
+            population, np.arange(N), updated_targets)
+        vectorised_time = time.perf_counter() - start
+
+        assert len(Fs) == len(reference), \
+            "The implementations found a different number of fronts!"
+        print(f"{N:>6} {pairwise_time:>9.4f}s {vectorised_time:>10.4f}s "
+              f"{pairwise_time / vectorised_time:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+"""Run the tests with the SolMOSA modules importable and the SolMOSA folder \
+as working directory, the same way Main.py is run, so that files like \
+IrrelNodePatterns.ini are found."""
+
+import os
+import sys
+
+import pytest
+
+SOLMOSA = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir,
+                                       "SolMOSA"))
+sys.path.insert(0, SOLMOSA)
+
+
+@pytest.fixture(autouse=True)
+def solmosa_folder(monkeypatch):
+    monkeypatch.chdir(SOLMOSA)
@@ -0,0 +1,104 @@
+"""
+The dense approach level matrix, as SmartContract built it before the \
+approach levels were computed lazily: a separate breadth-first search for \
+every ordered pair of edges. It is kept as the reference ApproachLevels is \
+checked against.
+
+Classes:
+    - DenseSmartContract:   A SmartContract that can build the dense approach
+                            level matrix.
+"""
+
+import logging
+
+import numpy as np
+
+from recursive_cdg import RecursiveSmartContract
+
+
+class DenseSmartContract(RecursiveSmartContract):
+    """A SmartContract that can build the dense approach level matrix with \
+    the recursive pairwise search."""
+
+    def dense_approach_levels(self):
+        """
+        Build the approach level matrix: the approach level from the j-th \
+        edge to the i-th edge is stored in app_lvls[j][i] and the maximal \
+        approach level of the i-th edge in app_lvls[i][i].
+
+        Outputs:
+            - app_lvls: The E x E approach level matrix.
+        """
+        _cdg = self.CDG
+        cEdges = _cdg.CompactEdges
+        app_lvls = np.zeros(shape=(len(cEdges), len(cEdges)))
+        rootNode_id = next(sNode.node_id for sNode in _cdg.StartNodes)
+        for i, cEdge1 in enumerate(cEdges):
+            startNode = _cdg.NodeIndex[cEdge1.startNode_id]
+            queue = [(startNode, 1)]
+            traversed = [cNode[0].node_id for cNode in queue]
+
+            max_al = self.max_approach_level(
+                queue, _cdg.NodeIndex, traversed, rootNode_id)
+
+            app_lvls[i][i] = max_al
+            for j, cEdge2 in enumerate(cEdges):
+                if i == j:
+                    pass
+                else:
+                    startNode = _cdg.NodeIndex.get(cEdge2.endNode_id)
+                    queue = [(startNode, 0)]
+                    traversed = [cNode[0].node_id for cNode in queue]
+                    al = self.approach_level(queue, _cdg.NodeIndex,
+                                             cEdge1, traversed, max_al)
+                    if al == 0:
+                        logging.warning("We're giving an approach level of "
+                                        "0 to this edge")
+                        cEdge1.show_CompactEdge(log=True)
+                    app_lvls[j][i] = al
+        return app_lvls
+
+    def approach_level(self, queue, nodeIndex, goal, traversed, max_al=None):
+        """
+        Find the approach level from one edge to another using a recursive \
+        breadth-first search.
+
+        Arguments:
+            - queue:            A queue consisting of all the next nodes to
+                                visit.
+            - nodeIndex:        The CompactNodes of the
+                                control-dependency-graph by their node_id.
+            - goal:             The edge that we're calculating the approach
+                                level for.
+            - traversed:        A list of nodes that have already been
+                                traversed by the depth-first algorithm.
+            - max_al:           The maximum approach level of the goal.
+        Outputs:
+            - max_al/depth+1:   The approach level of the goal.
+        """
+        if len(queue) == 0:
+            assert max_al is not None, \
+                "End of the queue was reached but no maximum approach level " \
+                "was passed!"
+            return max_al
+
+        curNode, depth = queue.pop(0)
+        assert curNode.node_id in traversed, \
+            "A node is being investigated but it is not registered " \
+            "as traversed: node with id: {}".format(curNode.node_id)
+        if max_al is not None:
+            if depth >= max_al:
+                # We don't need to go deeper than the maximum approach_level
+                return max_al
+
+        if curNode.node_id == goal.startNode_id:
+            # The goal can be reached at this depth
+            return depth
+        else:
+            childNodes = [nodeIndex[node_id] for node_id in
+                          curNode.outg_node_ids if node_id not in traversed]
+            traversed = traversed + [cNode.node_id for cNode in childNodes]
+            queue = queue + [(childNode, depth + 1) for
+                             childNode in childNodes]
+            return self.approach_level(queue, nodeIndex, goal, traversed,
+                                       max_al)
@@ -0,0 +1,167 @@
+"""
+The recursive construction of the CDG and the maximum approach levels, as \
+they were before the recursion was replaced by loops and explicit stacks. \
+They are kept as the reference the iterative construction is checked \
+against.
+
+Classes:
+    - RecursiveCDG:             A CDG built with the recursive functions.
+    - RecursiveSmartContract:   A SmartContract of which the maximum approach
+                                levels are found recursively.
+"""
+
+import logging
+
+from CDG import CDG, CompactNode
+from SmartContract import SmartContract
+
+
+class RecursiveCDG(CDG):
+    """A CDG of which the CompactNodes are found and the dominators are \
+    computed by recursive functions."""
+
+    def Compactify_method(
+            self, method, node_ctr, bbs, rbbs, compactNodes, simple_edges,
+            _double_nodes):
+        """See CDG.Compactify_method, recursing once per CompactNode."""
+        double_nodes = _double_nodes
+        sb, bbs, rbbs, found = self.Find_Starting_Node(method, bbs, rbbs)
+        node_ctr += 1
+        if not found:
+            assert(len(rbbs) == len(method.basic_blocks)), \
+                "No starting blocks were found but there are stil basic "\
+                "blocks should be added to the control-dependency-graph!"
+            return compactNodes, simple_edges, double_nodes
+        else:
+            start_pc = sb.start.pc
+            bbs, rbbs, end_pc, basic_blocks, outg_node_startpcs = \
+                self.Compactify_Basic_Blocks(method, sb, bbs, rbbs, [])
+            if start_pc in double_nodes.keys():
+                # The first compactNode that was found with this start_pc.
+                cNode = double_nodes[start_pc][0]
+                assert cNode.end_pc == end_pc, "Two compactNodes were found "\
+                    f"with the same start_pc's ({start_pc}), but different "\
+                    f"end_pc's ({cNode.end_pc}) and ({end_pc}). "\
+                    f"Original node: {cNode.node_id}, New is in {method.name}."
+                assert outg_node_startpcs == simple_edges[cNode.node_id], \
+                    "When creating double nodes, the simple_edges should "\
+                    "be the same!"
+
+            # Create and add a new CompactNode
+            node_id = (method.name, node_ctr)
+            new_cNode = CompactNode(
+                node_id, set(
+                    [node_id]), start_pc, end_pc, basic_blocks, [], [])
+            if start_pc not in double_nodes.keys():
+                double_nodes[start_pc] = [new_cNode]
+            else:
+                double_nodes[start_pc] = double_nodes[start_pc] + [new_cNode]
+
+            simple_edges[node_id] = outg_node_startpcs
+            compactNodes = compactNodes + [new_cNode]
+            return self.Compactify_method(
+                method, node_ctr, bbs, rbbs, compactNodes, simple_edges,
+                double_nodes)
+
+    def Find_Starting_Node(self, method, bbs, rbbs):
+        """See CDG.Find_Starting_Node, scanning the removed basic_blocks as \
+        a list."""
+        for i, bb in enumerate(method.basic_blocks):
+            illegal_inc_bbs = [x for x in method.basic_blocks if x not in rbbs]
+            bb_not_removed = bb not in rbbs
+            bb_is_reachable = not all([x in illegal_inc_bbs for x in
+                                       bb.incoming_basic_blocks(method.key)])
+            bb_has_no_incoming_blocks = \
+                len(bb.incoming_basic_blocks(method.key)) == 0
+            if bb_not_removed & (bb_is_reachable | bb_has_no_incoming_blocks):
+                bbs.remove(bb)
+                rbbs = rbbs + [bb]
+                return bb, bbs, rbbs, True
+        return None, bbs, rbbs, False
+
+    def Compactify_Basic_Blocks(self, method, cb, bbs, rbbs, Cbbs):
+        """See CDG.Compactify_Basic_Blocks, recursing once per merged \
+        basic_block."""
+        all_outgoing_bb = list(
+            set(item for sublist in cb.outgoing_basic_blocks_as_dict.values()
+                for item in sublist))
+        if (len(all_outgoing_bb) != 1) | \
+                (len(cb.outgoing_basic_blocks(method.key)) != 1):
+            end_pc = cb.end.pc
+            Cbbs = Cbbs + [cb]
+            outg_bb_startpcs = \
+                [bb.start.pc for bb in all_outgoing_bb]
+            return bbs, rbbs, end_pc, Cbbs, outg_bb_startpcs
+        else:
+            nbb = cb.outgoing_basic_blocks(method.key)[0]
+            all_inc_bb = list(
+                set(item for sublist in
+                    nbb.incoming_basic_blocks_as_dict.values() for
+                    item in sublist))
+            if len(all_inc_bb) > 1:
+                end_pc = cb.end.pc
+                Cbbs = Cbbs + [cb]
+                outg_bb_startpcs = [bb.start.pc for bb in
+                                    all_outgoing_bb]
+                return bbs, rbbs, end_pc, Cbbs, outg_bb_startpcs
+            else:
+                new_bbs = bbs.copy()
+                new_bbs.remove(nbb)
+                rbbs = rbbs + [nbb]
+                Cbbs = Cbbs + [cb]
+                return self.Compactify_Basic_Blocks(
+                    method, nbb, new_bbs, rbbs, Cbbs)
+
+    def DFS(self, v):
+        """Create a spanning-tree using Depth-First Search."""
+        v.semi = self.n
+        self.vertex[self.n] = v
+        self.n += 1
+        for w_id in v.outg_node_ids:
+            w = self.NodeIndex.get(w_id)
+            if w is None:
+                logging.error("This is the node I cannot find children for.")
+                v.show_CompactNode(True)
+            assert w is not None, "No child node was found!"
+            if w.semi == 0:
+                w.parent = v
+                self.DFS(w)
+                assert v.node_id in w.inc_node_ids, \
+                    "Something went wrong with the Incoming Node ids!"
+
+    def COMPRESS(self, _v):
+        """COMPRESS function from Lengauer-Tarjan algorithm."""
+        if _v.ancestor.ancestor is not None:
+            self.COMPRESS(_v.ancestor)
+            if self.vertex[_v.ancestor.label].semi < \
+                    self.vertex[_v.label].semi:
+                _v.label = _v.ancestor.label
+            _v.ancestor = _v.ancestor.ancestor
+
+
+class RecursiveSmartContract(SmartContract):
+    """A SmartContract of which the maximum approach levels are found with \
+    a recursive breadth-first search."""
+
+    def max_approach_level(self, queue, nodeIndex, traversed, _rootNode_id):
+        """See SmartContract.max_approach_level, recursing once per node \
+        taken from the queue."""
+        assert len(queue) != 0, "When finding the maximum approach level "\
+            "the queue can never be 0."
+        curNode, depth = queue.pop(0)
+        assert curNode.node_id in traversed, \
+            "A node is has been popped from the queue but it is not "\
+            "registered as traversed: node with id: {}".format(
+                curNode.node_id)
+
+        if 1 in [node_id[1] for node_id in curNode.all_node_ids]:
+            # Max approach level is depth.
+            return depth
+        else:
+            parentNodes = [nodeIndex[node_id] for node_id in
+                           curNode.inc_node_ids if node_id not in traversed]
+            traversed = traversed + [cNode.node_id for cNode in parentNodes]
+            queue = queue + [(parentNode, depth + 1) for
+                             parentNode in parentNodes]
+            return self.max_approach_level(
+                queue, nodeIndex, traversed, _rootNode_id)
@@ -0,0 +1,48 @@
+"""
+Check that the lazily computed ApproachLevels give the same approach levels \
+as the dense matrix they replaced, including its diagonal of maximum \
+approach levels and the cap at the maximum approach level.
+"""
+
+import copy
+import json
+import os
+
+import numpy as np
+import pytest
+
+from CDG import CDG
+from SmartContract import SmartContract
+from dense_approach_levels import DenseSmartContract
+from test_cdg import CONTRACT_JSONS, PREDICATES, RWCONTRACTS
+
+
+@pytest.mark.parametrize("contract_json_location", CONTRACT_JSONS,
+                         ids=lambda path: os.path.relpath(path, RWCONTRACTS))
+def test_same_levels_as_dense_matrix(contract_json_location):
+    with open(contract_json_location, 'r') as f:
+        contract_json = json.load(f)
+    cdg = CDG(contract_json['contractName'],
+              contract_json['deployedBytecode'], PREDICATES)
+    cdg.LT(PREDICATES)
+    functionNames = [method['name'] for method in contract_json['abi'] if
+                     method['type'] == 'function']
+    levels = SmartContract(copy.deepcopy(contract_json), cdg, [],
+                           functionNames).approach_levels
+    reference = DenseSmartContract(copy.deepcopy(contract_json), cdg, [],
+                                   functionNames)
+    app_lvls = reference.dense_approach_levels()
+    E = len(app_lvls)
+
+    assert len(levels) == E
+    assert list(levels.max_levels) == list(np.diag(app_lvls))
+    for j in range(E):
+        assert [levels.level(j, i) for i in range(E)] == list(app_lvls[j])
+
+    # Test.approach_level takes the closest of the traversed edges.
+    rng = np.random.default_rng(0)
+    for size in [1, 2, 5]:
+        edgeset = rng.choice(E, size=min(size, E), replace=False)
+        assert list(levels.closest(set(edgeset))) == \
+            list(app_lvls[edgeset].min(axis=0))
+    assert (levels.closest(set()) == np.inf).all()
@@ -0,0 +1,107 @@
+"""
+Check that the iterative construction of the CDG and the maximum approach \
+levels gives the same graph as the recursive construction it replaced, and \
+that Node_At_Pc finds the same CompactNode as a scan of all CompactNodes, \
+for every contract in RWContracts.
+"""
+
+import glob
+import json
+import os
+
+import pytest
+
+from evm_cfg_builder.cfg.basic_block import BasicBlock
+from CDG import CDG
+from SmartContract import SmartContract
+from recursive_cdg import RecursiveCDG, RecursiveSmartContract
+
+PREDICATES = ["LT", "GT", "SLT", "SGT", "EQ"]
+RWCONTRACTS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           os.pardir, "Smart Contracts", "RWContracts")
+CONTRACT_JSONS = sorted(glob.glob(os.path.join(
+    RWCONTRACTS, "*", "build", "contracts", "*.json")))
+
+
+@pytest.fixture(autouse=True)
+def basic_blocks_hashed_by_pc(monkeypatch):
+    """evm_cfg_builder hashes basic_blocks by their id, so the order of sets \
+    of basic_blocks, and with it the numbering of the CompactNodes, differs \
+    between two builds of the same contract. Hashing them by their start pc \
+    numbers the CompactNodes of both builds the same way."""
+    monkeypatch.setattr(BasicBlock, "__hash__", lambda self: self.start.pc)
+
+
+def build(contract_json, cdg_class, smart_contract_class):
+    """Build the CDG of a contract and the SmartContract holding its \
+    approach levels."""
+    cdg = cdg_class(contract_json['contractName'],
+                    contract_json['deployedBytecode'], PREDICATES)
+    cdg.LT(PREDICATES)
+    sc = smart_contract_class(
+        contract_json, cdg, [], [method['name'] for method in
+                                 contract_json['abi'] if
+                                 method['type'] == 'function'])
+    return cdg, sc
+
+
+def graph(cdg, sc):
+    """
+    The nodes, edges, dominators and maximum approach levels of a CDG, in a \
+    form that does not depend on the order in which they were found.
+    """
+    nodes = {cNode.node_id: (
+        sorted(cNode.all_node_ids), cNode.start_pc, cNode.end_pc,
+        [bb.start.pc for bb in cNode.basic_blocks],
+        sorted(cNode.inc_node_ids), sorted(cNode.outg_node_ids),
+        (cNode.predicate.eval, cNode.predicate.pc))
+        for cNode in cdg.CompactNodes}
+    dominators = {cNode.node_id: None if cNode.dom is None else
+                  cNode.dom.node_id for cNode in cdg.CompactNodes}
+    edges = sorted((cEdge.startNode_id, cEdge.endNode_id,
+                    cEdge.predicate.eval, cEdge.predicate.pc) for
+                   cEdge in cdg.CompactEdges)
+    max_levels = {(cEdge.startNode_id, cEdge.endNode_id): level for
+                  cEdge, level in zip(cdg.CompactEdges,
+                                      sc.approach_levels.max_levels)}
+    return nodes, dominators, edges, max_levels
+
+
+def test_contracts_found():
+    assert len(CONTRACT_JSONS) > 0, f"No contracts were found in "\
+        f"{RWCONTRACTS}, did you build them?"
+
+
+@pytest.mark.parametrize("contract_json_location", CONTRACT_JSONS,
+                         ids=lambda path: os.path.relpath(path, RWCONTRACTS))
+def test_same_graph_as_recursive_construction(contract_json_location):
+    with open(contract_json_location, 'r') as f:
+        contract_json = json.load(f)
+    nodes, dominators, edges, max_levels = graph(
+        *build(contract_json, CDG, SmartContract))
+    ref_nodes, ref_dominators, ref_edges, ref_max_levels = graph(
+        *build(contract_json, RecursiveCDG, RecursiveSmartContract))
+
+    assert nodes == ref_nodes
+    assert dominators == ref_dominators
+    assert edges == ref_edges
+    assert max_levels == ref_max_levels
+
+
+@pytest.mark.parametrize("contract_json_location", CONTRACT_JSONS,
+                         ids=lambda path: os.path.relpath(path, RWCONTRACTS))
+def test_node_at_pc_same_as_scan(contract_json_location):
+    with open(contract_json_location, 'r') as f:
+        contract_json = json.load(f)
+    cdg = CDG(contract_json['contractName'],
+              contract_json['deployedBytecode'], PREDICATES)
+    cdg.LT(PREDICATES)
+    # Every pc of the basic blocks of the CompactNodes, the pcs in the gaps
+    # between them and the pcs past the last basic block.
+    last_pc = max(bb.end.pc for cNode in cdg.CompactNodes for
+                  bb in cNode.basic_blocks)
+    for pc in range(last_pc + 3):
+        assert cdg.Node_At_Pc(pc) is next(
+            (cNode for cNode in cdg.CompactNodes if
+             (pc >= cNode.basic_blocks[0].start.pc) &
+             (pc <= cNode.basic_blocks[0].end.pc)), None), pc
@@ -0,0 +1,112 @@
+"""
+Check the vectorised preference sorting against the pairwise implementation \
+it replaced, on random distance matrices and on distance matrices full of \
+ties.
+"""
+
+import numpy as np
+import pytest
+
+import pairwise_sorting
+import Preference_Sorting
+from Population import Population
+
+# Distances as they occur in a distance vector: covered, normalised branch
+# distances and approach levels.
+TIED_DISTANCES = [0, 0.5, 0.75, 1, 2, 3]
+SIZES = [(1, 1), (2, 3), (5, 1), (20, 8), (60, 20), (100, 5)]
+
+
+class Case():
+    """The properties of a test case that the sorting looks at."""
+
+    def __init__(self, distance_vector, length):
+        self.distance_vector = distance_vector
+        self.methodCalls = [None] * length
+
+
+def random_cases(seed, N, M, tied):
+    """
+    Create N test cases with M distances each and random lengths.
+
+    Arguments:
+        - seed: The seed of the random generator.
+        - N:    The number of test cases.
+        - M:    The number of targets.
+        - tied: Whether the distances are drawn from TIED_DISTANCES, so that
+                many test cases are equally close to a target, or are random
+                branch distances and approach levels.
+    Outputs:
+        - The test cases and a random choice of updated targets.
+    """
+    rng = np.random.default_rng(seed)
+    if tied:
+        D = rng.choice(TIED_DISTANCES, size=(N, M))
+        # Some test cases are exact duplicates of another one.
+        duplicates = rng.random(N) < 0.2
+        D[duplicates] = D[rng.integers(0, N, size=duplicates.sum())]
+    else:
+        D = rng.random((N, M)) + rng.integers(0, 3, size=(N, M))
+    lengths = rng.integers(1, 4 if tied else 10, size=N)
+    updated_targets = list(rng.random(M) < 0.7)
+    return [Case(D[k].copy(), int(lengths[k])) for k in range(N)], \
+        updated_targets
+
+
+def rows_of(Fs, cases):
+    """The sorted rows of each front of test cases."""
+    row = {id(case): k for k, case in enumerate(cases)}
+    return [sorted(row[id(case)] for case in F) for F in Fs]
+
+
+def reference_ranks(cases):
+    """The ranks set by the pairwise sorting, inf if it set none."""
+    return [getattr(case, 'rank', np.inf) for case in cases]
+
+
+@pytest.mark.parametrize("tied", [False, True])
+@pytest.mark.parametrize("N, M", SIZES)
+@pytest.mark.parametrize("seed", range(5))
+def test_fast_non_dominated_sort(seed, N, M, tied):
+    cases, updated_targets = random_cases(seed, N, M, tied)
+    population = Population(cases, M)
+    Fs = Preference_Sorting.fast_non_dominated_sort(
+        population, np.arange(N), updated_targets)
+    reference = pairwise_sorting.fast_non_dominated_sort(
+        set(cases), updated_targets)
+
+    assert [sorted(F) for F in Fs] == rows_of(reference, cases)
+    assert list(population.ranks) == reference_ranks(cases)
+
+
+@pytest.mark.parametrize("tied", [False, True])
+@pytest.mark.parametrize("N, M", SIZES)
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("pop_size", [1, 50])
+def test_preference_sorting(seed, N, M, tied, pop_size):
+    cases, updated_targets = random_cases(seed, N, M, tied)
+    population = Population(cases, M)
+    Fs = Preference_Sorting.preference_sorting(
+        population, updated_targets, pop_size)
+    reference = pairwise_sorting.preference_sorting(
+        cases, updated_targets, pop_size)
+
+    assert [sorted(F) for F in Fs] == rows_of(reference, cases)
+    assert list(population.ranks) == reference_ranks(cases)
+
+    for F, reference_F in zip(Fs, reference):
+        Preference_Sorting.subvector_dist(population, F, updated_targets)
+        pairwise_sorting.subvector_dist(reference_F, updated_targets)
+    assert list(population.subvector_dists) == \
+        [getattr(case, 'subvector_dist', 0) for case in cases]
+
+
+@pytest.mark.parametrize("N, M", [(1, 4), (10, 4)])
+def test_no_updated_targets(N, M):
+    cases, _ = random_cases(0, N, M, True)
+    population = Population(cases, M)
+    Fs = Preference_Sorting.preference_sorting(population, [False] * M, 50)
+    reference = pairwise_sorting.preference_sorting(cases, [False] * M, 50)
+
+    assert [sorted(F) for F in Fs] == rows_of(reference, cases)
+    assert list(population.ranks) == reference_ranks(cases) == [1] * N
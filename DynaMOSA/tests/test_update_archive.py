@@ -0,0 +1,51 @@
+"""
+Check that the tests that enter the archive do not keep the distance matrix \
+of their Population alive, also once they are part of a later Population.
+"""
+
+import numpy as np
+
+from Population import Population
+from SolMOSA import update_archive
+import Test
+
+
+class Edge():
+    """The part of a CompactEdge that update_archive logs."""
+
+    startNode_id = ("f", 0)
+    endNode_id = ("f", 1)
+
+
+def population(distance_vectors, lengths):
+    """A Population of test cases with the given distance vectors and \
+    numbers of methodCalls."""
+    tests = []
+    for distance_vector, length in zip(distance_vectors, lengths):
+        test = Test.TestCase([None] * length, None)
+        test.distance_vector = np.array(distance_vector, dtype=float)
+        tests.append(test)
+    return Population(tests, len(distance_vectors[0]))
+
+
+def test_archived_tests_have_their_own_distance_vector():
+    parents = population([[0, 0, 1], [0.5, 1, 0]], [3, 2])
+    archive = update_archive(parents, [None] * 3, [True, True, True],
+                             [Edge()] * 3)
+
+    # The first test covers two targets and is archived once.
+    assert archive[0] is archive[1]
+    assert archive[0].methodCalls is parents.tests[0].methodCalls
+    for test, k in [(archive[0], 0), (archive[2], 1)]:
+        assert test is not parents.tests[k]
+        assert list(test.distance_vector) == list(parents.distances[k])
+        assert not np.shares_memory(test.distance_vector, parents.distances)
+
+    # The archived tests are not rebound to the rows of later populations.
+    offspring = population([[1, 1, 0]], [1])
+    R = parents.union(offspring)
+    update_archive(R, archive, [True, True, True], [Edge()] * 3)
+    assert archive[0] is archive[1]
+    for test in archive:
+        assert not np.shares_memory(test.distance_vector, R.distances)
+    assert archive[2].methodCalls is offspring.tests[0].methodCalls
@@ -0,0 +1,141 @@
+"""
+Check that the distance vectors computed from compact, digested traces give \
+the same distance vectors as the baseline fitness function, which replayed \
+the full structLog traces, both in SolMOSA itself and in the FitnessPool \
+workers. The traces are recorded by running random tests of every contract \
+in RWContracts on the py-evm backend.
+"""
+
+import copy
+import json
+import os
+import random
+
+import pytest
+
+import Fitness_Pool
+from CDG import CDG
+from PyEVM_Executor import ACCOUNTS, BALANCE, PyEVMExecutor, pyevm_available
+from SmartContract import SmartContract
+import Test
+import Test_Suite
+from Trace_Decoder import OP, PC, S_1, S_2, compact_trace
+from baseline_fitness import BaselineTestCase
+from dense_approach_levels import DenseSmartContract
+from test_cdg import CONTRACT_JSONS, PREDICATES, RWCONTRACTS
+
+pytestmark = pytest.mark.skipif(
+    not pyevm_available, reason="The traces are recorded with py-evm.")
+
+
+def random_tests(sc, seed):
+    """
+    Random test cases of a smart contract, with a test of which the last \
+    method call is sent with more Ether than the account has, unless the \
+    test fails earlier, and a test of which the deployment fails.
+    """
+    random.seed(seed)
+    # The values some of the constructors require, like the ETHpool that
+    # Main.set_settings collects from the contracts.
+    ETHpool = {0, 10**18, 10 * 10**18}
+    tests = Test_Suite.TestSuite(
+        sc, ACCOUNTS, 3, ACCOUNTS[:2], set(), ETHpool, {0}, set(),
+        _pop_size=20, _max_method_calls=8, _passBlocks=True, _passTime=True,
+        _passTimeTime=3600).tests
+    methodCall = copy.copy(next(
+        methodCall for test in tests for methodCall in test.methodCalls[1:]
+        if methodCall.methodName not in ["passTime", "passBlocks"]))
+    methodCall.value = 2 * BALANCE
+    tests.append(Test.TestCase(tests[0].methodCalls + (methodCall,), 3))
+    constructor = copy.copy(tests[0].methodCalls[0])
+    constructor.value = 2 * BALANCE
+    tests.append(Test.TestCase((constructor,) + tests[0].methodCalls[1:], 3))
+    return tests
+
+
+def struct_logs(trace):
+    """The structLogs of a trace recorded without a trace filter, holding \
+    the top two words of the stack, as debug_traceTransaction returns them."""
+    return [{'pc': step[PC], 'op': step[OP],
+             'stack': [word for word in (step[S_2], step[S_1]) if
+                       word is not None]} for step in trace]
+
+
+@pytest.mark.parametrize("contract_json_location", CONTRACT_JSONS,
+                         ids=lambda path: os.path.relpath(path, RWCONTRACTS))
+def test_same_distances_as_baseline(contract_json_location):
+    with open(contract_json_location, 'r') as f:
+        contract_json = json.load(f)
+    functionNames = [method['name'] for method in contract_json['abi'] if
+                     method['type'] == 'function']
+    if (len(functionNames) == 0) | ("__" in contract_json['bytecode']):
+        pytest.skip("The contract has no functions or has to be linked.")
+    cdg = CDG(contract_json['contractName'],
+              contract_json['deployedBytecode'], PREDICATES)
+    cdg.LT(PREDICATES)
+    sc = SmartContract(copy.deepcopy(contract_json), cdg, [], functionNames)
+    app_lvls = DenseSmartContract(copy.deepcopy(contract_json), cdg, [],
+                                  functionNames).dense_approach_levels()
+
+    tests = random_tests(sc, 0)
+    executor = PyEVMExecutor(contract_json['abi'], contract_json['bytecode'])
+    results = {k: (traces, returnvals) for k, traces, returnvals in
+               executor.run_tests([test.input_dicts() for test in tests])}
+    assert sorted(results) == list(range(len(tests)))
+    assert results[len(tests) - 1][1][0] == "ConstructorFail"
+
+    Fitness_Pool.init_worker(cdg, sc.approach_levels)
+    for k, test in enumerate(tests):
+        traces, returnvals = results[k]
+        # The constructor trace is not sent by SC_interaction.js.
+        compact_traces = [None] + [
+            compact_trace(struct_logs(trace), cdg.TracePcs, cdg.PredicatePcs)
+            if isinstance(trace, list) else trace for trace in traces[1:]]
+        expected = followed(baseline_distances, test, traces, returnvals,
+                            cdg, app_lvls)
+        assert followed(digest_distances, test, compact_traces, returnvals,
+                        cdg, sc.approach_levels) == expected
+        assert followed(worker_distances, test, compact_traces,
+                        returnvals) == expected
+
+
+def baseline_distances(test, traces, returnvals, cdg, app_lvls):
+    """The distance vector and return values of the baseline, from the \
+    full traces."""
+    reference = BaselineTestCase(test.methodCalls, 3)
+    reference.update_distance(
+        [struct_logs(trace) if isinstance(trace, list) else trace for
+         trace in traces], returnvals, cdg.CompactNodes, cdg.CompactEdges,
+        app_lvls)
+    return list(reference.distance_vector), reference.returnVals
+
+
+def digest_distances(test, compact_traces, returnvals, cdg, approach_levels):
+    """The distance vector and return values of TestCase.update_distance, \
+    from the traces digested as soon as they are received."""
+    test.update_distance(
+        [None] + [Test.digest_trace(trace, cdg) if isinstance(trace, list)
+                  else trace for trace in compact_traces[1:]],
+        returnvals, cdg, approach_levels)
+    return list(test.distance_vector), test.returnVals
+
+
+def worker_distances(test, compact_traces, returnvals):
+    """The distance vector and return values of a FitnessPool worker, from \
+    the compact traces."""
+    _, distance_vector, rVals = Fitness_Pool.update_distance(
+        (0, test.methodCalls, compact_traces, returnvals))
+    return list(distance_vector), rVals
+
+
+def followed(distances, *args):
+    """
+    The distances computed by one of the functions above, or None if the \
+    traces could not be followed through the CDG. Neither the baseline nor \
+    the digest can follow a trace that ends with a SELFDESTRUCT, or the \
+    trace of a call to a contract that was destroyed.
+    """
+    try:
+        return distances(*args)
+    except (AssertionError, IndexError):
+        return None
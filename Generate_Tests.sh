@@ -13,5 +13,7 @@ else
     echo "invalid choice!"
 fi
 
-# Close the ganache screen
-screen -X -S ganache quit
+# Close the ganache screens
+for session in $(screen -ls | grep -o "[0-9]*\.ganache[_0-9]*"); do
+	screen -X -S $session quit
+done